@@ -1,24 +1,41 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
+from fastapi.responses import FileResponse, StreamingResponse, PlainTextResponse, Response, JSONResponse
+from pydantic import BaseModel, Field
 import os
 import sys
-import subprocess
 import time
-import pandas as pd
+import logging
+import asyncio
+import functools
+import importlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional, List, Dict, Any
-from sqlalchemy import create_engine, text
-import psycopg2
-from config import DatabaseConfig
+from typing import Optional, List, Dict, Any, Sequence, Union
+from config import DatabaseConfig, ModelConfig, PipelineConfig, CaptureConfig
 
 # Agregar el directorio padre al path para importar los servicios
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from services.capture_service import CaptureService
-from services.processing_service import ProcessingService
-from services.prediction_service import PredictionService
+from services.interface_service import interface_inventory
+from logging_config import setup_logging, shutdown_logging
+from services.job_service import JobManager, JobQueueFull, AnalysisJob
+from services.streaming_service import StreamingAnalyzer
+from services.metrics import registry, span, record_flows, ROWS_WRITTEN, DB_POOL_CONNECTIONS
+
+# Módulos pesados (pandas, NumPy, SQLAlchemy, servicios del pipeline y modelos): no se
+# importan con la aplicación sino en el primer uso o en el warm-up en segundo plano,
+# así el proceso atiende /api/test justo al arrancar
+PIPELINE_MODULES = (
+    'numpy', 'pandas', 'database', 'db_schema', 'services.processing_service', 'services.flow_extractor',
+    'services.imputation_service', 'services.prediction_service', 'services.storage_service',
+    'services.history_service', 'services.response_builder'
+)
+
+# Estado del warm-up (lo consulta /api/ready)
+warmup_state: Dict[str, Any] = {'ready': False, 'modules': False, 'schema': 'pending', 'models': False,
+                                'seconds': None, 'error': None}
 
 app = FastAPI(title="ML Traffic Analyzer", description="Análisis de Tráfico de Red con Machine Learning")
 
@@ -31,111 +48,64 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Opciones de captura comunes al análisis puntual y al continuo (None = valor de CaptureConfig)
+class CaptureRequest(BaseModel):
+    connection_type: str = "auto"
+    bpf_filter: Optional[str] = None
+    snaplen: Optional[int] = Field(None, ge=0, le=262144)
+    buffer_mb: Optional[int] = Field(None, ge=0, le=4096)
+    sample_rate: Optional[float] = Field(None, gt=0, le=1)
+
 # Modelo para la petición
-class AnalysisRequest(BaseModel):
+class AnalysisRequest(CaptureRequest):
     duration: int = 20
-    connection_type: str = "wifi"
 
-# Configuración de la base de datos PostgreSQL
-engine = create_engine(DatabaseConfig.get_sync_connection_string())
+# Petición del modo de análisis continuo
+class StreamRequest(CaptureRequest):
+    segment_seconds: int = CaptureConfig.STREAM_SEGMENT_SECONDS
+
+def capture_settings(request: CaptureRequest) -> Dict[str, Any]:
+    """Opciones de captura efectivas de una petición; HTTPException 400 si no son válidas"""
+    snaplen = CaptureConfig.SNAPLEN if request.snaplen is None else request.snaplen
+    sample_rate = CaptureConfig.FLOW_SAMPLE_RATE if request.sample_rate is None else request.sample_rate
+    if PipelineConfig.FLOW_EXTRACTOR != 'native':
+        # CICFlowMeter mide las longitudes con los bytes capturados y no muestrea
+        snaplen, sample_rate = 0, 1.0
+    if 0 < snaplen < CaptureConfig.MIN_SNAPLEN:
+        raise HTTPException(status_code=400, detail=f"snaplen debe ser 0 o al menos {CaptureConfig.MIN_SNAPLEN}")
+    return {
+        "bpf_filter": (CaptureConfig.BPF_FILTER if request.bpf_filter is None else request.bpf_filter).strip(),
+        "snaplen": snaplen,
+        "buffer_mb": CaptureConfig.BUFFER_MB if request.buffer_mb is None else request.buffer_mb,
+        "sample_rate": sample_rate
+    }
+
+@functools.lru_cache(maxsize=None)
+def get_history_service():
+    """Historial paginado y exportación de flujos (los engines de db se crean en el primer uso)"""
+    from services.history_service import HistoryService
+    from database import db
+    return HistoryService(db)
+
+@functools.lru_cache(maxsize=None)
+def get_flow_extractor():
+    """Extractor de flujos en proceso (sustituye a flowmeter.js con FLOW_EXTRACTOR=native)"""
+    from services.flow_extractor import FlowExtractor
+    return FlowExtractor(
+        flow_timeout_us=int(PipelineConfig.FLOW_TIMEOUT * 1_000_000),
+        activity_timeout_us=int(PipelineConfig.ACTIVITY_TIMEOUT * 1_000_000)
+    )
+
+# Pool acotado para las etapas de CPU del pipeline (no bloquean el event loop)
+pipeline_executor = ThreadPoolExecutor(max_workers=PipelineConfig.WORKERS, thread_name_prefix="pipeline")
 
 def init_database():
-    """Inicializa la base de datos PostgreSQL con la tabla trafico_predic"""
+    """Inicializa la base de datos PostgreSQL: trafico_predic particionada y su tabla resumen"""
+    from database import db
+    from db_schema import init_schema
     try:
-        with engine.connect() as conn:
-            conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS trafico_predic (
-                    id SERIAL PRIMARY KEY,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    connection_type VARCHAR(50),
-                    duration INTEGER,
-                    
-                    -- Características de tráfico (78 columnas)
-                    destination_port REAL,
-                    flow_duration REAL,
-                    total_fwd_packets REAL,
-                    total_backward_packets REAL,
-                    total_length_fwd_packets REAL,
-                    total_length_bwd_packets REAL,
-                    fwd_packet_length_max REAL,
-                    fwd_packet_length_min REAL,
-                    fwd_packet_length_mean REAL,
-                    fwd_packet_length_std REAL,
-                    bwd_packet_length_max REAL,
-                    bwd_packet_length_min REAL,
-                    bwd_packet_length_mean REAL,
-                    bwd_packet_length_std REAL,
-                    flow_bytes_s REAL,
-                    flow_packets_s REAL,
-                    flow_iat_mean REAL,
-                    flow_iat_std REAL,
-                    flow_iat_max REAL,
-                    flow_iat_min REAL,
-                    fwd_iat_total REAL,
-                    fwd_iat_mean REAL,
-                    fwd_iat_std REAL,
-                    fwd_iat_max REAL,
-                    fwd_iat_min REAL,
-                    bwd_iat_total REAL,
-                    bwd_iat_mean REAL,
-                    bwd_iat_std REAL,
-                    bwd_iat_max REAL,
-                    bwd_iat_min REAL,
-                    fwd_psh_flags REAL,
-                    bwd_psh_flags REAL,
-                    fwd_urg_flags REAL,
-                    bwd_urg_flags REAL,
-                    fwd_header_length REAL,
-                    bwd_header_length REAL,
-                    fwd_packets_s REAL,
-                    bwd_packets_s REAL,
-                    min_packet_length REAL,
-                    max_packet_length REAL,
-                    packet_length_mean REAL,
-                    packet_length_std REAL,
-                    packet_length_variance REAL,
-                    fin_flag_count REAL,
-                    syn_flag_count REAL,
-                    rst_flag_count REAL,
-                    psh_flag_count REAL,
-                    ack_flag_count REAL,
-                    urg_flag_count REAL,
-                    cwe_flag_count REAL,
-                    ece_flag_count REAL,
-                    down_up_ratio REAL,
-                    average_packet_size REAL,
-                    avg_fwd_segment_size REAL,
-                    avg_bwd_segment_size REAL,
-                    fwd_avg_bytes_bulk REAL,
-                    fwd_avg_packets_bulk REAL,
-                    fwd_avg_bulk_rate REAL,
-                    bwd_avg_bytes_bulk REAL,
-                    bwd_avg_packets_bulk REAL,
-                    bwd_avg_bulk_rate REAL,
-                    subflow_fwd_packets REAL,
-                    subflow_fwd_bytes REAL,
-                    subflow_bwd_packets REAL,
-                    subflow_bwd_bytes REAL,
-                    init_win_bytes_forward REAL,
-                    init_win_bytes_backward REAL,
-                    act_data_pkt_fwd REAL,
-                    min_seg_size_forward REAL,
-                    active_mean REAL,
-                    active_std REAL,
-                    active_max REAL,
-                    active_min REAL,
-                    idle_mean REAL,
-                    idle_std REAL,
-                    idle_max REAL,
-                    idle_min REAL,
-                    label_original VARCHAR(100),
-                    fwd_header_length_1 REAL,
-                    
-                    -- Predicción (columna 79)
-                    prediction VARCHAR(100)
-                )
-            """))
-            conn.commit()
+        with db.engine.begin() as conn:
+            init_schema(conn)
         
         print("✓ Base de datos PostgreSQL inicializada correctamente")
         
@@ -143,165 +113,141 @@ def init_database():
         print(f"Error inicializando base de datos PostgreSQL: {e}")
         raise
 
-def impute_missing_values(df: pd.DataFrame) -> pd.DataFrame:
+def check_database() -> str:
+    """
+    Esquema al arrancar: con AUTO_MIGRATE se crea o actualiza (init_database); si no,
+    solo se comprueba que existe (el esquema lo crea el paso aparte python db_schema.py)
+    """
+    if DatabaseConfig.AUTO_MIGRATE:
+        init_database()
+        return 'migrated'
+    from database import db
+    from db_schema import check_schema
+    with db.engine.connect() as conn:
+        missing = check_schema(conn)
+    if missing:
+        print(f"Advertencia: faltan las tablas {', '.join(missing)}; ejecutar 'python db_schema.py'")
+        return 'missing'
+    return 'ok'
+
+def import_pipeline_modules():
+    for name in PIPELINE_MODULES:
+        importlib.import_module(name)
+
+async def warm_up():
+    """
+    Warm-up en segundo plano tras el arranque: importa los módulos del pipeline,
+    prepara el esquema y precarga los modelos. Un fallo se registra y la etapa
+    afectada se repite en el primer análisis.
+    """
+    start = time.perf_counter()
+    try:
+        await asyncio.to_thread(import_pipeline_modules)
+        warmup_state['modules'] = True
+    except Exception as e:
+        warmup_state['error'] = f"Error importando el pipeline: {e}"
+        print(warmup_state['error'])
+        return
+    try:
+        warmup_state['schema'] = await asyncio.to_thread(check_database)
+    except Exception as e:
+        # Los endpoints de base de datos reportarán el error
+        warmup_state['schema'] = 'error'
+        print(f"Advertencia: No se pudo preparar la base de datos: {e}")
+    if ModelConfig.PRELOAD:
+        from services.model_registry import ModelRegistry
+        try:
+            bundle = await asyncio.to_thread(ModelRegistry.load)
+            warmup_state['models'] = True
+            print(f"✓ Modelos ML cargados en {bundle.load_seconds:.2f}s ({bundle.format})")
+        except Exception as e:
+            # Se reintentará la carga en el primer análisis
+            print(f"Advertencia: No se pudieron precargar los modelos: {e}")
+    warmup_state['seconds'] = round(time.perf_counter() - start, 3)
+    warmup_state['ready'] = True
+
+def impute_missing_values(df: "pd.DataFrame") -> "pd.DataFrame":
     """Imputa valores faltantes, infinitos y nulos con la mediana de cada columna"""
+    from services.model_registry import ModelRegistry
+    from services.imputation_service import ImputationService
     try:
-        df_clean = df.copy()
-        
-        # Iterar por cada columna numérica
-        for column in df_clean.columns:
-            if df_clean[column].dtype in ['float64', 'int64', 'float32', 'int32']:
-                # Reemplazar infinitos con NaN
-                df_clean[column] = df_clean[column].replace([float('inf'), float('-inf')], pd.NA)
-                
-                # Calcular mediana de valores no nulos
-                median_value = df_clean[column].median()
-                
-                # Si no hay valores válidos para calcular mediana, usar 0
-                if pd.isna(median_value):
-                    median_value = 0.0
-                
-                # Imputar valores faltantes con la mediana
-                df_clean[column] = df_clean[column].fillna(median_value)
-                
-                print(f"📊 Columna '{column}': {df[column].isna().sum() + (df[column] == float('inf')).sum() + (df[column] == float('-inf')).sum()} valores imputados con mediana {median_value:.4f}")
-        
-        return df_clean
+        # Medianas fijas de entrenamiento si están disponibles; si no, mediana del lote
+        medians = ModelRegistry.get().medians if ModelConfig.USE_TRAINING_MEDIANS else None
+        with span('imputation', rows=len(df)):
+            return ImputationService(medians).impute(df)
         
     except Exception as e:
-        print(f"Error en imputación: {e}")
+        logging.error(f"Error en imputación: {e}")
         return df
 
-def save_to_database(df: pd.DataFrame, predictions: List[dict], connection_type: str, duration: int):
-    """Guarda los datos y predicciones en la base de datos PostgreSQL"""
+def save_to_database(df: "pd.DataFrame", labels: Sequence[str], connection_type: str, duration: int) -> Dict[str, Any]:
+    """Guarda los datos y las etiquetas predichas en la base de datos PostgreSQL"""
+    from services.storage_service import FlowWriter
+    from database import db
     try:
-        # Preparar datos para inserción
-        data_to_insert = []
-        
-        for i, (_, row) in enumerate(df.iterrows()):
-            if i < len(predictions):
-                prediction = predictions[i]['label']
-                
-                # Mapear nombres de columnas a nombres de base de datos (snake_case)
-                column_mapping = {
-                    'Destination Port': 'destination_port',
-                    'Flow Duration': 'flow_duration',
-                    'Total Fwd Packets': 'total_fwd_packets',
-                    'Total Backward Packets': 'total_backward_packets',
-                    'Total Length of Fwd Packets': 'total_length_fwd_packets',
-                    'Total Length of Bwd Packets': 'total_length_bwd_packets',
-                    'Fwd Packet Length Max': 'fwd_packet_length_max',
-                    'Fwd Packet Length Min': 'fwd_packet_length_min',
-                    'Fwd Packet Length Mean': 'fwd_packet_length_mean',
-                    'Fwd Packet Length Std': 'fwd_packet_length_std',
-                    'Bwd Packet Length Max': 'bwd_packet_length_max',
-                    'Bwd Packet Length Min': 'bwd_packet_length_min',
-                    'Bwd Packet Length Mean': 'bwd_packet_length_mean',
-                    'Bwd Packet Length Std': 'bwd_packet_length_std',
-                    'Flow Bytes/s': 'flow_bytes_s',
-                    'Flow Packets/s': 'flow_packets_s',
-                    'Flow IAT Mean': 'flow_iat_mean',
-                    'Flow IAT Std': 'flow_iat_std',
-                    'Flow IAT Max': 'flow_iat_max',
-                    'Flow IAT Min': 'flow_iat_min',
-                    'Fwd IAT Total': 'fwd_iat_total',
-                    'Fwd IAT Mean': 'fwd_iat_mean',
-                    'Fwd IAT Std': 'fwd_iat_std',
-                    'Fwd IAT Max': 'fwd_iat_max',
-                    'Fwd IAT Min': 'fwd_iat_min',
-                    'Bwd IAT Total': 'bwd_iat_total',
-                    'Bwd IAT Mean': 'bwd_iat_mean',
-                    'Bwd IAT Std': 'bwd_iat_std',
-                    'Bwd IAT Max': 'bwd_iat_max',
-                    'Bwd IAT Min': 'bwd_iat_min',
-                    'Fwd PSH Flags': 'fwd_psh_flags',
-                    'Bwd PSH Flags': 'bwd_psh_flags',
-                    'Fwd URG Flags': 'fwd_urg_flags',
-                    'Bwd URG Flags': 'bwd_urg_flags',
-                    'Fwd Header Length': 'fwd_header_length',
-                    'Bwd Header Length': 'bwd_header_length',
-                    'Fwd Packets/s': 'fwd_packets_s',
-                    'Bwd Packets/s': 'bwd_packets_s',
-                    'Min Packet Length': 'min_packet_length',
-                    'Max Packet Length': 'max_packet_length',
-                    'Packet Length Mean': 'packet_length_mean',
-                    'Packet Length Std': 'packet_length_std',
-                    'Packet Length Variance': 'packet_length_variance',
-                    'FIN Flag Count': 'fin_flag_count',
-                    'SYN Flag Count': 'syn_flag_count',
-                    'RST Flag Count': 'rst_flag_count',
-                    'PSH Flag Count': 'psh_flag_count',
-                    'ACK Flag Count': 'ack_flag_count',
-                    'URG Flag Count': 'urg_flag_count',
-                    'CWE Flag Count': 'cwe_flag_count',
-                    'ECE Flag Count': 'ece_flag_count',
-                    'Down/Up Ratio': 'down_up_ratio',
-                    'Average Packet Size': 'average_packet_size',
-                    'Avg Fwd Segment Size': 'avg_fwd_segment_size',
-                    'Avg Bwd Segment Size': 'avg_bwd_segment_size',
-                    'Fwd Avg Bytes/Bulk': 'fwd_avg_bytes_bulk',
-                    'Fwd Avg Packets/Bulk': 'fwd_avg_packets_bulk',
-                    'Fwd Avg Bulk Rate': 'fwd_avg_bulk_rate',
-                    'Bwd Avg Bytes/Bulk': 'bwd_avg_bytes_bulk',
-                    'Bwd Avg Packets/Bulk': 'bwd_avg_packets_bulk',
-                    'Bwd Avg Bulk Rate': 'bwd_avg_bulk_rate',
-                    'Subflow Fwd Packets': 'subflow_fwd_packets',
-                    'Subflow Fwd Bytes': 'subflow_fwd_bytes',
-                    'Subflow Bwd Packets': 'subflow_bwd_packets',
-                    'Subflow Bwd Bytes': 'subflow_bwd_bytes',
-                    'Init_Win_bytes_forward': 'init_win_bytes_forward',
-                    'Init_Win_bytes_backward': 'init_win_bytes_backward',
-                    'act_data_pkt_fwd': 'act_data_pkt_fwd',
-                    'min_seg_size_forward': 'min_seg_size_forward',
-                    'Active Mean': 'active_mean',
-                    'Active Std': 'active_std',
-                    'Active Max': 'active_max',
-                    'Active Min': 'active_min',
-                    'Idle Mean': 'idle_mean',
-                    'Idle Std': 'idle_std',
-                    'Idle Max': 'idle_max',
-                    'Idle Min': 'idle_min',
-                    'Label': 'label_original',
-                    'Fwd Header Length.1': 'fwd_header_length_1'
-                }
-                
-                # Preparar datos para inserción
-                row_data = {
-                    'connection_type': connection_type,
-                    'duration': duration,
-                    'prediction': prediction
-                }
-                
-                # Agregar todas las características
-                for orig_col, db_col in column_mapping.items():
-                    if orig_col in row:
-                        value = row[orig_col]
-                        # Convertir a float, los valores ya están imputados
-                        if isinstance(value, str):
-                            try:
-                                value = float(value)
-                            except (ValueError, TypeError):
-                                value = 0.0
-                        else:
-                            value = float(value) if value is not None else 0.0
-                        row_data[db_col] = value
-                
-                data_to_insert.append(row_data)
+        with span('db_write', rows=len(labels)):
+            stats = FlowWriter(db.engine).write(df, labels, connection_type, duration)
+        ROWS_WRITTEN.inc(stats['rows'])
+        if stats['rows']:
+            logging.info(f"✓ {stats['rows']} registros guardados en PostgreSQL "
+                         f"({stats['rows_per_sec']:.0f} filas/s, {stats['batches']} lotes)")
+        return stats
         
-        # Insertar usando pandas to_sql (más eficiente para múltiples registros)
-        if data_to_insert:
-            df_insert = pd.DataFrame(data_to_insert)
-            df_insert.to_sql('trafico_predic', engine, if_exists='append', index=False, method='multi')
-            print(f"✓ {len(data_to_insert)} registros guardados en PostgreSQL")
+    except Exception as e:
+        logging.error(f"Error guardando en PostgreSQL: {e}")
+        raise
+
+async def save_to_database_async(df: "pd.DataFrame", labels: Sequence[str], connection_type: str, duration: int) -> Dict[str, Any]:
+    """Versión asíncrona de save_to_database sobre el engine postgresql+asyncpg"""
+    from services.storage_service import AsyncFlowWriter
+    from database import db
+    try:
+        with span('db_write', rows=len(labels)):
+            stats = await AsyncFlowWriter(db.async_engine).write(df, labels, connection_type, duration)
+        ROWS_WRITTEN.inc(stats['rows'])
+        if stats['rows']:
+            logging.info(f"✓ {stats['rows']} registros guardados en PostgreSQL "
+                         f"({stats['rows_per_sec']:.0f} filas/s, {stats['batches']} lotes)")
+        return stats
         
     except Exception as e:
-        print(f"Error guardando en PostgreSQL: {e}")
+        logging.error(f"Error guardando en PostgreSQL: {e}")
         raise
 
+async def run_blocking(func, *args, **kwargs):
+    """Ejecuta una etapa de CPU o E/S bloqueante en el pool acotado del pipeline"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pipeline_executor, functools.partial(func, *args, **kwargs))
+
 @app.on_event("startup")
 async def startup_event():
-    """Inicializar la base de datos al arrancar la aplicación"""
-    init_database()
+    """
+    Arranque mínimo: logging y cola de análisis. Módulos, esquema y modelos se
+    preparan en segundo plano (warm_up) para que el proceso atienda peticiones ya
+    """
+    setup_logging()
+    app.state.warmup_task = asyncio.create_task(warm_up())
+    await job_manager.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Detener el análisis continuo, los workers de la cola, las escrituras de intermedios pendientes, el pool de inferencia y el logging"""
+    await stream_analyzer.stop()
+    await job_manager.stop()
+    # Solo se cierra lo que llegó a importarse
+    processing = sys.modules.get('services.processing_service')
+    if processing is not None:
+        await asyncio.to_thread(processing.ProcessingService.store.close)
+    database = sys.modules.get('database')
+    if database is not None:
+        await database.db.dispose()
+    registry_module = sys.modules.get('services.model_registry')
+    if registry_module is not None:
+        await asyncio.to_thread(registry_module.ModelRegistry.shutdown)
+    prediction = sys.modules.get('services.prediction_service')
+    if prediction is not None:
+        prediction.prediction_summary.flush()
+    shutdown_logging()
 
 @app.get("/")
 async def read_root():
@@ -321,195 +267,369 @@ async def test_connection():
         "timestamp": datetime.now().isoformat()
     }
 
-@app.post("/analyze")
-async def analyze_traffic(request: AnalysisRequest):
-    """Endpoint principal para análisis de tráfico"""
+@app.get("/api/ready")
+async def readiness():
+    """Preparación del proceso (warm-up terminado); 503 mientras se importan módulos y se cargan modelos"""
+    return JSONResponse(status_code=200 if warmup_state['ready'] else 503, content=warmup_state)
+
+async def run_analysis(job: AnalysisJob) -> Dict[str, Any]:
+    """Pipeline completo de análisis de tráfico; lo ejecutan los workers de la cola"""
+    request = AnalysisRequest(**job.params)
     try:
-        print(f"🚀 INICIANDO ANÁLISIS DE TRÁFICO DE RED")
-        print(f"Duración: {request.duration}s, Tipo: {request.connection_type}")
+        logging.info(f"🚀 Análisis {job.id}: {request.duration}s, tipo {request.connection_type}")
         
-        # 1. Captura de tráfico
-        print("\n1. Capturando tráfico de red...")
+        # 1. Captura de tráfico (un subproceso asyncio por interfaz, en paralelo)
+        logging.debug("1. Capturando tráfico de red...")
+        job.set_stage('capture', 5)
+        try:
+            interfaces = await asyncio.to_thread(interface_inventory.resolve, request.connection_type)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        capture = capture_settings(request)
+        options = CaptureService.tshark_options(capture['bpf_filter'], capture['snaplen'], capture['buffer_mb'])
         capture_service = CaptureService()
-        pcap_path = capture_service.capture_traffic(duration=request.duration)
+        with span('capture', duration=request.duration, interfaces=','.join(interfaces)):
+            captures = await capture_service.capture_interfaces_async(request.duration, interfaces, options)
         
-        if not pcap_path or not os.path.exists(pcap_path):
+        if not captures:
             raise HTTPException(status_code=500, detail="Error en la captura de tráfico")
-        print("✓ Captura completada")
+        logging.debug(f"✓ Captura completada en {len(captures)} interfaces")
         
-        # 2. Procesando con flowmeter
-        print("\n2. Extrayendo características...")
-        flowmeter_path = os.path.join(os.path.dirname(__file__), 'services', 'flowmeter.js')
+        return await analyze_pcap(
+            [pcap for _, pcap in captures], request.connection_type, request.duration, job=job,
+            interfaces=[interface for interface, _ in captures], capture=capture
+        )
         
-        if not os.path.exists(flowmeter_path):
-            raise HTTPException(status_code=500, detail="Flowmeter no encontrado")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.exception(f"❌ Error inesperado: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error inesperado: {str(e)}")
+
+def set_stage(job: Optional[AnalysisJob], stage: str, progress: int):
+    """Actualiza la etapa del análisis si se ejecuta como job"""
+    if job is not None:
+        job.set_stage(stage, progress)
+
+async def analyze_pcap(pcap_paths: Union[str, Sequence[str]], connection_type: str, duration: int,
+                       job: Optional[AnalysisJob] = None, include_full_data: bool = True,
+                       interfaces: Optional[List[str]] = None,
+                       capture: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Etapas 2-7 del pipeline sobre PCAP ya capturados (análisis puntual o segmento del
+    modo continuo). Con varios PCAP (uno por interfaz) los flujos de todos se unen en
+    un solo lote. capture son las opciones de captura usadas (ver capture_settings).
+    """
+    import numpy as np
+    import pandas as pd
+    from services.processing_service import ProcessingService
+    from services.prediction_service import PredictionService
+    from services.response_builder import columnar_frame
+
+    sample_rate = capture['sample_rate'] if capture else None
+    capture_service = CaptureService()
+    pcap_paths = [pcap_paths] if isinstance(pcap_paths, str) else list(pcap_paths)
+    
+    # 2. Extracción de flujos (con flowmeter.js, o en proceso si FLOW_EXTRACTOR=native)
+    logging.debug("2. Extrayendo características...")
+    set_stage(job, 'flow_extraction', 40)
+    pipeline_start = time.perf_counter()
+    csv_paths = []
+    flows_df = None
+    try:
+        with span('flow_extraction', extractor=PipelineConfig.FLOW_EXTRACTOR, pcaps=len(pcap_paths)):
+            if PipelineConfig.FLOW_EXTRACTOR == 'native':
+                frames = await asyncio.gather(*(run_blocking(get_flow_extractor().extract, path, sample_rate) for path in pcap_paths))
+                flows_df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+            else:
+                csv_paths = await asyncio.gather(*(
+                    capture_service.process_with_flowmeter_async(path, timeout=PipelineConfig.FLOWMETER_TIMEOUT)
+                    for path in pcap_paths
+                ))
+        logging.debug("✓ Características extraídas")
         
-        try:
-            process = subprocess.run(['node', flowmeter_path, pcap_path], 
-                                  check=True, capture_output=True, text=True, timeout=300)
-            
-            base_name = os.path.splitext(os.path.basename(pcap_path))[0]
-            csv_path = os.path.join(os.path.dirname(__file__), 'creados', f"{base_name}_Flow.csv")
-            
-            # Esperar a que el archivo CSV sea generado
-            retries = 10
-            while not os.path.exists(csv_path) and retries > 0:
-                time.sleep(2)
-                retries -= 1
-            
-            if not os.path.exists(csv_path):
-                raise HTTPException(status_code=500, detail="No se generó el archivo CSV")
-            
-            print("✓ Características extraídas")
-            
-        except subprocess.TimeoutExpired:
-            raise HTTPException(status_code=500, detail="Timeout en flowmeter")
-        except subprocess.CalledProcessError as e:
-            raise HTTPException(status_code=500, detail=f"Error en flowmeter: {e.stderr}")
+    except TimeoutError:
+        raise HTTPException(status_code=500, detail="Timeout en flowmeter")
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except (RuntimeError, ValueError) as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    # 3. Procesamiento de datos
+    logging.debug("3. Procesando datos...")
+    set_stage(job, 'processing', 55)
+    processing_service = ProcessingService()
+    
+    try:
+        if flows_df is not None:
+            processed_result = await run_blocking(processing_service.process_dataframe, flows_df)
+        else:
+            results = [await run_blocking(processing_service.process_csv, path) for path in csv_paths]
+            failed = [r for r in results if isinstance(r, dict) and not r.get('success', False)]
+            if failed or len(results) == 1:
+                processed_result = (failed or results)[0]
+            else:
+                frames = [r.get('dataframe') if isinstance(r, dict) else r for r in results]
+                processed_result = pd.concat(frames, ignore_index=True)
         
-        # 3. Procesamiento de datos
-        print("\n3. Procesando datos...")
-        processing_service = ProcessingService()
+        if isinstance(processed_result, dict):
+            if not processed_result.get('success', False):
+                raise HTTPException(status_code=500, detail=f"Error en procesamiento: {processed_result.get('error')}")
+            df = processed_result.get('dataframe')
+        else:
+            df = processed_result
         
-        try:
-            processed_result = processing_service.process_csv(csv_path)
-            
-            if isinstance(processed_result, dict):
-                if not processed_result.get('success', False):
-                    raise HTTPException(status_code=500, detail=f"Error en procesamiento: {processed_result.get('error')}")
-                df = processed_result.get('dataframe')
-            else:
-                df = processed_result
-            
-            if df is None or df.empty:
-                raise HTTPException(status_code=500, detail="DataFrame vacío")
-            
-            print(f"✓ Datos procesados - {len(df.columns)} columnas, {len(df)} filas")
-            
-            # Aplicar imputación de valores faltantes e infinitos
-            print("\n3.5. Imputando valores faltantes e infinitos...")
-            df = impute_missing_values(df)
-            print("✓ Imputación completada")
-            
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error procesando datos: {str(e)}")
+        if df is None or df.empty:
+            raise HTTPException(status_code=500, detail="DataFrame vacío")
         
-        # 4. Predicción
-        print("\n4. Analizando tráfico...")
-        prediction_service = PredictionService()
+        logging.debug(f"✓ Datos procesados - {len(df.columns)} columnas, {len(df)} filas")
         
-        try:
-            prediction_result = prediction_service.predict(df)
-            
-            if isinstance(prediction_result, dict):
-                if not prediction_result.get('success', False):
-                    raise HTTPException(status_code=500, detail=f"Error en predicción: {prediction_result.get('error')}")
-                predictions = prediction_result.get('predictions', [])
-            else:
-                predictions = prediction_result
-            
-            if not predictions:
-                raise HTTPException(status_code=500, detail="No se obtuvieron predicciones")
-            
-            print(f"✓ Análisis completado - {len(predictions)} registros analizados")
-            
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error en predicciones: {str(e)}")
+        # Aplicar imputación de valores faltantes e infinitos
+        logging.debug("3.5. Imputando valores faltantes e infinitos...")
+        set_stage(job, 'imputation', 65)
+        df = await run_blocking(impute_missing_values, df)
+        logging.debug("✓ Imputación completada")
         
-        # 5. Guardar en base de datos PostgreSQL
-        print("\n5. Guardando en base de datos PostgreSQL...")
-        try:
-            save_to_database(df, predictions, request.connection_type, request.duration)
-        except Exception as e:
-            print(f"Advertencia: Error guardando en BD: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error procesando datos: {str(e)}")
+    
+    # 4. Predicción
+    logging.debug("4. Analizando tráfico...")
+    set_stage(job, 'prediction', 70)
+    try:
+        prediction_service = await run_blocking(PredictionService)
+        prediction_result = await run_blocking(prediction_service.predict, df)
         
-        # 6. Preparar datos completos para el frontend (79 columnas)
-        full_data = []
-        for i, (_, row) in enumerate(df.iterrows()):
-            if i < len(predictions):
-                row_dict = row.to_dict()
-                row_dict['Prediction'] = predictions[i]['label']
-                row_dict['Confidence'] = predictions[i]['confidence']
-                full_data.append(row_dict)
+        if not prediction_result.get('success', False):
+            raise HTTPException(status_code=500, detail=f"Error en predicción: {prediction_result.get('error')}")
+        labels = prediction_result['labels']
+        confidences = prediction_result['confidences']
+        predictions = prediction_service.engine.to_columns(prediction_result) if include_full_data else None
         
-        # 7. Limpiar archivos temporales
-        try:
-            if os.path.exists(pcap_path):
-                os.remove(pcap_path)
-            if os.path.exists(csv_path):
-                os.remove(csv_path)
-        except:
-            pass
+        if labels is None or len(labels) == 0:
+            raise HTTPException(status_code=500, detail="No se obtuvieron predicciones")
         
-        print("✓ Proceso completado exitosamente\n")
+        logging.debug(f"✓ Análisis completado - {len(labels)} registros analizados")
         
-        return {
-            "success": True,
-            "predictions": predictions,
-            "full_data": full_data,
-            "summary": {
-                "total_flows": len(predictions),
-                "duration": request.duration,
-                "connection_type": request.connection_type,
-                "columns_count": len(df.columns) + 1  # +1 por la predicción
-            }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en predicciones: {str(e)}")
+    
+    # 5. Guardar en base de datos PostgreSQL
+    logging.debug("5. Guardando en base de datos PostgreSQL...")
+    set_stage(job, 'database', 85)
+    try:
+        await save_to_database_async(df, labels, connection_type, duration)
+    except Exception as e:
+        logging.warning(f"Error guardando en BD: {e}")
+    
+    # 6. Preparar datos completos para el frontend (79 columnas) en formato columnar
+    set_stage(job, 'response', 95)
+    with span('response_build'):
+        full_data = columnar_frame(df, labels, confidences) if include_full_data else None
+    
+    # 7. Limpiar archivos temporales
+    for path in [*pcap_paths, *csv_paths]:
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError:
+            pass
+    
+    elapsed = time.perf_counter() - pipeline_start
+    logging.info(f"✓ Análisis completado: {len(labels)} flujos, {len(df.columns)} columnas en {elapsed:.2f}s")
+    record_flows(len(labels), elapsed)
+    
+    unique_labels, counts = np.unique(np.asarray(labels, dtype=str), return_counts=True)
+    return {
+        "success": True,
+        "format": "columnar",
+        "predictions": predictions,
+        "full_data": full_data,
+        "summary": {
+            "total_flows": len(labels),
+            "duration": duration,
+            "connection_type": connection_type,
+            "interfaces": interfaces,
+            "capture": capture,
+            "columns_count": len(df.columns) + 1,  # +1 por la predicción
+            "label_counts": dict(zip(unique_labels.tolist(), counts.tolist()))
         }
-        
-    except HTTPException:
-        raise
+    }
+
+# Cola de análisis en segundo plano
+job_manager = JobManager(
+    run_analysis,
+    concurrency=PipelineConfig.JOB_CONCURRENCY,
+    max_queue=PipelineConfig.JOB_MAX_QUEUE,
+    result_ttl=PipelineConfig.JOB_RESULT_TTL,
+    max_results=PipelineConfig.JOB_MAX_RESULTS
+)
+
+@app.post("/analyze", status_code=202)
+async def analyze_traffic(request: AnalysisRequest):
+    """Encola un análisis de tráfico y devuelve su job_id de inmediato"""
+    capture_settings(request)
+    try:
+        # connection_type debe corresponder a alguna interfaz (inventario en caché)
+        await asyncio.to_thread(interface_inventory.resolve, request.connection_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        job = job_manager.submit(request.model_dump())
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    logging.info(f"📥 Análisis encolado: {job.id} ({request.duration}s, {request.connection_type})")
+    return {
+        "success": True,
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}"
+    }
+
+async def analyze_segment(pcap_path: str, connection_type: str, duration: int,
+                          capture: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Analiza un segmento del modo continuo; solo se guardan en BD y se resumen"""
+    return await analyze_pcap(pcap_path, connection_type, duration, include_full_data=False, capture=capture)
+
+# Análisis continuo por ventanas (ring buffer de tshark)
+stream_analyzer = StreamingAnalyzer(analyze_segment, history=CaptureConfig.STREAM_HISTORY,
+                                    startup_timeout=CaptureConfig.STREAM_STARTUP_TIMEOUT)
+
+@app.post("/stream/start")
+async def start_stream(request: StreamRequest):
+    """Inicia la captura continua analizando cada segmento al cerrarse"""
+    if stream_analyzer.running:
+        raise HTTPException(status_code=409, detail="El análisis continuo ya está en marcha")
+    if not CaptureConfig.MIN_DURATION <= request.segment_seconds <= CaptureConfig.MAX_DURATION:
+        raise HTTPException(
+            status_code=400,
+            detail=f"segment_seconds debe estar entre {CaptureConfig.MIN_DURATION} y {CaptureConfig.MAX_DURATION}"
+        )
+    capture = capture_settings(request)
+    try:
+        await stream_analyzer.start(request.connection_type, request.segment_seconds, CaptureConfig.STREAM_RING_FILES,
+                                    capture=capture)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError:
+        raise HTTPException(status_code=500, detail="tshark no encontrado")
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    logging.info(f"📡 Análisis continuo iniciado ({request.segment_seconds}s por segmento, {request.connection_type})")
+    return {"success": True, **stream_analyzer.status()}
+
+@app.post("/stream/stop")
+async def stop_stream():
+    """Detiene la captura continua tras analizar el último segmento"""
+    if not stream_analyzer.running:
+        raise HTTPException(status_code=409, detail="El análisis continuo no está en marcha")
+    await stream_analyzer.stop()
+    return {"success": True, **stream_analyzer.status()}
+
+@app.get("/stream/status")
+async def get_stream_status():
+    """Estado del análisis continuo y resumen de las últimas ventanas"""
+    return stream_analyzer.status()
+
+@app.get("/jobs")
+async def get_jobs():
+    """Estado de la cola de análisis"""
+    return job_manager.stats()
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, accept: Optional[str] = Header(None)):
+    """
+    Estado, etapa, progreso, tiempos por etapa y resultado de un análisis.
+    El resultado es columnar: JSON por defecto, MessagePack o Arrow IPC según Accept.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Análisis no encontrado")
+    from services.response_builder import negotiate, render
+    with span('serialization'):
+        body, media_type = await run_blocking(render, job.to_dict(), negotiate(accept))
+    return Response(content=body, media_type=media_type)
+
+@app.post("/models/reload")
+async def reload_models():
+    """Recargar los modelos ML desde disco sin reiniciar el proceso"""
+    from services.model_registry import ModelRegistry
+    try:
+        bundle = await asyncio.to_thread(ModelRegistry.reload)
+        return {"success": True, "models": bundle.info()}
     except Exception as e:
-        print(f"❌ Error inesperado: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error inesperado: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error recargando modelos: {str(e)}")
+
+@app.get("/metrics")
+async def get_metrics():
+    """Métricas de latencia por etapa y throughput en formato de texto de Prometheus"""
+    from database import db
+    pools = db.pool_status()
+    for engine_name in ('sync', 'async'):
+        for state in ('checked_in', 'checked_out', 'overflow'):
+            if pools[engine_name] is not None:
+                DB_POOL_CONNECTIONS.set(pools[engine_name][state], engine=engine_name, state=state)
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.get("/history")
-async def get_history(start: str = Query(None), end: str = Query(None)):
-    """Obtener historial de análisis desde la base de datos PostgreSQL, filtrando por rango de fechas si se especifica."""
+async def get_history(start: Optional[datetime] = Query(None), end: Optional[datetime] = Query(None),
+                      limit: int = Query(100, ge=1, le=1000), cursor: Optional[str] = Query(None)):
+    """
+    Obtener historial de análisis desde la base de datos PostgreSQL, filtrando por rango de fechas si se especifica.
+    Paginado por cursor: pasar next_cursor de la respuesta para obtener la página siguiente.
+    """
     try:
-        with engine.connect() as conn:
-            query = """
-                SELECT timestamp, connection_type, duration, prediction, COUNT(*) as count
-                FROM trafico_predic
-            """
-            filters = []
-            params = {}
-            if start:
-                filters.append("timestamp >= :start")
-                params['start'] = start
-            if end:
-                filters.append("timestamp <= :end")
-                params['end'] = end
-            if filters:
-                query += " WHERE " + " AND ".join(filters)
-            query += " GROUP BY timestamp, connection_type, duration, prediction"
-            query += " ORDER BY timestamp DESC LIMIT 100"
-            result = conn.execute(text(query), params)
-            history = []
-            for row in result:
-                history.append({
-                    "timestamp": row.timestamp.isoformat() if row.timestamp else None,
-                    "connection_type": row.connection_type,
-                    "duration": row.duration,
-                    "prediction": row.prediction,
-                    "count": row.count
-                })
-        return {"history": history}
+        return await get_history_service().page(start, end, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo historial: {str(e)}")
 
+@app.get("/export/flows")
+async def export_flows(format: str = Query('ndjson'), start: Optional[datetime] = Query(None),
+                       end: Optional[datetime] = Query(None), connection_type: Optional[str] = Query(None),
+                       prediction: Optional[str] = Query(None), after: Optional[str] = Query(None),
+                       limit: Optional[int] = Query(None, ge=1)):
+    """
+    Exportar los flujos guardados (características y predicción) en NDJSON, CSV o Arrow.
+    La respuesta se envía por bloques desde un cursor del servidor. Para reanudar una
+    exportación, after es base64(JSON [timestamp, id]) de la última fila recibida.
+    """
+    from services.history_service import HistoryService, EXPORT_FORMATS, decode_cursor
+    try:
+        HistoryService.check_format(format)
+        if after:
+            decode_cursor(after, 2)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    filename = f"trafico_predic_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+    return StreamingResponse(
+        get_history_service().export(format, start, end, connection_type, prediction, after, limit),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/network/interfaces")
+async def get_network_interfaces(refresh: bool = Query(False)):
+    """Interfaces de captura (tshark -D y /sys/class/net) con nombre, tipo y estado; en caché"""
+    return await asyncio.to_thread(interface_inventory.list, refresh)
+
 @app.get("/database/status")
 async def get_database_status():
     """Verificar estado de la base de datos PostgreSQL"""
+    from sqlalchemy import text
+    from database import db
     try:
-        with engine.connect() as conn:
+        async with db.async_engine.connect() as conn:
             # Verificar conexión
-            conn.execute(text("SELECT 1"))
+            await conn.execute(text("SELECT 1"))
             
-            # Contar registros
-            result = conn.execute(text("SELECT COUNT(*) as total FROM trafico_predic"))
+            # Contar registros (desde el resumen, sin recorrer trafico_predic)
+            result = await conn.execute(text("SELECT COALESCE(SUM(count), 0) as total FROM trafico_predic_resumen"))
             total_records = result.fetchone().total
             
             # Últimos registros
-            result = conn.execute(text("""
+            result = await conn.execute(text("""
                 SELECT timestamp, connection_type, duration, prediction 
                 FROM trafico_predic 
                 ORDER BY timestamp DESC 
@@ -530,7 +650,8 @@ async def get_database_status():
             "host": DatabaseConfig.HOST,
             "port": DatabaseConfig.PORT,
             "total_records": total_records,
-            "recent_records": recent_records
+            "recent_records": recent_records,
+            "pool": db.pool_status()
         }
         
     except Exception as e:
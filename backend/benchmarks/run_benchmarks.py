@@ -0,0 +1,269 @@
+"""
+Benchmark reproducible del pipeline sin captura.
+
+Mide ProcessingService.process_csv, impute_missing_values, PredictionService.predict
+y save_to_database sobre CSV sintéticos de CICFlowMeter (1k/10k/100k/1M filas,
+ver synthetic.py) y sobre los PCAP de creados/ (con la extracción de flujos).
+Cada caso se ejecuta en un proceso nuevo, de modo que el pico de RSS es el del
+caso y no arrastra memoria de los anteriores. Para cada caso se informa el
+tiempo por etapa (mediana de --repeat ejecuciones), el desglose de los spans
+internos (csv_read, column_cleaning, scaling_pca, classification...), filas/s
+y el pico de RSS.
+
+La escritura en base de datos solo se mide con --db-url, que debe apuntar a una
+base de datos de pruebas: se crea el esquema y se vacían trafico_predic y
+trafico_predic_resumen al terminar cada caso.
+
+Uso (desde backend/):
+    python -m benchmarks.run_benchmarks --sizes 1k,10k --output bench.json
+    python -m benchmarks.run_benchmarks --db-url postgresql://postgres@localhost/trafic_bench
+    python -m benchmarks.run_benchmarks --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run_benchmarks --baseline benchmarks/baseline.json --tolerance 0.25
+
+Con --baseline el proceso termina con código 1 si algún tiempo o el pico de RSS
+empeora más de --tolerance respecto a la referencia (regresión).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import contextlib
+import statistics
+import multiprocessing
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DATA_DIR = os.path.join(BACKEND_DIR, 'benchmarks', 'data')
+DEFAULT_SIZES = '1k,10k,100k,1m'
+# Diferencias menores (segundos / MB) se consideran ruido en la comparación con la referencia
+MIN_TIME_DELTA = 0.005
+MIN_RSS_DELTA_MB = 10.0
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    factor = {'k': 1_000, 'm': 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip('km')) * factor)
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Pico de memoria residente del proceso en MB (None si no se puede medir)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux devuelve KB y macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _span_totals() -> Dict[str, float]:
+    from services.metrics import STAGE_SECONDS
+    return {key[0]: total for key, (total, _) in STAGE_SECONDS.totals().items()}
+
+
+def run_case(case: Dict[str, Any]) -> Dict[str, Any]:
+    """Ejecuta un caso en el proceso actual (se llama en un proceso hijo)"""
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(BACKEND_DIR)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return _run_case(case)
+
+
+def _run_case(case: Dict[str, Any]) -> Dict[str, Any]:
+    import pandas as pd
+    from sqlalchemy import text
+    from app_postgres import impute_missing_values, save_to_database, get_flow_extractor
+    from services.processing_service import ProcessingService
+    from services.prediction_service import PredictionService
+    from services.model_registry import ModelRegistry
+    from database import db
+    from db_schema import init_schema, TABLE_NAME, ROLLUP_TABLE
+
+    # Calentamiento: modelos cargados y motor de inferencia compilado fuera de la medición
+    ModelRegistry.get()
+    prediction_service = PredictionService()
+    processing_service = ProcessingService()
+    if case['with_db']:
+        with db.engine.begin() as conn:
+            init_schema(conn)
+    rss_start = peak_rss_mb()
+
+    runs = []
+    rows = 0
+    for _ in range(case['repeat']):
+        spans_before = _span_totals()
+        stages: Dict[str, float] = {}
+
+        def timed(stage: str, func, *args, **kwargs):
+            start = time.perf_counter()
+            value = func(*args, **kwargs)
+            stages[stage] = stages.get(stage, 0.0) + time.perf_counter() - start
+            return value
+
+        if case['kind'] == 'csv':
+            result = timed('process_csv', processing_service.process_csv, case['source'])
+            if not result['success']:
+                raise RuntimeError(result['error'])
+            frames = [result['dataframe']]
+        else:
+            frames = []
+            for pcap in case['source']:
+                flows = timed('flow_extraction', get_flow_extractor().extract, pcap)
+                if len(flows):
+                    frames.append(timed('process_dataframe', processing_service.process_dataframe, flows)['dataframe'])
+            frames = [pd.concat(frames, ignore_index=True)] if frames else []
+
+        for df in frames:
+            df = timed('impute_missing_values', impute_missing_values, df)
+            prediction = timed('predict', prediction_service.predict, df, include_records=False)
+            if not prediction['success']:
+                raise RuntimeError(prediction['error'])
+            if case['with_db']:
+                timed('save_to_database', save_to_database, df, prediction['labels'], 'benchmark', 0)
+            rows = len(df)
+
+        spans_after = _span_totals()
+        spans = {stage: spans_after[stage] - spans_before.get(stage, 0.0) for stage in spans_after}
+        runs.append({'stages': stages, 'spans': spans})
+
+    if case['with_db']:
+        with db.engine.begin() as conn:
+            conn.execute(text(f"TRUNCATE {TABLE_NAME}, {ROLLUP_TABLE}"))
+
+    def median_of(key: str) -> Dict[str, float]:
+        names = sorted({name for run in runs for name in run[key]})
+        return {name: round(statistics.median(run[key].get(name, 0.0) for run in runs), 6) for name in names}
+
+    stages = median_of('stages')
+    total = round(sum(stages.values()), 6)
+    return {
+        'name': case['name'],
+        'rows': rows,
+        'repeat': case['repeat'],
+        'total_seconds': total,
+        'rows_per_sec': round(rows / total, 1) if total else None,
+        'stages': stages,
+        'stage_rows_per_sec': {name: round(rows / sec, 1) for name, sec in stages.items() if sec},
+        'spans': median_of('spans'),
+        'rss_after_warmup_mb': rss_start,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def run_isolated(case: Dict[str, Any]) -> Dict[str, Any]:
+    """Ejecuta el caso en un proceso hijo nuevo (spawn) y devuelve su resultado"""
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1) as pool:
+        return pool.apply(run_case, (case,))
+
+
+def environment_info() -> Dict[str, Any]:
+    import numpy, pandas, sklearn
+    return {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': numpy.__version__,
+        'pandas': pandas.__version__,
+        'sklearn': sklearn.__version__
+    }
+
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Regresiones respecto a la referencia: tiempos o pico de RSS peores que (1 + tolerance)"""
+    reference = {case['name']: case for case in baseline.get('cases', [])}
+    regressions = []
+    for case in results:
+        base = reference.get(case['name'])
+        if base is None:
+            continue
+        timings = {'total': (case['total_seconds'], base['total_seconds'])}
+        for stage, seconds in case['stages'].items():
+            if stage in base['stages']:
+                timings[stage] = (seconds, base['stages'][stage])
+        for stage, (current, previous) in timings.items():
+            if current > previous * (1 + tolerance) and current - previous > MIN_TIME_DELTA:
+                regressions.append(f"{case['name']} {stage}: {previous:.4f}s -> {current:.4f}s "
+                                   f"(+{(current / previous - 1) * 100:.0f}%)")
+        current, previous = case.get('peak_rss_mb'), base.get('peak_rss_mb')
+        if current and previous and current > previous * (1 + tolerance) and current - previous > MIN_RSS_DELTA_MB:
+            regressions.append(f"{case['name']} peak_rss: {previous:.0f}MB -> {current:.0f}MB")
+    return regressions
+
+
+def print_report(results: List[Dict[str, Any]]):
+    for case in results:
+        print(f"\n{case['name']}: {case['rows']} filas, {case['total_seconds']:.3f}s, "
+              f"{case['rows_per_sec'] or 0:.0f} filas/s, pico RSS {case['peak_rss_mb']} MB")
+        for stage, seconds in case['stages'].items():
+            rate = case['stage_rows_per_sec'].get(stage, 0)
+            print(f"  {stage:<24} {seconds:>9.4f}s {rate:>14.0f} filas/s")
+        for stage, seconds in case['spans'].items():
+            print(f"    · {stage:<20} {seconds:>9.4f}s")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark del pipeline de análisis sin captura")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="Tamaños de CSV sintético (p. ej. 1k,10k,100k,1m)")
+    parser.add_argument('--no-pcaps', action='store_true', help="No medir los PCAP de creados/")
+    parser.add_argument('--repeat', type=int, default=3, help="Ejecuciones por caso (se informa la mediana)")
+    parser.add_argument('--seed', type=int, default=42, help="Semilla de los CSV sintéticos")
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help="Directorio de caché de los CSV sintéticos")
+    parser.add_argument('--db-url', help="Base de datos de pruebas para medir save_to_database (se vacía)")
+    parser.add_argument('--output', help="Guardar los resultados en este JSON")
+    parser.add_argument('--baseline', help="JSON de referencia con el que comparar")
+    parser.add_argument('--save-baseline', help="Guardar los resultados como nueva referencia")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Empeoramiento relativo admitido")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, BACKEND_DIR)
+    if args.db_url:
+        # Los procesos hijo heredan el entorno: config.DatabaseConfig usará esta URL
+        os.environ['DATABASE_URL'] = args.db_url
+    from benchmarks.synthetic import ensure_csv, list_pcaps
+
+    cases = []
+    for size in (parse_size(s) for s in args.sizes.split(',') if s.strip()):
+        print(f"Preparando CSV sintético de {size} filas...")
+        path = ensure_csv(args.data_dir, size, args.seed)
+        cases.append({'name': f'csv_{size}', 'kind': 'csv', 'source': path})
+    pcaps = [] if args.no_pcaps else list_pcaps()
+    if pcaps:
+        cases.append({'name': 'pcaps_creados', 'kind': 'pcap', 'source': pcaps})
+
+    results = []
+    for case in cases:
+        case.update(repeat=args.repeat, with_db=bool(args.db_url))
+        print(f"Ejecutando {case['name']}...")
+        results.append(run_isolated(case))
+    print_report(results)
+
+    report = {'environment': environment_info(), 'with_db': bool(args.db_url), 'cases': results}
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"\n✓ Resultados guardados en {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regresiones (tolerancia {args.tolerance:.0%}):")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\n✓ Sin regresiones respecto a {args.baseline} (tolerancia {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""
+Generación de CSV de flujos sintéticos con el formato de CICFlowMeter.
+
+Los flujos de partida se extraen de los PCAP de creados/ con FlowExtractor, así
+que las distribuciones (puertos, tamaños, tiempos) son las de tráfico real. Para
+llegar a n filas se remuestrean con reemplazo y se aplica un ruido multiplicativo
+pequeño a las columnas continuas. Con la misma semilla el CSV es idéntico.
+"""
+import os
+import glob
+import contextlib
+import numpy as np
+import pandas as pd
+from typing import List
+
+from services.flow_extractor import FlowExtractor, FLOW_COLUMNS, FLOW_FEATURE_COLUMNS
+
+CREADOS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'creados')
+
+# Columnas que son recuentos, flags o puertos: se remuestrean sin ruido
+DISCRETE_COLUMNS = {
+    'Dst Port', 'Tot Fwd Pkts', 'Tot Bwd Pkts', 'Fwd PSH Flags', 'Bwd PSH Flags', 'Fwd URG Flags',
+    'Bwd URG Flags', 'FIN Flag Cnt', 'SYN Flag Cnt', 'RST Flag Cnt', 'PSH Flag Cnt', 'ACK Flag Cnt',
+    'URG Flag Cnt', 'CWE Flag Count', 'ECE Flag Cnt', 'Subflow Fwd Pkts', 'Subflow Bwd Pkts',
+    'Init Fwd Win Byts', 'Init Bwd Win Byts', 'Fwd Act Data Pkts', 'Fwd Seg Size Min'
+}
+
+
+def list_pcaps(directory: str = CREADOS_DIR) -> List[str]:
+    return sorted(glob.glob(os.path.join(directory, '*.pcap')) + glob.glob(os.path.join(directory, '*.pcapng')))
+
+
+def seed_flows(pcaps: List[str]) -> pd.DataFrame:
+    """Flujos reales de los PCAP indicados (sin los mensajes de FlowExtractor)"""
+    extractor = FlowExtractor()
+    frames = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for path in pcaps:
+            frames.append(extractor.extract(path))
+    frames = [df for df in frames if len(df)]
+    if not frames:
+        raise RuntimeError("No se extrajeron flujos de los PCAP de referencia")
+    return pd.concat(frames, ignore_index=True)
+
+
+def synthetic_flows(seed: pd.DataFrame, n_rows: int, random_state: int = 42, jitter: float = 0.05) -> pd.DataFrame:
+    """Remuestrea seed hasta n_rows filas con ruido multiplicativo en las columnas continuas"""
+    rng = np.random.default_rng(random_state)
+    df = seed.iloc[rng.integers(0, len(seed), n_rows)].reset_index(drop=True)
+    continuous = [col for col in FLOW_FEATURE_COLUMNS if col not in DISCRETE_COLUMNS]
+    values = df[continuous].to_numpy(dtype=np.float64)
+    values *= rng.uniform(1 - jitter, 1 + jitter, size=values.shape)
+    df[continuous] = values
+    df['Flow ID'] = [f'bench-{i}' for i in range(n_rows)]
+    return df[FLOW_COLUMNS]
+
+
+def ensure_csv(directory: str, n_rows: int, random_state: int = 42, pcaps: List[str] = None) -> str:
+    """Ruta del CSV sintético de n_rows filas, generándolo solo si no existe ya"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'flows_{n_rows}_seed{random_state}.csv')
+    if not os.path.exists(path):
+        seed = seed_flows(pcaps or list_pcaps())
+        tmp_path = path + '.tmp'
+        synthetic_flows(seed, n_rows, random_state).to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,343 @@
+"""
+Importación masiva de capturas históricas sin pasar por la API.
+
+Recorre directorios o patrones glob de PCAP/PCAPNG y CSV de CICFlowMeter
+(*_Flow.csv, p. ej. el backlog de creados/) y ejecuta para cada archivo la
+extracción de flujos (FlowExtractor), el procesamiento, la imputación, la
+predicción y la carga con COPY en trafico_predic, igual que /analyze pero sin
+captura ni respuesta HTTP.
+
+- Paralelo: cada archivo se procesa en un proceso del pool (--workers), que
+  carga los modelos una sola vez al arrancar.
+- Encadenado: dentro de cada proceso el COPY de un bloque se hace en un hilo
+  mientras se lee, procesa y predice el bloque siguiente.
+- Reanudable: cada bloque de --chunk-rows flujos se carga en su propia
+  transacción, que también actualiza importacion_progreso; tras una
+  interrupción se vuelve a lanzar el mismo comando y se continúa por el primer
+  bloque que no llegó a confirmarse, sin duplicar ni perder flujos. Los
+  archivos completados se omiten salvo con --force, que reimporta el archivo
+  y borra los flujos de la importación anterior (y su resumen) en la misma
+  transacción que el primer bloque nuevo.
+
+Los flujos se guardan con el timestamp de la importación y con el
+connection_type indicado (por defecto 'import').
+
+Uso (desde backend/):
+    python bulk_import.py creados/
+    python bulk_import.py "/datos/capturas/**/*.pcap" --workers 4 --chunk-rows 200000
+    python bulk_import.py creados/*_Flow.csv --db-url postgresql://postgres@localhost/trafic_red
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BACKEND_DIR)
+
+PCAP_EXTENSIONS = ('.pcap', '.pcapng', '.cap')
+CSV_EXTENSIONS = ('.csv',)
+
+# Estado del proceso worker (lo rellena _init_worker)
+_worker: Dict[str, Any] = {}
+
+
+def source_kind(path: str) -> Optional[str]:
+    """'pcap', 'csv' o None según la extensión"""
+    lower = path.lower()
+    if lower.endswith(PCAP_EXTENSIONS):
+        return 'pcap'
+    if lower.endswith(CSV_EXTENSIONS):
+        return 'csv'
+    return None
+
+
+def discover_sources(patterns: List[str]) -> List[str]:
+    """Archivos de entrada (rutas absolutas, sin repetir) a partir de directorios, globs o archivos"""
+    found = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, files in os.walk(pattern):
+                found.extend(os.path.join(root, f) for f in files)
+        elif glob.has_magic(pattern):
+            found.extend(glob.glob(pattern, recursive=True))
+        else:
+            found.append(pattern)
+    sources = {os.path.abspath(path) for path in found if os.path.isfile(path) and source_kind(path)}
+    return sorted(sources)
+
+
+def fingerprint(path: str) -> str:
+    """Identifica la versión del archivo: si cambia, el progreso guardado ya no vale"""
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def checkpoint_sql(batch: bool = True) -> str:
+    """
+    Upsert del progreso de un archivo. Con batch se añade el timestamp de la
+    transacción (el que reciben los flujos del bloque) a batches.
+    """
+    from db_schema import IMPORT_TABLE
+    batches = "ARRAY[CURRENT_TIMESTAMP::timestamp]" if batch else "'{}'::timestamp[]"
+    return (f"INSERT INTO {IMPORT_TABLE} (source, fingerprint, chunk_rows, chunks, flows, completed, "
+            f"connection_type, batches, updated_at) "
+            f"VALUES (%s, %s, %s, %s, %s, %s, %s, {batches}, CURRENT_TIMESTAMP) "
+            f"ON CONFLICT (source) DO UPDATE SET fingerprint = EXCLUDED.fingerprint, "
+            f"chunk_rows = EXCLUDED.chunk_rows, chunks = EXCLUDED.chunks, flows = EXCLUDED.flows, "
+            f"completed = EXCLUDED.completed, connection_type = EXCLUDED.connection_type, "
+            f"batches = {IMPORT_TABLE}.batches || EXCLUDED.batches, updated_at = EXCLUDED.updated_at")
+
+
+def purge_statements(source: str) -> List[Tuple[str, tuple]]:
+    """
+    Borra los flujos y el resumen de la importación anterior de source: sus filas
+    son las de su connection_type con el timestamp de alguno de sus bloques
+    """
+    from db_schema import IMPORT_TABLE, TABLE_NAME, ROLLUP_TABLE
+    statements = [
+        (f"DELETE FROM {table} t USING {IMPORT_TABLE} p WHERE p.source = %s "
+         f"AND t.connection_type = p.connection_type AND t.timestamp = ANY(p.batches)", (source,))
+        for table in (TABLE_NAME, ROLLUP_TABLE)
+    ]
+    statements.append((f"UPDATE {IMPORT_TABLE} SET batches = '{{}}' WHERE source = %s", (source,)))
+    return statements
+
+
+def load_progress(engine, sources: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Progreso guardado de cada archivo de entrada"""
+    from sqlalchemy import text
+    from db_schema import IMPORT_TABLE
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text(f"SELECT source, fingerprint, chunk_rows, chunks, flows, completed, connection_type FROM {IMPORT_TABLE} "
+                 f"WHERE source = ANY(:sources)"),
+            {'sources': sources}
+        ).mappings().all()
+    return {row['source']: dict(row) for row in rows}
+
+
+def plan_tasks(sources: List[str], progress: Dict[str, Dict[str, Any]], args) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Tareas pendientes (la más grande primero, para repartir mejor la carga) y
+    mensajes de los archivos que se omiten
+    """
+    tasks, skipped = [], []
+    for source in sources:
+        current = fingerprint(source)
+        saved = progress.get(source)
+        task = {
+            'source': source,
+            'kind': source_kind(source),
+            'fingerprint': current,
+            'chunk_rows': args.chunk_rows,
+            'start_chunk': 0,
+            'start_flows': 0,
+            'connection_type': args.connection_type,
+            'duration': args.duration,
+            'sample_rate': args.sample_rate,
+            'purge': bool(saved) and args.force
+        }
+        if saved and not args.force:
+            if saved['fingerprint'] != current:
+                skipped.append(f"{source}: cambió desde la importación anterior (usar --force para reimportarlo)")
+                continue
+            if saved['completed']:
+                skipped.append(f"{source}: ya importado ({saved['flows']} flujos)")
+                continue
+            # Los bloques ya cargados se definieron con el tamaño de bloque y el connection_type de entonces
+            task.update(chunk_rows=saved['chunk_rows'], start_chunk=saved['chunks'], start_flows=saved['flows'],
+                        connection_type=saved['connection_type'] or args.connection_type)
+        tasks.append(task)
+    tasks.sort(key=lambda t: os.path.getsize(t['source']), reverse=True)
+    return tasks, skipped
+
+
+def _init_worker():
+    """Carga modelos, servicios y engine de base de datos una vez por proceso"""
+    try:
+        from threadpoolctl import threadpool_limits
+        # Un hilo de BLAS por proceso: el paralelismo lo dan los procesos
+        threadpool_limits(1)
+    except ImportError:
+        pass
+    from config import PipelineConfig, ModelConfig
+    from database import create_sync_engine
+    from db_schema import partitions, table_kind, TABLE_NAME
+    from services.flow_extractor import FlowExtractor
+    from services.model_registry import ModelRegistry
+    from services.prediction_service import PredictionService
+    from services.processing_service import ProcessingService
+
+    engine = create_sync_engine(statement_timeout_ms=0)
+    with engine.connect() as conn:
+        partitions.enabled = table_kind(conn, TABLE_NAME) == 'p'
+    _worker.update(
+        engine=engine,
+        processing=ProcessingService(),
+        prediction=PredictionService(),
+        medians=ModelRegistry.get().medians if ModelConfig.USE_TRAINING_MEDIANS else None,
+        extractor=FlowExtractor(
+            flow_timeout_us=int(PipelineConfig.FLOW_TIMEOUT * 1_000_000),
+            activity_timeout_us=int(PipelineConfig.ACTIVITY_TIMEOUT * 1_000_000)
+        )
+    )
+
+
+def iter_frames(task: Dict[str, Any]) -> Iterator:
+    """Bloques de flujos sin procesar del archivo (chunk_rows filas cada uno, en orden estable)"""
+    chunk_rows = task['chunk_rows']
+    if task['kind'] == 'csv':
+        yield from _worker['processing'].reader.iter_chunks(task['source'], chunk_rows)
+        return
+    flows = _worker['extractor'].extract(task['source'], task['sample_rate'])
+    for offset in range(0, len(flows), chunk_rows):
+        yield flows.iloc[offset:offset + chunk_rows].reset_index(drop=True)
+
+
+def import_file(task: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Importa un archivo a partir de su primer bloque sin confirmar.
+    Como mucho hay un COPY en curso mientras se prepara el bloque siguiente.
+    Con purge (--force) la transacción del primer bloque borra antes los flujos
+    de la importación anterior.
+    """
+    from services.imputation_service import ImputationService
+    from services.storage_service import FlowWriter
+
+    start = time.perf_counter()
+    engine = _worker['engine']
+    writer = FlowWriter(engine)
+    upsert = checkpoint_sql()
+    source, chunk_rows, connection_type = task['source'], task['chunk_rows'], task['connection_type']
+    flows, chunks = task['start_flows'], task['start_chunk']
+    purge = purge_statements(source) if task['purge'] else []
+    imported = 0
+
+    copier = ThreadPoolExecutor(max_workers=1, thread_name_prefix="copy")
+    pending = None
+    try:
+        for index, frame in enumerate(iter_frames(task)):
+            if index < task['start_chunk'] or frame.empty:
+                continue
+            processed = _worker['processing'].process_dataframe(frame)
+            if not processed['success']:
+                raise RuntimeError(processed['error'])
+            df = ImputationService(_worker['medians']).impute(processed['dataframe'])
+            prediction = _worker['prediction'].predict(df)
+            if not prediction['success']:
+                raise RuntimeError(prediction['error'])
+            labels = prediction['labels']
+
+            if pending is not None:
+                pending.result()
+            flows += len(labels)
+            imported += len(labels)
+            chunks = index + 1
+            checkpoint = (upsert, (source, task['fingerprint'], chunk_rows, chunks, flows, False, connection_type))
+            pending = copier.submit(writer.write, df, labels, connection_type, task['duration'], [*purge, checkpoint])
+            purge = []
+        if pending is not None:
+            pending.result()
+    finally:
+        copier.shutdown(wait=True)
+
+    with engine.begin() as conn:
+        # Archivo sin flujos: la importación anterior se borra igualmente
+        for sql, params in purge:
+            conn.exec_driver_sql(sql, params)
+        conn.exec_driver_sql(checkpoint_sql(batch=False),
+                             (source, task['fingerprint'], chunk_rows, chunks, flows, True, connection_type))
+    return {
+        'source': source,
+        'flows': flows,
+        'imported': imported,
+        'resumed_from_chunk': task['start_chunk'],
+        'seconds': time.perf_counter() - start
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Importación masiva de PCAP y CSV de flujos a PostgreSQL")
+    parser.add_argument('paths', nargs='+', help="Directorios, patrones glob o archivos (.pcap, .pcapng, .csv)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Procesos en paralelo")
+    parser.add_argument('--chunk-rows', type=int, default=None,
+                        help="Flujos por bloque (transacción y punto de control); por defecto CSV_CHUNK_ROWS")
+    parser.add_argument('--connection-type', default='import', help="connection_type de los flujos importados")
+    parser.add_argument('--duration', type=int, default=0, help="Valor de la columna duration")
+    parser.add_argument('--sample-rate', type=float, default=1.0, help="Fracción de conexiones de los PCAP")
+    parser.add_argument('--force', action='store_true', help="Reimportar desde el principio los archivos ya importados o modificados, "
+                             "borrando los flujos de la importación anterior")
+    parser.add_argument('--db-url', help="Base de datos de destino (por defecto la de la configuración)")
+    args = parser.parse_args(argv)
+
+    # Los procesos hijo heredan el entorno: sin pool de inferencia anidado ni copias en disco del intermedio
+    if args.db_url:
+        os.environ['DATABASE_URL'] = args.db_url
+    os.environ['INFERENCE_WORKERS'] = '0'
+    os.environ['PERSIST_INTERMEDIATES'] = 'False'
+    from config import PipelineConfig
+    from database import create_sync_engine
+    from db_schema import init_schema
+
+    if not 0 < args.sample_rate <= 1:
+        parser.error("--sample-rate debe estar en (0, 1]")
+    args.chunk_rows = args.chunk_rows or PipelineConfig.CSV_CHUNK_ROWS
+
+    sources = discover_sources(args.paths)
+    if not sources:
+        print("No se encontraron archivos .pcap, .pcapng ni .csv")
+        return 1
+
+    engine = create_sync_engine(statement_timeout_ms=0)
+    with engine.begin() as conn:
+        init_schema(conn)
+    tasks, skipped = plan_tasks(sources, load_progress(engine, sources), args)
+    # Los workers abren sus propias conexiones
+    engine.dispose()
+    for line in skipped:
+        print(f"· {line}")
+    if not tasks:
+        print("✓ Nada que importar")
+        return 0
+
+    workers = max(1, min(args.workers, len(tasks)))
+    print(f"Importando {len(tasks)} archivos con {workers} procesos (bloques de {args.chunk_rows} flujos)...")
+    start = time.perf_counter()
+    total, failures = 0, []
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=_init_worker)
+    try:
+        futures = {pool.submit(import_file, task): task for task in tasks}
+        for done, future in enumerate(as_completed(futures), 1):
+            source = futures[future]['source']
+            try:
+                result = future.result()
+            except Exception as e:
+                failures.append(source)
+                print(f"❌ [{done}/{len(tasks)}] {source}: {e}")
+                continue
+            total += result['imported']
+            resumed = f", reanudado en el bloque {result['resumed_from_chunk']}" if result['resumed_from_chunk'] else ""
+            print(f"✓ [{done}/{len(tasks)}] {source}: {result['imported']} flujos en "
+                  f"{result['seconds']:.1f}s{resumed}")
+    except KeyboardInterrupt:
+        print("\nInterrumpido: los bloques ya confirmados quedan guardados; relanzar el comando para continuar")
+        pool.shutdown(wait=False, cancel_futures=True)
+        return 130
+    pool.shutdown(wait=True)
+
+    elapsed = time.perf_counter() - start
+    print(f"\n{total} flujos importados en {elapsed:.1f}s ({total / elapsed if elapsed else 0:.0f} flujos/s)")
+    if failures:
+        print(f"❌ {len(failures)} archivos con errores; relanzar el comando para reintentarlos")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
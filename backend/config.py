@@ -14,6 +14,10 @@ class DatabaseConfig:
     HOST = os.getenv('DB_HOST', 'localhost')
     PORT = int(os.getenv('DB_PORT', 5432))
     PASSWORD = os.getenv('DB_PASSWORD', '')
+    # Crear o actualizar el esquema al arrancar la API. Fuera de desarrollo es un paso
+    # aparte que se ejecuta una vez por despliegue (python db_schema.py) y el arranque
+    # solo comprueba que el esquema existe
+    AUTO_MIGRATE = os.getenv('AUTO_MIGRATE', str(os.getenv('ENVIRONMENT', 'development') == 'development')).lower() in ('true', '1', 't')
 
     @classmethod
     def get_database_url(cls):
@@ -46,6 +50,25 @@ class DatabaseConfig:
     # Pool configuration
     POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
     MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    # Segundos de espera por una conexión libre del pool
+    POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+    # Reciclar conexiones con más de N segundos (-1 = nunca)
+    POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    # Comprobar la conexión (SELECT 1) antes de entregarla desde el pool
+    POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'True').lower() in ('true', '1', 't')
+    # Segundos máximos para establecer una conexión nueva
+    CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', 10))
+    # statement_timeout de PostgreSQL en milisegundos (0 = sin límite)
+    STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 60000))
+    
+    # Filas por lote en las inserciones masivas con COPY
+    COPY_BATCH_SIZE = int(os.getenv('DB_COPY_BATCH_SIZE', 50000))
+    # Formato de COPY: 'binary' (por defecto) o 'csv'
+    COPY_FORMAT = os.getenv('DB_COPY_FORMAT', 'binary')
+    # Particiones mensuales de trafico_predic que se crean por adelantado
+    PARTITION_MONTHS_AHEAD = int(os.getenv('DB_PARTITION_MONTHS_AHEAD', 1))
+    # Filas por lote leídas del cursor del servidor en /export/flows
+    EXPORT_BATCH_SIZE = int(os.getenv('DB_EXPORT_BATCH_SIZE', 5000))
 
 class ServerConfig:
     """Configuración del servidor"""
@@ -54,20 +77,114 @@ class ServerConfig:
     DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
     ENVIRONMENT = os.getenv('ENVIRONMENT', 'development')
 
+class PipelineConfig:
+    """Configuración del pipeline de análisis"""
+    # Hilos para las etapas de CPU (procesamiento, imputación, predicción)
+    WORKERS = int(os.getenv('PIPELINE_WORKERS', 4))
+    # Extracción de flujos: 'native' (FlowExtractor en proceso) o 'cicflowmeter' (flowmeter.js + CSV).
+    # El nativo reproduce los flujos y las características de CICFlowMeter 4.0
+    # (tests/test_flow_extractor_parity.py)
+    FLOW_EXTRACTOR = os.getenv('FLOW_EXTRACTOR', 'native').lower()
+    # Timeout de flujo y de actividad del extractor nativo en segundos (valores de CICFlowMeter)
+    FLOW_TIMEOUT = float(os.getenv('FLOW_TIMEOUT', 120))
+    ACTIVITY_TIMEOUT = float(os.getenv('FLOW_ACTIVITY_TIMEOUT', 5))
+    # Lectura del CSV de flowmeter: motor ('auto' usa pyarrow si está instalado), filas por bloque y espera máxima (s)
+    CSV_ENGINE = os.getenv('CSV_ENGINE', 'auto')
+    CSV_CHUNK_ROWS = int(os.getenv('CSV_CHUNK_ROWS', 100000))
+    CSV_WAIT_TIMEOUT = float(os.getenv('CSV_WAIT_TIMEOUT', 20))
+    # Tiempo máximo del flowmeter en segundos
+    FLOWMETER_TIMEOUT = int(os.getenv('FLOWMETER_TIMEOUT', 300))
+    # Análisis simultáneos, análisis pendientes admitidos, retención de resultados (s)
+    # y número máximo de resultados guardados en memoria
+    JOB_CONCURRENCY = int(os.getenv('JOB_CONCURRENCY', 2))
+    JOB_MAX_QUEUE = int(os.getenv('JOB_MAX_QUEUE', 20))
+    JOB_RESULT_TTL = int(os.getenv('JOB_RESULT_TTL', 3600))
+    JOB_MAX_RESULTS = int(os.getenv('JOB_MAX_RESULTS', 100))
+    # Persistencia de los DataFrames procesados (desactivada por defecto; requiere pyarrow)
+    PERSIST_INTERMEDIATES = os.getenv('PERSIST_INTERMEDIATES', 'False').lower() in ('true', '1', 't')
+    PERSIST_DIR = os.getenv('PERSIST_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'processed'))
+    PERSIST_FORMAT = os.getenv('PERSIST_FORMAT', 'parquet')  # 'parquet' o 'feather'
+    PERSIST_COMPRESSION = os.getenv('PERSIST_COMPRESSION', 'zstd')
+    PERSIST_MAX_FILES = int(os.getenv('PERSIST_MAX_FILES', 50))
+    PERSIST_MAX_MB = int(os.getenv('PERSIST_MAX_MB', 500))
+
 class CaptureConfig:
     """Configuración de captura de tráfico"""
     TIMEOUT = int(os.getenv('CAPTURE_TIMEOUT', 300))
     DEFAULT_INTERFACE = os.getenv('DEFAULT_INTERFACE', 'auto')
+    # Inventario de interfaces (tshark -D y /sys/class/net): segundos de caché y timeout de tshark -D
+    INTERFACE_CACHE_TTL = float(os.getenv('INTERFACE_CACHE_TTL', 300))
+    INTERFACE_DISCOVERY_TIMEOUT = float(os.getenv('INTERFACE_DISCOVERY_TIMEOUT', 10))
+    # Máximo de interfaces capturadas a la vez en un análisis
+    MAX_INTERFACES = int(os.getenv('MAX_CAPTURE_INTERFACES', 4))
+    # Filtro BPF aplicado en el kernel (tshark -f), p. ej. "tcp or udp"; vacío = todo el tráfico
+    BPF_FILTER = os.getenv('CAPTURE_BPF_FILTER', '')
+    # Bytes guardados por paquete (tshark -s; 0 = completos). Las características solo
+    # usan cabeceras y el extractor nativo toma las longitudes de la cabecera IP.
+    # Con FLOW_EXTRACTOR=cicflowmeter se capturan siempre los paquetes completos.
+    SNAPLEN = int(os.getenv('CAPTURE_SNAPLEN', 128))
+    # Mínimo admitido: Ethernet + VLAN + IPv6 + TCP sin opciones
+    MIN_SNAPLEN = 96
+    # Buffer de captura del kernel en MB (tshark -B; 0 = el de tshark)
+    BUFFER_MB = int(os.getenv('CAPTURE_BUFFER_MB', 0))
+    # Fracción de conexiones analizadas (muestreo por hash de la 5-tupla; 1 = todas)
+    FLOW_SAMPLE_RATE = float(os.getenv('FLOW_SAMPLE_RATE', 1.0))
     MIN_DURATION = int(os.getenv('MIN_CAPTURE_DURATION', 5))
     MAX_DURATION = int(os.getenv('MAX_CAPTURE_DURATION', 60))
+    # Modo continuo: duración de cada segmento del ring buffer y número de segmentos que conserva tshark
+    STREAM_SEGMENT_SECONDS = int(os.getenv('STREAM_SEGMENT_SECONDS', 5))
+    STREAM_RING_FILES = int(os.getenv('STREAM_RING_FILES', 10))
+    STREAM_HISTORY = int(os.getenv('STREAM_HISTORY', 20))
+    # Segundos que tshark debe seguir vivo tras arrancar para dar el modo continuo por iniciado
+    STREAM_STARTUP_TIMEOUT = float(os.getenv('STREAM_STARTUP_TIMEOUT', 1.0))
     
     @classmethod
     def get_sync_connection_string(cls):
-        return f"postgresql+psycopg2://{cls.USER}:{cls.PASSWORD}@{cls.HOST}:{cls.PORT}/{cls.NAME}"
+        return DatabaseConfig.get_sync_connection_string()
     
     @classmethod
     def get_async_connection_string(cls):
-        return f"postgresql+asyncpg://{cls.USER}:{cls.PASSWORD}@{cls.HOST}:{cls.PORT}/{cls.NAME}"
+        return DatabaseConfig.get_connection_string()
+
+class LoggingConfig:
+    """Configuración del logging (una sola vez al arrancar, escritura en un hilo aparte)"""
+    LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+    # Niveles por logger, p. ej. "sqlalchemy.engine=WARNING,services.metrics=DEBUG"
+    LEVELS = os.getenv('LOG_LEVELS', '')
+    # Archivo de log con rotación; vacío = solo consola
+    FILE = os.getenv('LOG_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'app.log'))
+    MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024))
+    BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5))
+    FORMAT = os.getenv('LOG_FORMAT', '%(asctime)s [%(levelname)s] %(name)s: %(message)s')
+    # Segundos entre resúmenes agregados de predicciones (0 = un resumen por lote)
+    PREDICTION_SUMMARY_INTERVAL = float(os.getenv('PREDICTION_SUMMARY_INTERVAL', 60))
+
+class ModelConfig:
+    """Configuración de carga de modelos ML"""
+    MODELS_DIR = os.getenv('MODELS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ml_models'))
+    # Cargar los modelos al arrancar (True) o en el primer uso (False)
+    PRELOAD = os.getenv('PRELOAD_MODELS', 'True').lower() in ('true', '1', 't')
+    # mmap_mode de joblib ('r', 'r+', 'c') para arrays grandes; vacío = sin mmap
+    MMAP_MODE = os.getenv('MODEL_MMAP_MODE') or None
+    # Imputar con las medianas de entrenamiento (ml_models/training_medians.json) si existen
+    USE_TRAINING_MEDIANS = os.getenv('USE_TRAINING_MEDIANS', 'True').lower() in ('true', '1', 't')
+    # Formato de los modelos: 'joblib', 'compact' (ml_models/compact, generada con
+    # python -m services.compact_model; no se versiona) o 'auto' (la exportación compacta
+    # si existe y está al día con los joblib). Por defecto joblib:
+    # el bosque en NumPy puro arranca antes pero predice más despacio que scikit-learn
+    MODEL_FORMAT = os.getenv('MODEL_FORMAT', 'joblib').lower()
+    # Caché de predicciones por huella del vector de entrada (LRU con TTL); tamaño 0 = desactivada
+    PREDICTION_CACHE_SIZE = int(os.getenv('PREDICTION_CACHE_SIZE', 100_000))
+    PREDICTION_CACHE_TTL = float(os.getenv('PREDICTION_CACHE_TTL', 600))
+    # Bits de mantisa conservados al cuantizar cada característica (12 ≈ 0,02 % de error relativo)
+    PREDICTION_CACHE_MANTISSA_BITS = int(os.getenv('PREDICTION_CACHE_MANTISSA_BITS', 12))
+    # Inferencia repartida en un pool de procesos para lotes grandes; 0 o 1 workers = desactivada
+    INFERENCE_WORKERS = int(os.getenv('INFERENCE_WORKERS', 0))
+    # Filas mínimas de un lote para repartirlo y filas por tarea
+    INFERENCE_SHARD_MIN_ROWS = int(os.getenv('INFERENCE_SHARD_MIN_ROWS', 200_000))
+    INFERENCE_SHARD_ROWS = int(os.getenv('INFERENCE_SHARD_ROWS', 100_000))
+    # Método de arranque de los workers ('spawn' es seguro con hilos; 'forkserver' arranca más rápido en Linux)
+    INFERENCE_MP_CONTEXT = os.getenv('INFERENCE_MP_CONTEXT', 'spawn')
 
 class Config:
     # Environment
@@ -0,0 +1,110 @@
+"""
+Acceso a PostgreSQL: engines síncrono (psycopg2) y asíncrono (asyncpg) compartidos.
+
+Los engines se crean en el primer uso, no al importar, de modo que importar la
+aplicación no depende de que PostgreSQL esté disponible. Ambos usan el pool de
+DatabaseConfig (tamaño, overflow, timeout, reciclado y pre-ping) y fijan
+statement_timeout y el timeout de conexión en cada conexión nueva.
+"""
+import threading
+from typing import Dict, Any, Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+
+from config import DatabaseConfig
+
+
+def pool_options() -> Dict[str, Any]:
+    """Opciones de pool comunes a los dos engines"""
+    return {
+        'pool_size': DatabaseConfig.POOL_SIZE,
+        'max_overflow': DatabaseConfig.MAX_OVERFLOW,
+        'pool_timeout': DatabaseConfig.POOL_TIMEOUT,
+        'pool_recycle': DatabaseConfig.POOL_RECYCLE,
+        'pool_pre_ping': DatabaseConfig.POOL_PRE_PING
+    }
+
+
+def create_sync_engine(statement_timeout_ms: Optional[int] = None) -> Engine:
+    """Engine psycopg2 con el pool configurado"""
+    timeout = DatabaseConfig.STATEMENT_TIMEOUT_MS if statement_timeout_ms is None else statement_timeout_ms
+    return create_engine(
+        DatabaseConfig.get_sync_connection_string(),
+        connect_args={
+            'connect_timeout': DatabaseConfig.CONNECT_TIMEOUT,
+            'options': f'-c statement_timeout={timeout}'
+        },
+        **pool_options()
+    )
+
+
+def create_async_db_engine(statement_timeout_ms: Optional[int] = None) -> AsyncEngine:
+    """Engine asyncpg con el pool configurado"""
+    timeout = DatabaseConfig.STATEMENT_TIMEOUT_MS if statement_timeout_ms is None else statement_timeout_ms
+    return create_async_engine(
+        DatabaseConfig.get_connection_string(),
+        connect_args={
+            'timeout': DatabaseConfig.CONNECT_TIMEOUT,
+            'server_settings': {'statement_timeout': str(timeout)}
+        },
+        **pool_options()
+    )
+
+
+def _pool_stats(engine) -> Dict[str, Any]:
+    pool = engine.pool
+    return {
+        'size': pool.size(),
+        'checked_in': pool.checkedin(),
+        'checked_out': pool.checkedout(),
+        'overflow': max(pool.overflow(), 0),
+        'max_overflow': DatabaseConfig.MAX_OVERFLOW
+    }
+
+
+class Database:
+    """
+    Engines de la aplicación, creados de forma perezosa y compartidos por todo
+    el proceso (FlowWriter usa el síncrono; los endpoints y AsyncFlowWriter el asíncrono).
+    """
+
+    def __init__(self):
+        self._engine: Optional[Engine] = None
+        self._async_engine: Optional[AsyncEngine] = None
+        self._lock = threading.Lock()
+
+    @property
+    def engine(self) -> Engine:
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    self._engine = create_sync_engine()
+        return self._engine
+
+    @property
+    def async_engine(self) -> AsyncEngine:
+        if self._async_engine is None:
+            with self._lock:
+                if self._async_engine is None:
+                    self._async_engine = create_async_db_engine()
+        return self._async_engine
+
+    def pool_status(self) -> Dict[str, Any]:
+        """Estado de los pools ya creados (conexiones en uso, libres y overflow)"""
+        return {
+            'sync': _pool_stats(self._engine) if self._engine is not None else None,
+            'async': _pool_stats(self._async_engine.sync_engine) if self._async_engine is not None else None,
+            'statement_timeout_ms': DatabaseConfig.STATEMENT_TIMEOUT_MS
+        }
+
+    async def dispose(self):
+        """Cierra las conexiones de ambos pools (al apagar la aplicación)"""
+        if self._async_engine is not None:
+            await self._async_engine.dispose()
+        if self._engine is not None:
+            self._engine.dispose()
+
+
+db = Database()
@@ -0,0 +1,355 @@
+"""
+Esquema de PostgreSQL para trafico_predic.
+
+- trafico_predic está particionada por rango mensual de timestamp (una partición
+  trafico_predic_YYYYMM por mes y una partición DEFAULT de respaldo), con índice
+  sobre timestamp, de modo que las consultas por fechas solo leen los meses implicados.
+- trafico_predic_resumen guarda una fila por análisis y predicción con el número
+  de flujos; la mantiene FlowWriter en la misma transacción del COPY, y /history
+  y /database/status la leen en lugar de agregar la tabla de flujos.
+- importacion_progreso guarda por archivo los bloques ya cargados por bulk_import.py,
+  actualizada en la misma transacción que el COPY de cada bloque, y el timestamp
+  de cada bloque (batches) para poder borrar sus flujos al reimportar.
+
+Uso: python db_schema.py            (crea o actualiza el esquema; paso de despliegue con AUTO_MIGRATE=false)
+     python db_schema.py --migrate  (además convierte una tabla trafico_predic antigua sin particionar)
+"""
+import os
+import sys
+import threading
+from datetime import datetime, date
+from typing import List, Optional, Set, Tuple
+
+from sqlalchemy import text
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import DatabaseConfig
+
+# Tabla donde se guardan los flujos y sus predicciones
+TABLE_NAME = 'trafico_predic'
+# Resumen por análisis y predicción mantenido en la misma transacción que los flujos
+ROLLUP_TABLE = 'trafico_predic_resumen'
+
+# Mapear nombres de columnas a nombres de base de datos (snake_case)
+COLUMN_MAPPING = {
+    'Destination Port': 'destination_port',
+    'Flow Duration': 'flow_duration',
+    'Total Fwd Packets': 'total_fwd_packets',
+    'Total Backward Packets': 'total_backward_packets',
+    'Total Length of Fwd Packets': 'total_length_fwd_packets',
+    'Total Length of Bwd Packets': 'total_length_bwd_packets',
+    'Fwd Packet Length Max': 'fwd_packet_length_max',
+    'Fwd Packet Length Min': 'fwd_packet_length_min',
+    'Fwd Packet Length Mean': 'fwd_packet_length_mean',
+    'Fwd Packet Length Std': 'fwd_packet_length_std',
+    'Bwd Packet Length Max': 'bwd_packet_length_max',
+    'Bwd Packet Length Min': 'bwd_packet_length_min',
+    'Bwd Packet Length Mean': 'bwd_packet_length_mean',
+    'Bwd Packet Length Std': 'bwd_packet_length_std',
+    'Flow Bytes/s': 'flow_bytes_s',
+    'Flow Packets/s': 'flow_packets_s',
+    'Flow IAT Mean': 'flow_iat_mean',
+    'Flow IAT Std': 'flow_iat_std',
+    'Flow IAT Max': 'flow_iat_max',
+    'Flow IAT Min': 'flow_iat_min',
+    'Fwd IAT Total': 'fwd_iat_total',
+    'Fwd IAT Mean': 'fwd_iat_mean',
+    'Fwd IAT Std': 'fwd_iat_std',
+    'Fwd IAT Max': 'fwd_iat_max',
+    'Fwd IAT Min': 'fwd_iat_min',
+    'Bwd IAT Total': 'bwd_iat_total',
+    'Bwd IAT Mean': 'bwd_iat_mean',
+    'Bwd IAT Std': 'bwd_iat_std',
+    'Bwd IAT Max': 'bwd_iat_max',
+    'Bwd IAT Min': 'bwd_iat_min',
+    'Fwd PSH Flags': 'fwd_psh_flags',
+    'Bwd PSH Flags': 'bwd_psh_flags',
+    'Fwd URG Flags': 'fwd_urg_flags',
+    'Bwd URG Flags': 'bwd_urg_flags',
+    'Fwd Header Length': 'fwd_header_length',
+    'Bwd Header Length': 'bwd_header_length',
+    'Fwd Packets/s': 'fwd_packets_s',
+    'Bwd Packets/s': 'bwd_packets_s',
+    'Min Packet Length': 'min_packet_length',
+    'Max Packet Length': 'max_packet_length',
+    'Packet Length Mean': 'packet_length_mean',
+    'Packet Length Std': 'packet_length_std',
+    'Packet Length Variance': 'packet_length_variance',
+    'FIN Flag Count': 'fin_flag_count',
+    'SYN Flag Count': 'syn_flag_count',
+    'RST Flag Count': 'rst_flag_count',
+    'PSH Flag Count': 'psh_flag_count',
+    'ACK Flag Count': 'ack_flag_count',
+    'URG Flag Count': 'urg_flag_count',
+    'CWE Flag Count': 'cwe_flag_count',
+    'ECE Flag Count': 'ece_flag_count',
+    'Down/Up Ratio': 'down_up_ratio',
+    'Average Packet Size': 'average_packet_size',
+    'Avg Fwd Segment Size': 'avg_fwd_segment_size',
+    'Avg Bwd Segment Size': 'avg_bwd_segment_size',
+    'Fwd Avg Bytes/Bulk': 'fwd_avg_bytes_bulk',
+    'Fwd Avg Packets/Bulk': 'fwd_avg_packets_bulk',
+    'Fwd Avg Bulk Rate': 'fwd_avg_bulk_rate',
+    'Bwd Avg Bytes/Bulk': 'bwd_avg_bytes_bulk',
+    'Bwd Avg Packets/Bulk': 'bwd_avg_packets_bulk',
+    'Bwd Avg Bulk Rate': 'bwd_avg_bulk_rate',
+    'Subflow Fwd Packets': 'subflow_fwd_packets',
+    'Subflow Fwd Bytes': 'subflow_fwd_bytes',
+    'Subflow Bwd Packets': 'subflow_bwd_packets',
+    'Subflow Bwd Bytes': 'subflow_bwd_bytes',
+    'Init_Win_bytes_forward': 'init_win_bytes_forward',
+    'Init_Win_bytes_backward': 'init_win_bytes_backward',
+    'act_data_pkt_fwd': 'act_data_pkt_fwd',
+    'min_seg_size_forward': 'min_seg_size_forward',
+    'Active Mean': 'active_mean',
+    'Active Std': 'active_std',
+    'Active Max': 'active_max',
+    'Active Min': 'active_min',
+    'Idle Mean': 'idle_mean',
+    'Idle Std': 'idle_std',
+    'Idle Max': 'idle_max',
+    'Idle Min': 'idle_min',
+    'Label': 'label_original',
+    'Fwd Header Length.1': 'fwd_header_length_1'
+}
+
+# Columnas de texto (el resto de características se guardan como REAL)
+TEXT_COLUMNS = {'label_original'}
+
+LEGACY_TABLE = f"{TABLE_NAME}_legacy"
+
+# Progreso de la importación masiva (bulk_import.py) por archivo de origen
+IMPORT_TABLE = 'importacion_progreso'
+
+
+def _feature_columns_ddl() -> str:
+    return ",\n".join(
+        f"    {db} {'VARCHAR(100)' if db in TEXT_COLUMNS else 'REAL'}" for db in COLUMN_MAPPING.values()
+    )
+
+
+def flows_table_ddl(table: str = TABLE_NAME) -> str:
+    """CREATE TABLE de la tabla de flujos particionada por mes"""
+    return f"""
+CREATE TABLE IF NOT EXISTS {table} (
+    id BIGSERIAL,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    connection_type VARCHAR(50),
+    duration INTEGER,
+{_feature_columns_ddl()},
+    prediction VARCHAR(100),
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp)
+"""
+
+
+ROLLUP_TABLE_DDL = f"""
+CREATE TABLE IF NOT EXISTS {ROLLUP_TABLE} (
+    timestamp TIMESTAMP NOT NULL,
+    connection_type VARCHAR(50) NOT NULL,
+    duration INTEGER NOT NULL,
+    prediction VARCHAR(100) NOT NULL,
+    count BIGINT NOT NULL,
+    PRIMARY KEY (timestamp, connection_type, duration, prediction)
+)
+"""
+
+IMPORT_TABLE_DDL = f"""
+CREATE TABLE IF NOT EXISTS {IMPORT_TABLE} (
+    source TEXT PRIMARY KEY,
+    fingerprint VARCHAR(100) NOT NULL,
+    chunk_rows INTEGER NOT NULL,
+    chunks INTEGER NOT NULL DEFAULT 0,
+    flows BIGINT NOT NULL DEFAULT 0,
+    completed BOOLEAN NOT NULL DEFAULT FALSE,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    connection_type VARCHAR(50),
+    batches TIMESTAMP[] NOT NULL DEFAULT '{{}}'
+)
+"""
+
+# Columnas añadidas después de la primera versión de la tabla de progreso
+IMPORT_TABLE_UPGRADE = f"""
+ALTER TABLE {IMPORT_TABLE}
+    ADD COLUMN IF NOT EXISTS connection_type VARCHAR(50),
+    ADD COLUMN IF NOT EXISTS batches TIMESTAMP[] NOT NULL DEFAULT '{{}}'
+"""
+
+ROLLUP_BACKFILL_SQL = f"""
+INSERT INTO {ROLLUP_TABLE} (timestamp, connection_type, duration, prediction, count)
+SELECT timestamp, COALESCE(connection_type, ''), COALESCE(duration, 0), COALESCE(prediction, ''), COUNT(*)
+FROM {TABLE_NAME}
+WHERE timestamp IS NOT NULL
+GROUP BY 1, 2, 3, 4
+ON CONFLICT (timestamp, connection_type, duration, prediction) DO NOTHING
+"""
+
+
+def _month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def _next_month(day: date) -> date:
+    return date(day.year + (day.month == 12), day.month % 12 + 1, 1)
+
+
+def _previous_month(day: date) -> date:
+    return date(day.year - (day.month == 1), (day.month - 2) % 12 + 1, 1)
+
+
+def partition_ddl(month: date) -> str:
+    """
+    DDL idempotente de la partición mensual que contiene month. Si la partición
+    DEFAULT ya tiene filas de ese mes (backfill, importación o desfase horario en
+    el cambio de mes), un PARTITION OF directo fallaría: se crea la tabla suelta,
+    se mueven esas filas y se adjunta, todo en la misma transacción.
+    """
+    start = _month_start(month)
+    partition = f"{TABLE_NAME}_{start:%Y%m}"
+    bounds = f"FROM ('{start.isoformat()}') TO ('{_next_month(start).isoformat()}')"
+    return f"""
+DO $$
+BEGIN
+    IF to_regclass('{partition}') IS NULL THEN
+        CREATE TABLE {partition} (LIKE {TABLE_NAME} INCLUDING DEFAULTS INCLUDING CONSTRAINTS);
+        WITH moved AS (
+            DELETE FROM {TABLE_NAME}_default
+            WHERE timestamp >= '{start.isoformat()}' AND timestamp < '{_next_month(start).isoformat()}'
+            RETURNING *
+        )
+        INSERT INTO {partition} SELECT * FROM moved;
+        ALTER TABLE {TABLE_NAME} ATTACH PARTITION {partition} FOR VALUES {bounds};
+    END IF;
+END $$
+"""
+
+
+class PartitionManager:
+    """
+    Recuerda qué particiones mensuales existen para que los escritores solo
+    ejecuten el CREATE TABLE ... PARTITION OF la primera vez que escriben en un mes.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._months: Set[date] = set()
+        self._lock = threading.Lock()
+
+    def pending_ddl(self, when: Optional[date] = None) -> List[Tuple[date, str]]:
+        """
+        Particiones del mes de when, del anterior y del siguiente que aún no se
+        han creado (los meses vecinos cubren la diferencia de zona horaria con
+        el servidor en el cambio de mes).
+        Returns:
+            Lista de (mes, DDL); vacía si no hay nada que crear
+        """
+        if not self.enabled:
+            return []
+        current = _month_start(when or datetime.now())
+        with self._lock:
+            return [(month, partition_ddl(month)) for month in (_previous_month(current), current, _next_month(current))
+                    if month not in self._months]
+
+    def mark_created(self, month: date):
+        with self._lock:
+            self._months.add(_month_start(month))
+
+
+partitions = PartitionManager()
+
+
+def table_kind(conn, table: str) -> Optional[str]:
+    """relkind de la tabla: 'p' particionada, 'r' normal, None si no existe"""
+    return conn.execute(
+        text("SELECT c.relkind FROM pg_class c WHERE c.oid = to_regclass(:table)"), {'table': table}
+    ).scalar()
+
+
+def ensure_partitions(conn, start: date, months: int):
+    """Crea las particiones mensuales desde start durante months meses"""
+    month = _month_start(start)
+    for _ in range(months):
+        conn.execute(text(partition_ddl(month)))
+        partitions.mark_created(month)
+        month = _next_month(month)
+
+
+def init_schema(conn):
+    """
+    Crea (si faltan) la tabla de flujos particionada, sus particiones e índices
+    y las tablas de resumen y de progreso de importación. Una tabla trafico_predic antigua sin particionar se
+    conserva tal cual, solo se le añade el índice por timestamp.
+    """
+    kind = table_kind(conn, TABLE_NAME)
+    if kind is None:
+        conn.execute(text(flows_table_ddl()))
+        kind = 'p'
+    if kind == 'p':
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {TABLE_NAME}_default PARTITION OF {TABLE_NAME} DEFAULT"))
+        ensure_partitions(conn, date.today(), DatabaseConfig.PARTITION_MONTHS_AHEAD + 1)
+        partitions.enabled = True
+    else:
+        partitions.enabled = False
+        print(f"Advertencia: {TABLE_NAME} no está particionada; ejecutar 'python db_schema.py --migrate'")
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS idx_{TABLE_NAME}_timestamp ON {TABLE_NAME} (timestamp)"))
+
+    rollup_exists = table_kind(conn, ROLLUP_TABLE) is not None
+    conn.execute(text(ROLLUP_TABLE_DDL))
+    if not rollup_exists:
+        conn.execute(text(ROLLUP_BACKFILL_SQL))
+    conn.execute(text(IMPORT_TABLE_DDL))
+    conn.execute(text(IMPORT_TABLE_UPGRADE))
+
+
+def check_schema(conn) -> List[str]:
+    """
+    Comprobación sin DDL para el arranque sin AUTO_MIGRATE: activa la creación
+    de particiones mensuales si trafico_predic está particionada.
+    Returns:
+        Tablas que faltan (vacía si el esquema está creado)
+    """
+    kinds = {table: table_kind(conn, table) for table in (TABLE_NAME, ROLLUP_TABLE, IMPORT_TABLE)}
+    partitions.enabled = kinds[TABLE_NAME] == 'p'
+    return [table for table, kind in kinds.items() if kind is None]
+
+
+def migrate_legacy_table(conn):
+    """
+    Convierte una trafico_predic sin particionar: la renombra a trafico_predic_legacy,
+    crea la tabla particionada con las particiones del rango de fechas existente y
+    copia los datos. La tabla antigua se conserva para borrarla a mano tras verificar.
+    """
+    if table_kind(conn, TABLE_NAME) != 'r':
+        print(f"{TABLE_NAME} ya está particionada o no existe; nada que migrar")
+        return
+    conn.execute(text(f"ALTER TABLE {TABLE_NAME} RENAME TO {LEGACY_TABLE}"))
+    conn.execute(text(f"ALTER INDEX IF EXISTS idx_{TABLE_NAME}_timestamp RENAME TO idx_{LEGACY_TABLE}_timestamp"))
+    conn.execute(text(flows_table_ddl()))
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {TABLE_NAME}_default PARTITION OF {TABLE_NAME} DEFAULT"))
+    first, last = conn.execute(text(f"SELECT MIN(timestamp), MAX(timestamp) FROM {LEGACY_TABLE}")).one()
+    first = first.date() if first else date.today()
+    last = max(last.date() if last else date.today(), date.today())
+    months = (last.year - first.year) * 12 + last.month - first.month + 1 + DatabaseConfig.PARTITION_MONTHS_AHEAD
+    ensure_partitions(conn, first, months)
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS idx_{TABLE_NAME}_timestamp ON {TABLE_NAME} (timestamp)"))
+    columns = ['id', 'timestamp', 'connection_type', 'duration', *COLUMN_MAPPING.values(), 'prediction']
+    values = ['COALESCE(timestamp, CURRENT_TIMESTAMP)' if col == 'timestamp' else col for col in columns]
+    conn.execute(text(
+        f"INSERT INTO {TABLE_NAME} ({', '.join(columns)}) SELECT {', '.join(values)} FROM {LEGACY_TABLE}"
+    ))
+    conn.execute(text(
+        f"SELECT setval(pg_get_serial_sequence('{TABLE_NAME}', 'id'), COALESCE((SELECT MAX(id) FROM {TABLE_NAME}), 0) + 1, false)"
+    ))
+    print(f"✓ {TABLE_NAME} migrada a tabla particionada ({months} particiones); datos antiguos en {LEGACY_TABLE}")
+
+
+if __name__ == '__main__':
+    from database import create_sync_engine
+    # Sin statement_timeout: la copia de una tabla antigua grande puede tardar
+    engine = create_sync_engine(statement_timeout_ms=0)
+    with engine.begin() as conn:
+        if '--migrate' in sys.argv:
+            migrate_legacy_table(conn)
+        init_schema(conn)
+    print("✓ Esquema de base de datos actualizado")
@@ -0,0 +1,127 @@
+"""
+Logging de la aplicación, configurado una sola vez al arrancar.
+
+Los registros se encolan con un QueueHandler (el hilo que llama solo hace un
+put en memoria) y un QueueListener en su propio hilo los escribe en consola y
+en un archivo con rotación. Los niveles se fijan con LOG_LEVEL y LOG_LEVELS.
+PredictionSummary agrega las etiquetas predichas y escribe un resumen cada
+PREDICTION_SUMMARY_INTERVAL segundos en lugar de una línea por lote o por flujo.
+"""
+import os
+import time
+import queue
+import logging
+import threading
+import logging.handlers
+from typing import Dict, Optional
+
+from config import LoggingConfig
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_lock = threading.Lock()
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """"a=DEBUG,b=WARNING" -> {'a': 'DEBUG', 'b': 'WARNING'}"""
+    levels = {}
+    for item in spec.split(','):
+        if '=' in item:
+            name, level = item.split('=', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(level: Optional[str] = None, log_file: Optional[str] = None) -> bool:
+    """
+    Configura el logger raíz con un QueueHandler y arranca el hilo escritor.
+    Llamadas posteriores no hacen nada.
+    Returns:
+        True si se configuró en esta llamada
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return False
+        log_file = LoggingConfig.FILE if log_file is None else log_file
+        formatter = logging.Formatter(LoggingConfig.FORMAT)
+        handlers = [logging.StreamHandler()]
+        if log_file:
+            os.makedirs(os.path.dirname(log_file), exist_ok=True)
+            handlers.append(logging.handlers.RotatingFileHandler(
+                log_file, maxBytes=LoggingConfig.MAX_BYTES, backupCount=LoggingConfig.BACKUP_COUNT,
+                encoding='utf-8', delay=True
+            ))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        log_queue = queue.SimpleQueue()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(logging.handlers.QueueHandler(log_queue))
+        root.setLevel(level or LoggingConfig.LEVEL)
+        for name, logger_level in parse_levels(LoggingConfig.LEVELS).items():
+            logging.getLogger(name).setLevel(logger_level)
+
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        return True
+
+
+def shutdown_logging():
+    """Vacía la cola y detiene el hilo escritor (al apagar la aplicación)"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            for handler in _listener.handlers:
+                handler.close()
+            _listener = None
+
+
+class PredictionSummary:
+    """
+    Resumen agregado de predicciones: acumula flujos y etiquetas por lote y
+    escribe una línea INFO como mucho cada interval segundos (con interval=0,
+    una por lote). El detalle de cada lote queda en DEBUG.
+    """
+
+    def __init__(self, interval: float = None, logger: logging.Logger = None):
+        self.interval = LoggingConfig.PREDICTION_SUMMARY_INTERVAL if interval is None else interval
+        self.logger = logger or logging.getLogger('predictions')
+        self._lock = threading.Lock()
+        self._reset(time.monotonic())
+
+    def _reset(self, now: float):
+        self._since = now
+        self._batches = 0
+        self._flows = 0
+        self._labels: Dict[str, int] = {}
+
+    def flush(self):
+        """Escribe el resumen pendiente aunque no haya pasado el intervalo"""
+        with self._lock:
+            batches, total, labels, elapsed = self._batches, self._flows, self._labels, time.monotonic() - self._since
+            self._reset(time.monotonic())
+        if batches:
+            self._log(batches, total, labels, elapsed)
+
+    def _log(self, batches: int, total: int, labels: Dict[str, int], elapsed: float):
+        self.logger.info(f"Predicciones: {total} flujos en {batches} lotes ({elapsed:.0f}s): "
+                         f"{dict(sorted(labels.items(), key=lambda item: -item[1]))}")
+
+    def add(self, label_counts: Dict[str, int]):
+        flows = sum(label_counts.values())
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(f"Lote de {flows} flujos: {label_counts}")
+        now = time.monotonic()
+        with self._lock:
+            self._batches += 1
+            self._flows += flows
+            for label, count in label_counts.items():
+                self._labels[label] = self._labels.get(label, 0) + count
+            if now - self._since < self.interval:
+                return
+            batches, total, labels, elapsed = self._batches, self._flows, self._labels, now - self._since
+            self._reset(now)
+        self._log(batches, total, labels, elapsed)
@@ -1,7 +1,15 @@
 import os
-import subprocess
+import re
+import asyncio
+import logging
 import tempfile
-import time
+from typing import Optional, List, Tuple, Sequence
+
+from config import PipelineConfig
+from services.interface_service import interface_inventory
+
+# Margen sobre la duración pedida antes de dar la captura por colgada
+CAPTURE_GRACE_SECONDS = 15
 
 class CaptureService:
     def __init__(self):
@@ -13,83 +21,160 @@ class CaptureService:
         if not os.path.exists(self.creados_dir):
             os.makedirs(self.creados_dir)
             
-        print(f"Ruta de flowmeter: {self.flowmeter_path}")
-        print(f"Directorio creados: {self.creados_dir}")
+        logging.debug(f"Ruta de flowmeter: {self.flowmeter_path}, directorio creados: {self.creados_dir}")
+
+    def _temp_pcap(self, interface: str) -> str:
+        """Archivo PCAP temporal en creados/ con el nombre de la interfaz como prefijo"""
+        prefix = re.sub(r'[^A-Za-z0-9]+', '_', interface).strip('_')[-32:] or 'tmp'
+        with tempfile.NamedTemporaryFile(prefix=f"{prefix}_", suffix='.pcap', dir=self.creados_dir, delete=False) as temp_pcap:
+            return temp_pcap.name
 
-    def capture_traffic(self, duration: int = 20) -> str:
-        """Capturar tráfico de red y guardar en archivo PCAP"""
+    @staticmethod
+    def tshark_options(bpf_filter: str = '', snaplen: int = 0, buffer_mb: int = 0) -> List[str]:
+        """
+        Opciones de captura de tshark: filtro BPF aplicado en el kernel (-f),
+        bytes guardados por paquete (-s) y buffer del kernel en MB (-B).
+        Van antes de los -i para que se apliquen a todas las interfaces.
+        """
+        options = []
+        if bpf_filter:
+            options += ["-f", bpf_filter]
+        if snaplen:
+            options += ["-s", str(snaplen)]
+        if buffer_mb:
+            options += ["-B", str(buffer_mb)]
+        return options
+
+    async def capture_traffic_async(self, duration: int = 20, interface: Optional[str] = None,
+                                    options: Sequence[str] = ()) -> Optional[str]:
+        """Capturar tráfico con tshark como subproceso asyncio (no bloquea el event loop)"""
         try:
-            # Crear archivo temporal para el PCAP
-            with tempfile.NamedTemporaryFile(suffix='.pcap', dir=self.creados_dir, delete=False) as temp_pcap:
-                pcap_file = temp_pcap.name
+            if interface is None:
+                interface = (await asyncio.to_thread(interface_inventory.resolve, 'auto'))[0]
+            pcap_file = self._temp_pcap(interface)
                 
-            print(f"Iniciando captura por {duration} segundos...")
+            logging.debug(f"Iniciando captura en {interface} por {duration} segundos...")
             
-            # Iniciar captura con tshark
-            process = subprocess.Popen(
-                [
-                    "tshark",
-                    "-i", "Wi-Fi",
-                    "-a", f"duration:{duration}",
-                    "-w", pcap_file
-                ],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
+            process = await asyncio.create_subprocess_exec(
+                "tshark",
+                *options,
+                "-i", interface,
+                "-a", f"duration:{duration}",
+                "-w", pcap_file,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
             )
             
-            # Monitorear el progreso de la captura
-            start_time = time.time()
-            while process.poll() is None:
-                elapsed_time = time.time() - start_time
-                progress = min(100, (elapsed_time / duration) * 100)
-                print(f"Progreso: {progress:.1f}%")
-                time.sleep(1)
-                if elapsed_time >= duration:
-                    process.terminate()
-                    break
-
-            stdout, stderr = process.communicate()
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=duration + CAPTURE_GRACE_SECONDS)
+            except asyncio.TimeoutError:
+                process.terminate()
+                stdout, stderr = await process.communicate()
             
-            if process.returncode != 0 and not os.path.exists(pcap_file):
-                print(f"Error en tshark: {stderr.decode()}")
-                return None
+            # Un filtro BPF inválido hace que tshark salga sin escribir nada en el temporal
+            if process.returncode != 0 and (not os.path.exists(pcap_file) or os.path.getsize(pcap_file) == 0):
+                raise RuntimeError(f"tshark terminó con código {process.returncode}: "
+                                   f"{stderr.decode(errors='replace').strip()}")
 
-            print(f"Archivo PCAP guardado en: {pcap_file}")
+            logging.debug(f"Archivo PCAP guardado en: {pcap_file}")
             return pcap_file
             
-            
         except Exception as e:
             if 'pcap_file' in locals() and os.path.exists(pcap_file):
                 os.unlink(pcap_file)
             raise Exception(f"Error en la captura de tráfico: {str(e)}")
 
-    def process_with_flowmeter(self, pcap_file: str) -> str:
-        """Procesar archivo PCAP con flowmeter.js y retornar la ruta del CSV generado"""
+    async def capture_interfaces_async(self, duration: int, interfaces: List[str],
+                                       options: Sequence[str] = ()) -> List[Tuple[str, str]]:
+        """
+        Captura a la vez en varias interfaces (un tshark por interfaz) durante la
+        misma ventana. Las interfaces que fallan se omiten; si fallan todas se
+        lanza RuntimeError con los errores de tshark.
+        Returns:
+            [(interfaz, ruta del PCAP)] de las capturas que terminaron bien
+        """
+        results = await asyncio.gather(
+            *(self.capture_traffic_async(duration, interface, options) for interface in interfaces),
+            return_exceptions=True
+        )
+        captures, errors = [], []
+        for interface, result in zip(interfaces, results):
+            if isinstance(result, Exception):
+                logging.warning(f"Captura fallida en {interface}: {result}")
+                errors.append(f"{interface}: {result}")
+            elif result and os.path.exists(result):
+                captures.append((interface, result))
+        if not captures and errors:
+            raise RuntimeError("; ".join(errors))
+        return captures
+
+    async def process_with_flowmeter_async(self, pcap_file: str, timeout: int = 300) -> str:
+        """Ejecutar flowmeter.js como subproceso asyncio y retornar la ruta del CSV generado"""
+        if not os.path.exists(self.flowmeter_path):
+            raise FileNotFoundError(f"Flowmeter no encontrado: {self.flowmeter_path}")
+        
+        process = await asyncio.create_subprocess_exec(
+            "node", self.flowmeter_path, pcap_file,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
         try:
-            # Ejecutar flowmeter.js
-            process = subprocess.Popen(
-                ["node", self.flowmeter_path, pcap_file],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-            
-            stdout, stderr = process.communicate()
-            
-            if process.returncode != 0:
-                raise Exception(f"Error procesando con flowmeter: {stderr.decode()}")
-            
-            # Buscar el archivo CSV generado
-            csv_files = [f for f in os.listdir(self.creados_dir) if f.endswith('_Flow.csv')]
-            if not csv_files:
-                raise Exception("No se encontró el archivo CSV generado por flowmeter")
-            
-            # Tomar el archivo CSV más reciente
-            csv_file = max([os.path.join(self.creados_dir, f) for f in csv_files], 
-                         key=os.path.getmtime)
-            
-            return csv_file
-            
-        except Exception as e:
-            raise Exception(f"Error procesando con flowmeter: {str(e)}")
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.communicate()
+            raise TimeoutError("Timeout en flowmeter")
+        
+        if process.returncode != 0:
+            raise RuntimeError(f"Error en flowmeter: {stderr.decode(errors='replace')}")
+        
+        base_name = os.path.splitext(os.path.basename(pcap_file))[0]
+        csv_path = os.path.join(self.creados_dir, f"{base_name}_Flow.csv")
+        
+        # Esperar a que el CSV esté completo (tamaño estable) sin bloquear el event loop
+        from services.flow_csv_reader import wait_for_file_async
+        if not await wait_for_file_async(csv_path, timeout=PipelineConfig.CSV_WAIT_TIMEOUT):
+            raise FileNotFoundError("No se generó el archivo CSV")
+        return csv_path
 
+    async def start_ring_capture(self, segment_seconds: int, max_files: int, prefix: str = "stream",
+                                 interfaces: Optional[List[str]] = None,
+                                 options: Sequence[str] = ()) -> Tuple[asyncio.subprocess.Process, str]:
+        """
+        Inicia una captura continua con tshark en modo ring buffer (-b duration:N -b files:K).
+        tshark rota a un archivo nuevo cada segment_seconds segundos dentro de un
+        directorio propio de la sesión. Con varias interfaces un solo tshark las
+        captura todas (-i por interfaz) y cada segmento es un pcapng con todas ellas.
+        Returns:
+            (proceso de tshark, directorio donde aparecen los segmentos)
+        """
+        if not interfaces:
+            interfaces = await asyncio.to_thread(interface_inventory.resolve, 'auto')
+        segments_dir = tempfile.mkdtemp(prefix=f"{prefix}_", dir=self.creados_dir)
+        process = await asyncio.create_subprocess_exec(
+            "tshark",
+            *options,
+            *(arg for interface in interfaces for arg in ("-i", interface)),
+            "-q",
+            "-b", f"duration:{segment_seconds}",
+            "-b", f"files:{max_files}",
+            "-w", os.path.join(segments_dir, f"{prefix}.pcap"),
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+        logging.info(f"Captura continua iniciada en {', '.join(interfaces)}: segmentos de {segment_seconds}s en {segments_dir}")
+        return process, segments_dir
 
+    @staticmethod
+    def list_finished_segments(segments_dir: str, capture_running: bool) -> List[str]:
+        """
+        Segmentos ya cerrados por tshark, en orden de captura.
+        Mientras la captura sigue activa el segmento más reciente aún se está escribiendo.
+        """
+        if not os.path.isdir(segments_dir):
+            return []
+        segments = sorted(
+            os.path.join(segments_dir, f) for f in os.listdir(segments_dir)
+            if f.endswith('.pcap') or f.endswith('.pcapng')
+        )
+        return segments[:-1] if capture_running else segments
@@ -0,0 +1,361 @@
+"""
+Exportación compacta de los modelos y runtime de inferencia solo con NumPy.
+
+La exportación compila los tres artefactos joblib de ml_models/ en un
+directorio de arrays .npy (ml_models/compact/ por defecto) que se cargan con
+np.load(..., mmap_mode), sin importar scikit-learn ni deserializar objetos;
+con MODEL_MMAP_MODE=r los procesos comparten las páginas de los arrays:
+
+- linear_weights.npy / linear_bias.npy: escalado + PCA plegados en x @ W + b
+  (el mismo plegado que InferenceEngine hace al arrancar).
+- tree_*.npy: los árboles del clasificador en arrays contiguos. Con
+  profundidad hasta COMPLETE_MAX_DEPTH cada árbol se guarda como árbol binario
+  completo en orden por niveles (característica y umbral de cada nodo interno,
+  probabilidades de cada hoja), de modo que el recorrido es aritmética de
+  índices (hijo = 2 * nodo + 1 + derecha). Los árboles más profundos se guardan
+  como lista de nodos con hijo izquierdo y derecho explícitos.
+- meta.json: columnas de entrada, clases, disposición de los árboles y el
+  SHA-256 de los joblib de origen para detectar exportaciones desfasadas.
+
+La exportación no se versiona: se genera en cada despliegue con este módulo
+y solo se carga con MODEL_FORMAT=compact o auto. El recorrido de los árboles
+en NumPy es más lento que el predict_proba compilado de scikit-learn en lotes
+grandes, así que compensa cuando importa el arranque o la memoria compartida
+entre procesos, no el tiempo por lote.
+
+Solo se exportan clasificadores de árboles con predict_proba por promedio de
+hojas (RandomForest, ExtraTrees, DecisionTree); con otro clasificador la
+exportación falla y se siguen usando los joblib.
+
+Uso (desde backend/):
+    python -m services.compact_model                # exportar ml_models/ a ml_models/compact/
+    python -m services.compact_model --check        # exportar y comparar con scikit-learn
+"""
+import os
+import sys
+import json
+import hashlib
+import time
+import logging
+import argparse
+import numpy as np
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+COMPACT_FORMAT_VERSION = 1
+# Subdirectorio de ml_models/ con la exportación
+COMPACT_DIR = 'compact'
+META_FILE = 'meta.json'
+LINEAR_FILES = ('linear_weights', 'linear_bias')
+TREE_FILES = {
+    'complete': ('tree_feature', 'tree_threshold', 'tree_value'),
+    'nodes': ('tree_feature', 'tree_threshold', 'tree_left', 'tree_right', 'tree_roots', 'tree_value')
+}
+# Profundidad máxima para la disposición de árbol completo (2^12 hojas por árbol)
+COMPLETE_MAX_DEPTH = 12
+
+
+def source_fingerprints(models_dir: str, files: List[str]) -> Dict[str, str]:
+    """SHA-256 de los joblib de origen (el contenido, no la fecha: sobrevive a un git clone)"""
+    fingerprints = {}
+    for filename in files:
+        path = os.path.join(models_dir, filename)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                fingerprints[filename] = hashlib.sha256(f.read()).hexdigest()
+    return fingerprints
+
+
+class CompactForest:
+    """
+    predict_proba de un bosque de árboles de decisión sobre arrays planos.
+
+    Los árboles se recorren uno a uno con todas las filas a la vez, un nivel por
+    iteración. Como en scikit-learn, la entrada se compara en float32 con
+    umbrales float64 (la fila va a la derecha si x > umbral) y las
+    probabilidades de las hojas se suman árbol a árbol y se dividen por el
+    número de árboles. La entrada no debe tener NaN (ya viene imputada).
+    """
+
+    def __init__(self, classes: np.ndarray, layout: str, arrays: Dict[str, np.ndarray], max_depth: int):
+        if layout not in TREE_FILES:
+            raise ValueError(f"Disposición de árboles desconocida: {layout}")
+        self.classes_ = classes
+        self.layout = layout
+        self.max_depth = max_depth
+        self.feature = arrays['tree_feature']
+        self.threshold = arrays['tree_threshold']
+        self.value = arrays['tree_value']
+        self.left = arrays.get('tree_left')
+        self.right = arrays.get('tree_right')
+        self.roots = arrays.get('tree_roots')
+        self.n_trees = len(self.value) if layout == 'complete' else len(self.roots)
+
+    def _leaf_values(self, X: np.ndarray):
+        """Genera, árbol a árbol, las probabilidades de la hoja de cada fila"""
+        X = np.asarray(X, dtype=np.float32)
+        n = len(X)
+        # Característica f de la fila i en columns[f * n + i]
+        columns = np.ascontiguousarray(X.T).ravel()
+        base = np.arange(n, dtype=np.intp)
+        if self.layout == 'complete':
+            internal = (1 << self.max_depth) - 1
+            for tree in range(self.n_trees):
+                offsets = self.feature[tree].astype(np.intp) * n
+                threshold = self.threshold[tree]
+                position = np.zeros(n, dtype=np.intp)
+                for _ in range(self.max_depth):
+                    right = np.take(columns, np.take(offsets, position) + base) > np.take(threshold, position)
+                    position *= 2
+                    position += 1
+                    position += right
+                yield np.take(self.value[tree], position - internal, axis=0)
+        else:
+            offsets = self.feature.astype(np.intp) * n
+            for root in self.roots.tolist():
+                nodes = np.full(n, root, dtype=np.intp)
+                for _ in range(self.max_depth):
+                    right = np.take(columns, np.take(offsets, nodes) + base) > np.take(self.threshold, nodes)
+                    nodes = np.where(right, np.take(self.right, nodes), np.take(self.left, nodes))
+                yield np.take(self.value, nodes, axis=0)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        probabilities = np.zeros((len(X), len(self.classes_)), dtype=np.float64)
+        for values in self._leaf_values(X):
+            probabilities += values
+        probabilities /= self.n_trees
+        return probabilities
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+def _tree_leaf_probabilities(tree) -> np.ndarray:
+    """Probabilidad de cada clase en cada nodo, normalizada como en DecisionTreeClassifier.predict_proba"""
+    value = np.asarray(tree.value[:, 0, :], dtype=np.float64)
+    totals = value.sum(axis=1, keepdims=True)
+    totals[totals == 0.0] = 1.0
+    return value / totals
+
+
+def _complete_tree(tree, depth: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Árbol de scikit-learn como árbol completo de profundidad depth en orden por
+    niveles. Una hoja a menor profundidad se extiende con nodos de umbral +inf
+    (siempre a la izquierda) hasta el último nivel.
+    """
+    internal = (1 << depth) - 1
+    feature = np.zeros(internal, dtype=np.int32)
+    threshold = np.full(internal, np.inf, dtype=np.float64)
+    leaf_node = np.zeros(1 << depth, dtype=np.intp)
+    stack = [(0, 0)]
+    while stack:
+        node, position = stack.pop()
+        if position >= internal:
+            leaf_node[position - internal] = node
+            continue
+        left, right = tree.children_left[node], tree.children_right[node]
+        if left == -1:
+            stack += [(node, 2 * position + 1)]
+        else:
+            feature[position] = tree.feature[node]
+            threshold[position] = tree.threshold[node]
+            stack += [(left, 2 * position + 1), (right, 2 * position + 2)]
+    # Posiciones de hoja nunca alcanzadas (derecha de un nodo +inf): cualquier valor vale
+    return feature, threshold, _tree_leaf_probabilities(tree)[leaf_node]
+
+
+def flatten_trees(model, complete_max_depth: int = COMPLETE_MAX_DEPTH) -> Tuple[str, Dict[str, np.ndarray], int]:
+    """
+    Aplana los árboles de un clasificador de scikit-learn.
+    Returns:
+        (disposición 'complete' o 'nodes', arrays tree_*, profundidad máxima)
+    """
+    estimators = getattr(model, 'estimators_', None)
+    if estimators is None and hasattr(model, 'tree_'):
+        estimators = [model]
+    if type(model).__name__.startswith(('GradientBoosting', 'HistGradientBoosting')):
+        raise ValueError(f"Clasificador no exportable (boosting): {type(model).__name__}")
+    if not estimators or not all(hasattr(e, 'tree_') for e in np.ravel(estimators)):
+        raise ValueError(f"Clasificador no exportable (no es un bosque de árboles): {type(model).__name__}")
+    if getattr(model, 'n_outputs_', 1) != 1:
+        raise ValueError("Solo se exportan clasificadores de una salida")
+
+    trees = [estimator.tree_ for estimator in estimators]
+    max_depth = max(int(tree.max_depth) for tree in trees)
+
+    if max_depth <= complete_max_depth:
+        features, thresholds, values = zip(*(_complete_tree(tree, max_depth) for tree in trees))
+        return 'complete', {
+            'tree_feature': np.stack(features),
+            'tree_threshold': np.stack(thresholds),
+            'tree_value': np.ascontiguousarray(np.stack(values))
+        }, max_depth
+
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    for tree in trees:
+        n = tree.node_count
+        own = np.arange(offset, offset + n, dtype=np.int32)
+        # Las hojas apuntan a sí mismas con umbral +inf: las filas que llegan se quedan en ellas
+        leaf = tree.children_left == -1
+        lefts.append(np.where(leaf, own, tree.children_left + offset).astype(np.int32))
+        rights.append(np.where(leaf, own, tree.children_right + offset).astype(np.int32))
+        features.append(np.where(leaf, 0, tree.feature).astype(np.int32))
+        thresholds.append(np.where(leaf, np.inf, tree.threshold).astype(np.float64))
+        values.append(_tree_leaf_probabilities(tree))
+        roots.append(offset)
+        offset += n
+    return 'nodes', {
+        'tree_feature': np.concatenate(features),
+        'tree_threshold': np.concatenate(thresholds),
+        'tree_left': np.concatenate(lefts),
+        'tree_right': np.concatenate(rights),
+        'tree_roots': np.asarray(roots, dtype=np.int32),
+        'tree_value': np.ascontiguousarray(np.concatenate(values))
+    }, max_depth
+
+
+def export(models_dir: str, output_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Compila los joblib de models_dir en output_dir (models_dir/compact por defecto).
+    Se escribe primero en un directorio temporal y se renombra al final, así que un
+    lector nunca ve una exportación a medias.
+    Returns:
+        Contenido de meta.json
+    """
+    import shutil
+    from services.model_registry import ModelRegistry, MODEL_FILES
+    from services.inference_engine import InferenceEngine
+    from services.prediction_service import COLUMNAS, COLUMNAS_CATEGORICAS, ETIQUETAS
+
+    output_dir = output_dir or os.path.join(models_dir, COMPACT_DIR)
+    bundle = ModelRegistry.read_joblib(models_dir, None)
+    engine = InferenceEngine(bundle.scaler, bundle.pca, bundle.model, COLUMNAS, COLUMNAS_CATEGORICAS, ETIQUETAS)
+    if not engine.fused:
+        raise ValueError("El preprocesador no se puede plegar en una etapa lineal")
+    layout, trees, max_depth = flatten_trees(bundle.model)
+    arrays = {
+        'linear_weights': engine.weights,
+        'linear_bias': np.asarray(engine.bias, dtype=np.float64),
+        **trees
+    }
+    meta = {
+        'format_version': COMPACT_FORMAT_VERSION,
+        'classifier': type(bundle.model).__name__,
+        'classes': np.asarray(bundle.model.classes_).tolist(),
+        'numeric_columns': engine.numeric_columns,
+        'binary_columns': engine.binary_columns,
+        'n_components': int(engine.weights.shape[1]),
+        'layout': layout,
+        'n_trees': len(np.ravel(getattr(bundle.model, 'estimators_', [bundle.model]))),
+        'max_depth': max_depth,
+        'sources': source_fingerprints(models_dir, list(MODEL_FILES.values())),
+        'exported_at': datetime.now().isoformat()
+    }
+
+    staging = f"{output_dir}.tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    for name, array in arrays.items():
+        np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(array))
+    with open(os.path.join(staging, META_FILE), 'w') as f:
+        json.dump(meta, f, indent=2)
+    previous = f"{output_dir}.old"
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(output_dir):
+        os.rename(output_dir, previous)
+    os.rename(staging, output_dir)
+    shutil.rmtree(previous, ignore_errors=True)
+    return meta
+
+
+def read_meta(compact_dir: str) -> Optional[Dict[str, Any]]:
+    """meta.json de una exportación (None si no existe o es de otro formato)"""
+    try:
+        with open(os.path.join(compact_dir, META_FILE)) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get('format_version') == COMPACT_FORMAT_VERSION else None
+
+
+def is_stale(meta: Dict[str, Any], models_dir: str) -> bool:
+    """True si algún joblib de origen presente en models_dir cambió después de exportar"""
+    current = source_fingerprints(models_dir, list(meta.get('sources', {})))
+    return any(meta['sources'][name] != fingerprint for name, fingerprint in current.items())
+
+
+def load(compact_dir: str, mmap_mode: Optional[str] = None) -> Tuple[Tuple[np.ndarray, np.ndarray], CompactForest, Dict[str, Any]]:
+    """
+    Carga una exportación compacta.
+    Returns:
+        ((W, b) de la etapa lineal, clasificador CompactForest, meta)
+    """
+    meta = read_meta(compact_dir)
+    if meta is None:
+        raise FileNotFoundError(f"Exportación compacta no encontrada: {compact_dir} "
+                                f"(generarla con python -m services.compact_model)")
+    arrays = {name: np.load(os.path.join(compact_dir, f"{name}.npy"), mmap_mode=mmap_mode)
+              for name in (*LINEAR_FILES, *TREE_FILES[meta['layout']])}
+    forest = CompactForest(np.asarray(meta['classes']), meta['layout'], arrays, meta['max_depth'])
+    return (arrays['linear_weights'], arrays['linear_bias']), forest, meta
+
+
+def check(models_dir: str, compact_dir: str, rows: int = 100_000, seed: int = 0) -> Dict[str, Any]:
+    """Compara las probabilidades del runtime compacto con las de scikit-learn"""
+    from services.model_registry import ModelRegistry
+    from services.inference_engine import InferenceEngine
+    from services.prediction_service import COLUMNAS, COLUMNAS_CATEGORICAS, ETIQUETAS
+
+    bundle = ModelRegistry.read_joblib(models_dir, None)
+    reference = InferenceEngine(bundle.scaler, bundle.pca, bundle.model, COLUMNAS, COLUMNAS_CATEGORICAS, ETIQUETAS)
+    linear, forest, _ = load(compact_dir)
+    compact = InferenceEngine(None, None, forest, COLUMNAS, COLUMNAS_CATEGORICAS, ETIQUETAS, linear=linear)
+
+    # Entrada sintética de cola pesada: valores de varios órdenes de magnitud, como los flujos reales
+    rng = np.random.default_rng(seed)
+    X = np.abs(rng.standard_cauchy((rows, len(reference.feature_columns)))) * 1000
+    X[:, reference.n_numeric:] = rng.integers(0, 2, (rows, len(reference.binary_columns)))
+    start = time.perf_counter()
+    expected = reference.predict_proba(X)
+    sklearn_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    actual = compact.predict_proba(X)
+    compact_seconds = time.perf_counter() - start
+    return {
+        'rows': rows,
+        'max_abs_diff': float(np.abs(expected - actual).max()),
+        'label_mismatches': int((expected.argmax(axis=1) != actual.argmax(axis=1)).sum()),
+        'sklearn_seconds': round(sklearn_seconds, 4),
+        'compact_seconds': round(compact_seconds, 4)
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from config import ModelConfig
+
+    parser = argparse.ArgumentParser(description="Exportar los modelos a formato compacto (.npy)")
+    parser.add_argument('--models-dir', default=ModelConfig.MODELS_DIR, help="Directorio con los joblib")
+    parser.add_argument('--output', default=None, help="Directorio de salida (por defecto <models-dir>/compact)")
+    parser.add_argument('--check', action='store_true', help="Comparar el resultado con scikit-learn")
+    args = parser.parse_args(argv)
+
+    output = args.output or os.path.join(args.models_dir, COMPACT_DIR)
+    meta = export(args.models_dir, output)
+    size = sum(os.path.getsize(os.path.join(output, f)) for f in os.listdir(output))
+    print(f"✓ Modelos exportados en {output}: {meta['classifier']} con {meta['n_trees']} árboles, "
+          f"profundidad {meta['max_depth']} ({meta['layout']}), {size / 1024:.0f} KB")
+    if args.check:
+        result = check(args.models_dir, output)
+        print(f"Comparación con scikit-learn sobre {result['rows']} filas: diferencia máxima "
+              f"{result['max_abs_diff']:.3g}, {result['label_mismatches']} etiquetas distintas "
+              f"({result['sklearn_seconds']}s scikit-learn, {result['compact_seconds']}s compacto)")
+        if result['label_mismatches']:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
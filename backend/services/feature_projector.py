@@ -0,0 +1,87 @@
+import logging
+import threading
+import numpy as np
+import pandas as pd
+from typing import List, Dict, Optional, Tuple, Union, Sequence
+
+
+class FeatureProjector:
+    """
+    Proyector de columnas compilado a partir del esquema que espera el modelo.
+
+    Convierte un DataFrame (o un array con sus nombres de columna) directamente en
+    una matriz contigua en el orden del modelo, reservando la memoria una sola vez.
+    Las columnas que faltan en la entrada quedan a cero. El plan de proyección
+    (qué columna de entrada va a qué posición) se calcula una vez por esquema de
+    entrada y se reutiliza en los lotes siguientes.
+    """
+
+    def __init__(self, columns: Sequence[str], dtype=np.float64):
+        self.columns = list(columns)
+        self.dtype = np.dtype(dtype)
+        self._positions = {col: i for i, col in enumerate(self.columns)}
+        self._plans: Dict[Tuple[str, ...], Tuple[np.ndarray, np.ndarray, List[str]]] = {}
+        self._lock = threading.Lock()
+
+    def compile(self, source_columns: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+        """
+        Calcula (o recupera de la caché) el plan para un esquema de entrada.
+        Returns:
+            (índices de origen, índices de destino, columnas del modelo que faltan)
+        """
+        key = tuple(source_columns)
+        plan = self._plans.get(key)
+        if plan is not None:
+            return plan
+
+        src_idx, dst_idx, found = [], [], set()
+        for i, col in enumerate(key):
+            pos = self._positions.get(col)
+            if pos is not None and pos not in found:
+                src_idx.append(i)
+                dst_idx.append(pos)
+                found.add(pos)
+        missing = [col for i, col in enumerate(self.columns) if i not in found]
+        if missing:
+            logging.warning(f"Columnas faltantes que se rellenarán con ceros: {missing}")
+
+        plan = (np.array(src_idx, dtype=np.intp), np.array(dst_idx, dtype=np.intp), missing)
+        with self._lock:
+            self._plans[key] = plan
+        return plan
+
+    def project(self, data: Union[pd.DataFrame, np.ndarray],
+                source_columns: Optional[Sequence[str]] = None) -> np.ndarray:
+        """
+        Proyecta la entrada al orden de columnas del modelo
+        Args:
+            data: DataFrame, o array 2D cuyas columnas se describen en source_columns
+            source_columns: Nombres de las columnas del array (si es None se asume
+                            que el array ya está en el orden del modelo)
+        Returns:
+            Matriz C-contigua (filas x columnas del modelo) con el dtype del proyector
+        """
+        if isinstance(data, pd.DataFrame):
+            src_idx, dst_idx, _ = self.compile([str(c) for c in data.columns])
+            out = np.zeros((len(data), len(self.columns)), dtype=self.dtype)
+            for src, dst in zip(src_idx.tolist(), dst_idx.tolist()):
+                column = data.iloc[:, src]
+                if column.dtype == object:
+                    column = pd.to_numeric(column, errors='coerce')
+                out[:, dst] = column.to_numpy(dtype=self.dtype, na_value=np.nan)
+            return out
+
+        array = np.asarray(data)
+        if array.ndim != 2:
+            raise ValueError(f"Se esperaba una matriz 2D, se recibió ndim={array.ndim}")
+        if source_columns is None:
+            if array.shape[1] != len(self.columns):
+                raise ValueError(
+                    f"La matriz tiene {array.shape[1]} columnas y el modelo espera {len(self.columns)}"
+                )
+            return np.ascontiguousarray(array, dtype=self.dtype)
+
+        src_idx, dst_idx, _ = self.compile(source_columns)
+        out = np.zeros((array.shape[0], len(self.columns)), dtype=self.dtype)
+        out[:, dst_idx] = array[:, src_idx]
+        return out
@@ -0,0 +1,125 @@
+import os
+import csv
+import time
+import asyncio
+import importlib.util
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterator
+
+# Columnas de texto del CSV de flujos; el resto se lee como numérico
+TEXT_COLUMNS = {'Label'}
+
+
+def _file_state(path: str):
+    """(tamaño, mtime) del archivo o None si todavía no existe"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _is_readable(path: str) -> bool:
+    try:
+        with open(path, 'rb'):
+            return True
+    except PermissionError:
+        # En Windows el escritor puede mantener el archivo bloqueado
+        return False
+
+
+def wait_for_file(path: str, timeout: float = 20.0, poll_interval: float = 0.25, stable_checks: int = 2) -> bool:
+    """
+    Espera a que el archivo exista, no esté vacío, se pueda abrir y su tamaño y
+    mtime no cambien durante stable_checks comprobaciones seguidas.
+    Returns:
+        True si el archivo quedó completo antes de timeout
+    """
+    deadline = time.monotonic() + timeout
+    last, stable = None, 0
+    while True:
+        state = _file_state(path)
+        if state is not None and state[0] > 0 and state == last:
+            stable += 1
+            if stable >= stable_checks and _is_readable(path):
+                return True
+        else:
+            stable = 0
+        last = state
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(poll_interval)
+
+
+async def wait_for_file_async(path: str, timeout: float = 20.0, poll_interval: float = 0.25,
+                              stable_checks: int = 2) -> bool:
+    """Versión de wait_for_file que no bloquea el event loop"""
+    deadline = time.monotonic() + timeout
+    last, stable = None, 0
+    while True:
+        state = _file_state(path)
+        if state is not None and state[0] > 0 and state == last:
+            stable += 1
+            if stable >= stable_checks and _is_readable(path):
+                return True
+        else:
+            stable = 0
+        last = state
+        if time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(poll_interval)
+
+
+class FlowCsvReader:
+    """
+    Lectura tipada del CSV de flujos de CICFlowMeter.
+
+    Lee la cabecera una sola vez, limpia los nombres y calcula qué columnas
+    del archivo corresponden a las que necesita el modelo (claves o valores de
+    rename_map). Después lee solo esas columnas (usecols) con dtype fijo
+    float32, sin inferencia de tipos, con el motor pyarrow si está disponible.
+    iter_chunks() lee el archivo por bloques para acotar la memoria en CSV grandes.
+    """
+
+    def __init__(self, rename_map: Dict[str, str], dtype=np.float32, engine: str = 'auto'):
+        self.rename_map = rename_map
+        self.targets = set(rename_map.values())
+        self.dtype = np.dtype(dtype)
+        if engine == 'auto':
+            engine = 'pyarrow' if importlib.util.find_spec('pyarrow') is not None else 'c'
+        self.engine = engine
+
+    @staticmethod
+    def read_header(csv_path: str) -> list:
+        with open(csv_path, 'r', newline='', encoding='utf-8', errors='replace') as f:
+            return next(csv.reader(f), [])
+
+    def schema(self, csv_path: str):
+        """
+        Returns:
+            (columnas a leer, dtypes por columna, renombrado a los nombres del modelo)
+        """
+        usecols, dtypes, rename = [], {}, {}
+        for raw in self.read_header(csv_path):
+            clean = ''.join(c for c in raw if c.isprintable()).strip()
+            name = self.rename_map.get(clean, clean)
+            if name not in self.targets or name in rename.values() or raw in rename:
+                continue
+            usecols.append(raw)
+            dtypes[raw] = str if name in TEXT_COLUMNS else self.dtype
+            rename[raw] = name
+        return usecols, dtypes, rename
+
+    def read(self, csv_path: str) -> pd.DataFrame:
+        """Lee el CSV completo con el esquema fijo y las columnas ya renombradas"""
+        usecols, dtypes, rename = self.schema(csv_path)
+        df = pd.read_csv(csv_path, usecols=usecols, dtype=dtypes, engine=self.engine)
+        return df.rename(columns=rename)
+
+    def iter_chunks(self, csv_path: str, chunksize: int) -> Iterator[pd.DataFrame]:
+        """Lee el CSV por bloques de chunksize filas (motor C: pyarrow no admite lectura por bloques)"""
+        usecols, dtypes, rename = self.schema(csv_path)
+        with pd.read_csv(csv_path, usecols=usecols, dtype=dtypes, engine='c', chunksize=chunksize) as reader:
+            for chunk in reader:
+                yield chunk.rename(columns=rename)
@@ -0,0 +1,585 @@
+import os
+import sys
+import mmap
+import time
+import zlib
+import struct
+import logging
+import ipaddress
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Tiempos por defecto de CICFlowMeter (microsegundos)
+FLOW_TIMEOUT_US = 120_000_000
+ACTIVITY_TIMEOUT_US = 5_000_000
+# Separación máxima entre paquetes de una misma ráfaga (bulk)
+BULK_GAP_US = 1_000_000
+BULK_MIN_PACKETS = 4
+
+TCP = 6
+UDP = 17
+
+FIN, SYN, RST, PSH, ACK, URG, ECE, CWR = 0x01, 0x02, 0x04, 0x08, 0x10, 0x20, 0x40, 0x80
+
+# Tipos de enlace soportados
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = (12, 14, 101)
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_LINUX_SLL2 = 276
+SUPPORTED_LINKTYPES = {LINKTYPE_NULL, LINKTYPE_ETHERNET, *LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6,
+                       LINKTYPE_LINUX_SLL, LINKTYPE_LINUX_SLL2}
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_VLAN = (0x8100, 0x88A8, 0x9100)
+
+# Columnas de salida con los nombres del CSV de CICFlowMeter (claves de ProcessingService.rename_map)
+FLOW_ID_COLUMNS = ['Flow ID', 'Src IP', 'Src Port', 'Dst IP', 'Dst Port', 'Protocol', 'Timestamp']
+FLOW_FEATURE_COLUMNS = [
+    'Flow Duration', 'Tot Fwd Pkts', 'Tot Bwd Pkts', 'TotLen Fwd Pkts', 'TotLen Bwd Pkts',
+    'Fwd Pkt Len Max', 'Fwd Pkt Len Min', 'Fwd Pkt Len Mean', 'Fwd Pkt Len Std',
+    'Bwd Pkt Len Max', 'Bwd Pkt Len Min', 'Bwd Pkt Len Mean', 'Bwd Pkt Len Std',
+    'Flow Byts/s', 'Flow Pkts/s', 'Flow IAT Mean', 'Flow IAT Std', 'Flow IAT Max', 'Flow IAT Min',
+    'Fwd IAT Tot', 'Fwd IAT Mean', 'Fwd IAT Std', 'Fwd IAT Max', 'Fwd IAT Min',
+    'Bwd IAT Tot', 'Bwd IAT Mean', 'Bwd IAT Std', 'Bwd IAT Max', 'Bwd IAT Min',
+    'Fwd PSH Flags', 'Bwd PSH Flags', 'Fwd URG Flags', 'Bwd URG Flags',
+    'Fwd Header Len', 'Bwd Header Len', 'Fwd Pkts/s', 'Bwd Pkts/s',
+    'Pkt Len Min', 'Pkt Len Max', 'Pkt Len Mean', 'Pkt Len Std', 'Pkt Len Var',
+    'FIN Flag Cnt', 'SYN Flag Cnt', 'RST Flag Cnt', 'PSH Flag Cnt', 'ACK Flag Cnt',
+    'URG Flag Cnt', 'CWE Flag Count', 'ECE Flag Cnt',
+    'Down/Up Ratio', 'Pkt Size Avg', 'Fwd Seg Size Avg', 'Bwd Seg Size Avg',
+    'Fwd Byts/b Avg', 'Fwd Pkts/b Avg', 'Fwd Blk Rate Avg',
+    'Bwd Byts/b Avg', 'Bwd Pkts/b Avg', 'Bwd Blk Rate Avg',
+    'Subflow Fwd Pkts', 'Subflow Fwd Byts', 'Subflow Bwd Pkts', 'Subflow Bwd Byts',
+    'Init Fwd Win Byts', 'Init Bwd Win Byts', 'Fwd Act Data Pkts', 'Fwd Seg Size Min',
+    'Active Mean', 'Active Std', 'Active Max', 'Active Min',
+    'Idle Mean', 'Idle Std', 'Idle Max', 'Idle Min'
+]
+FLOW_COLUMNS = FLOW_ID_COLUMNS + FLOW_FEATURE_COLUMNS + ['Label']
+
+
+class PcapReader:
+    """
+    Lector de archivos PCAP y PCAPNG sobre mmap, sin dependencias externas.
+    Recorre los registros y devuelve (timestamp en µs, tipo de enlace, offset, bytes capturados)
+    de cada paquete; los datos se leen directamente del mapa de memoria.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self.data = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'rb')
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self.data = b''
+        else:
+            self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self
+
+    def __exit__(self, *exc):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self._file.close()
+
+    def packets(self) -> Iterator[Tuple[int, int, int, int]]:
+        data = self.data
+        if len(data) < 4:
+            return
+        magic = data[:4]
+        if magic == b'\x0a\x0d\x0d\x0a':
+            yield from self._pcapng_packets()
+        elif magic in (b'\xd4\xc3\xb2\xa1', b'\xa1\xb2\xc3\xd4', b'\x4d\x3c\xb2\xa1', b'\xa1\xb2\x3c\x4d'):
+            yield from self._pcap_packets()
+        else:
+            raise ValueError(f"Formato de captura no reconocido: {self.path}")
+
+    def _pcap_packets(self) -> Iterator[Tuple[int, int, int, int]]:
+        data = self.data
+        endian = '<' if data[:4] in (b'\xd4\xc3\xb2\xa1', b'\x4d\x3c\xb2\xa1') else '>'
+        nanos = data[:4] in (b'\x4d\x3c\xb2\xa1', b'\xa1\xb2\x3c\x4d')
+        linktype = struct.unpack_from(endian + 'I', data, 20)[0] & 0x0FFFFFFF
+        record = struct.Struct(endian + 'IIII')
+        offset, size = 24, len(data)
+        while offset + 16 <= size:
+            ts_sec, ts_frac, caplen, _ = record.unpack_from(data, offset)
+            offset += 16
+            if offset + caplen > size:
+                break
+            ts = ts_sec * 1_000_000 + (ts_frac // 1000 if nanos else ts_frac)
+            yield ts, linktype, offset, caplen
+            offset += caplen
+
+    def _pcapng_packets(self) -> Iterator[Tuple[int, int, int, int]]:
+        data = self.data
+        size = len(data)
+        offset = 0
+        endian = '<'
+        interfaces: List[Tuple[int, int]] = []  # (tipo de enlace, unidades de timestamp por segundo)
+        while offset + 12 <= size:
+            block_type = struct.unpack_from(endian + 'I', data, offset)[0]
+            if block_type == 0x0A0D0D0A:
+                endian = '<' if data[offset + 8:offset + 12] == b'\x4d\x3c\x2b\x1a' else '>'
+                interfaces = []
+            block_len = struct.unpack_from(endian + 'I', data, offset + 4)[0]
+            if block_len < 12 or offset + block_len > size:
+                break
+            body = offset + 8
+            if block_type == 1:
+                linktype = struct.unpack_from(endian + 'H', data, body)[0]
+                interfaces.append((linktype, self._if_tsresol(data, body + 8, offset + block_len - 4, endian)))
+            elif block_type == 6:
+                if_id, ts_high, ts_low, caplen = struct.unpack_from(endian + 'IIII', data, body)
+                if if_id < len(interfaces):
+                    linktype, units = interfaces[if_id]
+                    yield ((ts_high << 32) | ts_low) * 1_000_000 // units, linktype, body + 20, caplen
+            elif block_type == 2:
+                if_id, _, ts_high, ts_low, caplen = struct.unpack_from(endian + 'HHIII', data, body)
+                if if_id < len(interfaces):
+                    linktype, units = interfaces[if_id]
+                    yield ((ts_high << 32) | ts_low) * 1_000_000 // units, linktype, body + 20, caplen
+            offset += block_len
+
+    @staticmethod
+    def _if_tsresol(data, offset: int, end: int, endian: str) -> int:
+        """Resolución de timestamps de la interfaz (opción if_tsresol, por defecto µs)"""
+        while offset + 4 <= end:
+            code, length = struct.unpack_from(endian + 'HH', data, offset)
+            if code == 0:
+                break
+            if code == 9 and length >= 1:
+                value = data[offset + 4]
+                units = 2 ** (value & 0x7F) if value & 0x80 else 10 ** value
+                return units
+            offset += 4 + ((length + 3) & ~3)
+        return 1_000_000
+
+
+def parse_packet(data, offset: int, caplen: int, linktype: int):
+    """
+    Decodifica las cabeceras de enlace, IPv4 y TCP/UDP de un paquete como lo hace
+    CICFlowMeter 4.0 con jnetpcap:
+    - IPv4 sin TCP/UDP (o fragmento no inicial): puertos, protocolo y longitudes a 0
+    - lo que no es IPv4 (IPv6, ARP...) se vuelve a decodificar como IPv4 desde el
+      primer byte capturado; se descarta si el IHL resultante es menor de 20 bytes
+    Returns:
+        (ip origen, ip destino, puerto origen, puerto destino, protocolo,
+         bytes de payload, bytes de cabecera L4, flags TCP, ventana TCP) o None
+    """
+    end = offset + caplen
+    if linktype == LINKTYPE_ETHERNET:
+        if caplen < 14:
+            return None
+        ethertype = (data[offset + 12] << 8) | data[offset + 13]
+        pos = offset + 14
+        while ethertype in ETHERTYPE_VLAN and pos + 4 <= end:
+            ethertype = (data[pos + 2] << 8) | data[pos + 3]
+            pos += 4
+    elif linktype in LINKTYPE_RAW or linktype in (LINKTYPE_IPV4, LINKTYPE_IPV6, LINKTYPE_NULL):
+        pos = offset + 4 if linktype == LINKTYPE_NULL else offset
+        if pos >= end:
+            return None
+        ethertype = ETHERTYPE_IPV4 if data[pos] >> 4 == 4 else 0
+    elif linktype == LINKTYPE_LINUX_SLL:
+        if caplen < 16:
+            return None
+        ethertype = (data[offset + 14] << 8) | data[offset + 15]
+        pos = offset + 16
+    elif linktype == LINKTYPE_LINUX_SLL2:
+        if caplen < 20:
+            return None
+        ethertype = (data[offset] << 8) | data[offset + 1]
+        pos = offset + 20
+    else:
+        return None
+
+    if ethertype != ETHERTYPE_IPV4:
+        pos = offset
+    if pos + 20 > end:
+        return None
+    ihl = (data[pos] & 0x0F) * 4
+    if ihl < 20 or pos + ihl > end:
+        return None
+    total_len = (data[pos + 2] << 8) | data[pos + 3]
+    proto = data[pos + 9]
+    src = bytes(data[pos + 12:pos + 16])
+    dst = bytes(data[pos + 16:pos + 20])
+    l4 = pos + ihl
+    ip_payload = total_len - ihl
+    # Fragmentos que no son el primero: no llevan cabecera TCP/UDP
+    fragment = ((data[pos + 6] & 0x1F) << 8) | data[pos + 7]
+
+    if proto == TCP and not fragment and l4 + 20 <= end:
+        header = (data[l4 + 12] >> 4) * 4
+        sport = (data[l4] << 8) | data[l4 + 1]
+        dport = (data[l4 + 2] << 8) | data[l4 + 3]
+        flags = data[l4 + 13]
+        window = (data[l4 + 14] << 8) | data[l4 + 15]
+    elif proto == UDP and not fragment and l4 + 8 <= end:
+        header = 8
+        sport = (data[l4] << 8) | data[l4 + 1]
+        dport = (data[l4 + 2] << 8) | data[l4 + 3]
+        flags = 0
+        window = 0
+    else:
+        return src, dst, 0, 0, 0, 0, 0, 0, 0
+
+    # La longitud se toma de la cabecera IP (no de lo capturado) para que el snaplen no la recorte
+    return src, dst, sport, dport, proto, max(ip_payload - header, 0), header, flags, window
+
+
+def _group_stats(groups: np.ndarray, values: np.ndarray, n_groups: int):
+    """
+    Estadísticos por flujo de valores agrupados (groups ordenado de forma no decreciente).
+    Returns:
+        count, sum, mean, std muestral, max, min (0 para flujos sin valores)
+    """
+    values = values.astype(np.float64, copy=False)
+    count = np.bincount(groups, minlength=n_groups)
+    total = np.bincount(groups, weights=values, minlength=n_groups)
+    mean = np.divide(total, count, out=np.zeros(n_groups), where=count > 0)
+    dev = np.bincount(groups, weights=(values - mean[groups]) ** 2, minlength=n_groups)
+    std = np.sqrt(np.divide(dev, count - 1, out=np.zeros(n_groups), where=count > 1))
+    vmax = np.zeros(n_groups)
+    vmin = np.zeros(n_groups)
+    if len(values):
+        starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+        present = groups[starts]
+        vmax[present] = np.maximum.reduceat(values, starts)
+        vmin[present] = np.minimum.reduceat(values, starts)
+    return count, total, mean, std, vmax, vmin
+
+
+class FlowExtractor:
+    """
+    Extractor de flujos en proceso compatible con CICFlowMeter.
+
+    Lee el PCAP con PcapReader, agrupa los paquetes en flujos bidireccionales
+    y calcula las características de CICFlowMeter con acumuladores NumPy por
+    flujo. Devuelve directamente el DataFrame con las columnas del CSV de
+    CICFlowMeter, sin lanzar Node/Java ni escribir un CSV intermedio.
+
+    Los modelos se entrenaron con la salida de CICFlowMeter 4.0, así que se
+    reproduce su ensamblado de flujos (comprobado contra processed/*.csv):
+    - clave por 5-tupla canónica; el sentido forward es el del primer paquete
+    - IPv6 y demás tramas no IPv4 se decodifican como IPv4 (ver parse_packet)
+    - tras flow_timeout desde su inicio el flujo se cierra y el paquete abre
+      otro con la misma orientación
+    - un FIN cierra el flujo tras contabilizarlo, salvo si es el que lo abre
+    - los flujos de un solo paquete se descartan
+
+    Y también las particularidades de sus características:
+    - el primer paquete cuenta dos veces en Pkt Len Mean/Std/Var y Pkt Size Avg
+    - PSH/URG por sentido solo miran el primer paquete (Bwd siempre 0)
+    - hay un subflujo por paquete, así que Subflow * = total // paquetes
+    - Init Bwd Win Byts es la ventana del último paquete backward (0 sin TCP)
+    - Fwd Act Data Pkts no cuenta el primer paquete
+    - todas las ráfagas se acumulan como backward y Bwd Byts/b Avg vale 0
+    - Active queda vacío e Idle recoge timestamp - IAT anterior por paquete
+    """
+
+    def __init__(self, flow_timeout_us: int = FLOW_TIMEOUT_US, activity_timeout_us: int = ACTIVITY_TIMEOUT_US,
+                 sample_rate: float = 1.0):
+        self.flow_timeout_us = flow_timeout_us
+        self.activity_timeout_us = activity_timeout_us
+        self.sample_rate = sample_rate
+
+    def extract(self, pcap_path: str, sample_rate: Optional[float] = None) -> pd.DataFrame:
+        """
+        Extrae los flujos de un PCAP/PCAPNG y devuelve un DataFrame (una fila por flujo).
+        Con sample_rate < 1 solo se conserva esa fracción de las conexiones (ver sampled)
+        """
+        start = time.perf_counter()
+        sample_rate = self.sample_rate if sample_rate is None else sample_rate
+        packets, flows = self._assign_flows(pcap_path, sample_rate)
+        df = self._compute_features(packets, flows)
+        sampled = f" (muestreo {sample_rate:.0%})" if sample_rate < 1 else ""
+        logging.debug(f"✓ Flujos extraídos: {len(df)} flujos de {len(packets['ts'])} paquetes{sampled} "
+                      f"en {time.perf_counter() - start:.2f}s")
+        return df
+
+    @staticmethod
+    def sampled(key: tuple, sample_rate: float) -> bool:
+        """
+        Muestreo determinista por conexión: hash CRC32 de la 5-tupla canónica, igual
+        en ambos sentidos y entre procesos, así que una conexión se conserva entera o
+        se descarta entera.
+        """
+        proto, (src, sport), (dst, dport) = key
+        digest = zlib.crc32(src + dst + struct.pack('!HHB', sport, dport, proto))
+        return digest < sample_rate * 0x100000000
+
+    def _assign_flows(self, pcap_path: str, sample_rate: float = 1.0):
+        """Recorre la captura asignando cada paquete a su flujo y sentido"""
+        flow_ids, fwd, ts, payload, header, flags, window = [], [], [], [], [], [], []
+        flows = {'src': [], 'dst': [], 'sport': [], 'dport': [], 'proto': []}
+        active: Dict[tuple, int] = {}
+        first_ts: List[int] = []
+        n_packets: List[int] = []
+        skipped_links = set()
+        # Decisión de muestreo por conexión (solo con sample_rate < 1)
+        sampling: Optional[Dict[tuple, bool]] = {} if sample_rate < 1 else None
+
+        with PcapReader(pcap_path) as reader:
+            data = reader.data
+            for packet_ts, linktype, offset, caplen in reader.packets():
+                if linktype not in SUPPORTED_LINKTYPES:
+                    skipped_links.add(linktype)
+                    continue
+                parsed = parse_packet(data, offset, caplen, linktype)
+                if parsed is None:
+                    continue
+                src, dst, sport, dport, proto, length, hdr, tcp_flags, win = parsed
+                a, b = (src, sport), (dst, dport)
+                key = (proto, a, b) if a <= b else (proto, b, a)
+                if sampling is not None:
+                    keep = sampling.get(key)
+                    if keep is None:
+                        keep = sampling[key] = self.sampled(key, sample_rate)
+                    if not keep:
+                        continue
+
+                idx = active.get(key)
+                forward = idx is None or (src == flows['src'][idx] and sport == flows['sport'][idx])
+                opens = idx is None or packet_ts - first_ts[idx] > self.flow_timeout_us
+                if opens:
+                    # Tras el timeout CICFlowMeter abre el flujo siguiente con la orientación del anterior
+                    origin = (dict(src=src, dst=dst, sport=sport, dport=dport, proto=proto) if idx is None
+                              else {name: values[idx] for name, values in flows.items()})
+                    idx = len(first_ts)
+                    active[key] = idx
+                    first_ts.append(packet_ts)
+                    n_packets.append(0)
+                    for name, value in origin.items():
+                        flows[name].append(value)
+
+                n_packets[idx] += 1
+                flow_ids.append(idx)
+                fwd.append(forward)
+                ts.append(packet_ts)
+                payload.append(length)
+                header.append(hdr)
+                flags.append(tcp_flags)
+                window.append(win)
+
+                # Como CICFlowMeter, un FIN cierra el flujo tras contabilizar el paquete,
+                # salvo si es el que lo abre
+                if tcp_flags & FIN and not opens:
+                    del active[key]
+
+        if skipped_links:
+            logging.warning(f"Tipos de enlace no soportados ignorados: {sorted(skipped_links)}")
+
+        # CICFlowMeter no emite los flujos de un solo paquete: se descartan y se renumeran los demás
+        keep = np.array(n_packets, dtype=np.int64) > 1
+        flow_ids = np.array(flow_ids, dtype=np.int64)
+        kept = keep[flow_ids]
+        packets = {
+            'flow': (np.cumsum(keep) - 1)[flow_ids[kept]],
+            'fwd': np.array(fwd, dtype=bool)[kept],
+            'ts': np.array(ts, dtype=np.int64)[kept],
+            'payload': np.array(payload, dtype=np.int64)[kept],
+            'header': np.array(header, dtype=np.int64)[kept],
+            'flags': np.array(flags, dtype=np.uint8)[kept],
+            'window': np.array(window, dtype=np.int64)[kept]
+        }
+        flows = {name: [value for value, k in zip(values, keep) if k] for name, values in flows.items()}
+        return packets, flows
+
+    def _compute_features(self, packets: Dict[str, np.ndarray], flows: Dict[str, list]) -> pd.DataFrame:
+        n = len(flows['proto'])
+        if n == 0:
+            return pd.DataFrame(columns=FLOW_COLUMNS)
+
+        # Ordenar por flujo conservando el orden de captura dentro de cada uno
+        order = np.argsort(packets['flow'], kind='stable')
+        fid = packets['flow'][order]
+        fwd = packets['fwd'][order]
+        ts = packets['ts'][order]
+        size = packets['payload'][order]
+        hdr = packets['header'][order]
+        flags = packets['flags'][order]
+        window = packets['window'][order]
+        bwd = ~fwd
+
+        first = np.flatnonzero(np.r_[True, fid[1:] != fid[:-1]])
+        last = np.r_[first[1:] - 1, len(fid) - 1]
+        start_ts = ts[first]
+        duration = (ts[last] - start_ts).astype(np.float64)
+        seconds = duration / 1e6
+
+        f = {}
+        all_count, all_bytes, all_mean, all_std, all_max, all_min = _group_stats(fid, size, n)
+        fwd_count, fwd_bytes, fwd_mean, fwd_std, fwd_max, fwd_min = _group_stats(fid[fwd], size[fwd], n)
+        bwd_count, bwd_bytes, bwd_mean, bwd_std, bwd_max, bwd_min = _group_stats(fid[bwd], size[bwd], n)
+
+        f['Flow Duration'] = duration.astype(np.int64)
+        f['Tot Fwd Pkts'] = fwd_count
+        f['Tot Bwd Pkts'] = bwd_count
+        f['TotLen Fwd Pkts'] = fwd_bytes
+        f['TotLen Bwd Pkts'] = bwd_bytes
+        f['Fwd Pkt Len Max'], f['Fwd Pkt Len Min'] = fwd_max, fwd_min
+        f['Fwd Pkt Len Mean'], f['Fwd Pkt Len Std'] = fwd_mean, fwd_std
+        f['Bwd Pkt Len Max'], f['Bwd Pkt Len Min'] = bwd_max, bwd_min
+        f['Bwd Pkt Len Mean'], f['Bwd Pkt Len Std'] = bwd_mean, bwd_std
+
+        # Igual que CICFlowMeter: duración 0 produce Infinity/NaN (lo resuelve la imputación)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            f['Flow Byts/s'] = all_bytes / seconds
+            f['Flow Pkts/s'] = all_count / seconds
+        positive = seconds > 0
+        f['Fwd Pkts/s'] = np.divide(fwd_count, seconds, out=np.zeros(n), where=positive)
+        f['Bwd Pkts/s'] = np.divide(bwd_count, seconds, out=np.zeros(n), where=positive)
+
+        # Tiempos entre llegadas: del flujo completo y de cada sentido
+        same = fid[1:] == fid[:-1]
+        flow_iat = np.diff(ts)[same]
+        flow_iat_fid = fid[1:][same]
+        _, _, iat_mean, iat_std, iat_max, iat_min = _group_stats(flow_iat_fid, flow_iat, n)
+        f['Flow IAT Mean'], f['Flow IAT Std'] = iat_mean, iat_std
+        f['Flow IAT Max'], f['Flow IAT Min'] = iat_max, iat_min
+        for prefix, mask in (('Fwd', fwd), ('Bwd', bwd)):
+            dir_fid, dir_ts = fid[mask], ts[mask]
+            dir_same = dir_fid[1:] == dir_fid[:-1]
+            _, total, mean, std, vmax, vmin = _group_stats(dir_fid[1:][dir_same], np.diff(dir_ts)[dir_same], n)
+            f[f'{prefix} IAT Tot'], f[f'{prefix} IAT Mean'], f[f'{prefix} IAT Std'] = total, mean, std
+            f[f'{prefix} IAT Max'], f[f'{prefix} IAT Min'] = vmax, vmin
+
+        def flag_count(flag):
+            return np.bincount(fid[(flags & flag) != 0], minlength=n)
+
+        # Solo se miran en el primer paquete del flujo, que siempre es forward
+        f['Fwd PSH Flags'] = ((flags[first] & PSH) != 0).astype(np.int64)
+        f['Bwd PSH Flags'] = np.zeros(n, dtype=np.int64)
+        f['Fwd URG Flags'] = ((flags[first] & URG) != 0).astype(np.int64)
+        f['Bwd URG Flags'] = np.zeros(n, dtype=np.int64)
+        f['Fwd Header Len'] = np.bincount(fid[fwd], weights=hdr[fwd], minlength=n).astype(np.int64)
+        f['Bwd Header Len'] = np.bincount(fid[bwd], weights=hdr[bwd], minlength=n).astype(np.int64)
+
+        # CICFlowMeter añade el primer paquete dos veces a las longitudes del flujo
+        twice = np.argsort(np.r_[fid, fid[first]], kind='stable')
+        _, len_total, len_mean, len_std, _, _ = _group_stats(np.r_[fid, fid[first]][twice], np.r_[size, size[first]][twice], n)
+        f['Pkt Len Min'], f['Pkt Len Max'] = all_min, all_max
+        f['Pkt Len Mean'], f['Pkt Len Std'] = len_mean, len_std
+        f['Pkt Len Var'] = len_std ** 2
+        for column, flag in (('FIN Flag Cnt', FIN), ('SYN Flag Cnt', SYN), ('RST Flag Cnt', RST),
+                             ('PSH Flag Cnt', PSH), ('ACK Flag Cnt', ACK), ('URG Flag Cnt', URG),
+                             ('CWE Flag Count', CWR), ('ECE Flag Cnt', ECE)):
+            f[column] = flag_count(flag)
+
+        f['Down/Up Ratio'] = np.floor_divide(bwd_count, np.maximum(fwd_count, 1))
+        f['Pkt Size Avg'] = len_total / all_count
+        f['Fwd Seg Size Avg'] = fwd_mean
+        f['Bwd Seg Size Avg'] = bwd_mean
+
+        # CICFlowMeter compara las IP de origen por referencia: todas las ráfagas van a backward
+        states, bulk_packets, bulk_bytes, bulk_duration = self._bulk_stats(fid, ts, size, n).T
+        zeros = np.zeros(n, dtype=np.int64)
+        f['Fwd Byts/b Avg'], f['Fwd Pkts/b Avg'], f['Fwd Blk Rate Avg'] = zeros, zeros, zeros
+        f['Bwd Byts/b Avg'] = zeros
+        f['Bwd Pkts/b Avg'] = np.floor_divide(bulk_packets, np.maximum(states, 1))
+        f['Bwd Blk Rate Avg'] = np.floor(np.divide(bulk_bytes, bulk_duration / 1e6, out=np.zeros(n),
+                                                   where=bulk_duration > 0)).astype(np.int64)
+
+        # CICFlowMeter cuenta un subflujo nuevo en cada paquete
+        f['Subflow Fwd Pkts'] = fwd_count // all_count
+        f['Subflow Fwd Byts'] = fwd_bytes.astype(np.int64) // all_count
+        f['Subflow Bwd Pkts'] = bwd_count // all_count
+        f['Subflow Bwd Byts'] = bwd_bytes.astype(np.int64) // all_count
+
+        f['Init Fwd Win Byts'] = window[first]
+        # Se sobrescribe con cada paquete backward: queda la ventana del último
+        init_bwd = np.zeros(n, dtype=np.int64)
+        bwd_idx = np.flatnonzero(bwd)
+        if len(bwd_idx):
+            last_bwd = bwd_idx[np.r_[fid[bwd_idx][1:] != fid[bwd_idx][:-1], True]]
+            init_bwd[fid[last_bwd]] = window[last_bwd]
+        f['Init Bwd Win Byts'] = init_bwd
+        # El primer paquete no se cuenta
+        f['Fwd Act Data Pkts'] = np.bincount(fid[fwd & (size > 0)], minlength=n) - (size[first] > 0)
+        fwd_hdr_min = np.zeros(n, dtype=np.int64)
+        fwd_idx = np.flatnonzero(fwd)
+        fwd_starts = np.flatnonzero(np.r_[True, fid[fwd_idx][1:] != fid[fwd_idx][:-1]])
+        fwd_hdr_min[fid[fwd_idx][fwd_starts]] = np.minimum.reduceat(hdr[fwd_idx], fwd_starts)
+        f['Fwd Seg Size Min'] = fwd_hdr_min
+
+        idle_fid, idle = self._idle_times(fid, ts, flags, first)
+        _, _, idle_mean, idle_std, idle_max, idle_min = _group_stats(idle_fid, idle, n)
+        f['Active Mean'], f['Active Std'], f['Active Max'], f['Active Min'] = zeros, zeros, zeros, zeros
+        f['Idle Mean'], f['Idle Std'], f['Idle Max'], f['Idle Min'] = idle_mean, idle_std, idle_max, idle_min
+
+        src_ip = [str(ipaddress.ip_address(ip)) for ip in flows['src']]
+        dst_ip = [str(ipaddress.ip_address(ip)) for ip in flows['dst']]
+        df = pd.DataFrame({
+            'Flow ID': [f"{s}-{d}-{sp}-{dp}-{p}" for s, d, sp, dp, p in
+                        zip(src_ip, dst_ip, flows['sport'], flows['dport'], flows['proto'])],
+            'Src IP': src_ip,
+            'Src Port': flows['sport'],
+            'Dst IP': dst_ip,
+            'Dst Port': flows['dport'],
+            'Protocol': flows['proto'],
+            'Timestamp': pd.to_datetime(start_ts, unit='us'),
+            **{column: f[column] for column in FLOW_FEATURE_COLUMNS},
+            'Label': 'NeedManualLabel'
+        })
+        return df
+
+    def _idle_times(self, fid: np.ndarray, ts: np.ndarray, flags: np.ndarray, first: np.ndarray):
+        """
+        Tiempos inactivos tal como los calcula CICFlowMeter 4.0. Por cada paquete
+        se llama a updateActiveIdleTime con su timestamp (salvo si lleva FIN) y
+        después, desde la detección de subflujos, con el IAT respecto al paquete
+        anterior; el final del periodo activo queda así en ese IAT y la siguiente
+        llamada con timestamp registra como inactivo timestamp - IAT anterior.
+        Ningún periodo activo llega a tener duración positiva.
+        Returns:
+            (flujo de cada valor, valores en µs), ordenados por flujo
+        """
+        timeout = self.activity_timeout_us
+        iat = np.r_[0, np.diff(ts)]
+        position = np.arange(len(ts)) - np.repeat(first, np.diff(np.r_[first, len(ts)]))
+        fin = (flags & FIN) != 0
+        # Fin del periodo activo antes de cada paquete: el inicio del flujo para el segundo y el IAT anterior para el resto
+        previous_end = np.where(position == 1, ts[first][fid], np.r_[0, iat[:-1]])
+        candidate = np.where(fin, iat, ts) - previous_end
+        keep = (position >= 1) & (candidate > timeout) & ~(fin & (position == 1))
+        return fid[keep], candidate[keep]
+
+    @staticmethod
+    def _bulk_stats(fid: np.ndarray, ts: np.ndarray, size: np.ndarray, n: int) -> np.ndarray:
+        """
+        Ráfagas (bulk) de CICFlowMeter: al menos 4 paquetes con datos seguidos,
+        separados menos de 1s. CICFlowMeter 4.0 no distingue el sentido (todas
+        las acumula como backward) ni corta la ráfaga por datos del otro sentido.
+        Returns:
+            Array (flujos, [ráfagas, paquetes, bytes, duración µs])
+        """
+        out = np.zeros((n, 4), dtype=np.int64)
+        data_idx = np.flatnonzero(size > 0)
+        current = -1
+        for flow, t, length in zip(fid[data_idx].tolist(), ts[data_idx].tolist(), size[data_idx].tolist()):
+            if flow != current:
+                current = flow
+                # [inicio de la ráfaga candidata, último ts, paquetes, bytes]
+                state = [0, 0, 0, 0]
+            if state[0] == 0 or t - state[1] > BULK_GAP_US:
+                state[0], state[1], state[2], state[3] = t, t, 1, length
+                continue
+            state[2] += 1
+            state[3] += length
+            stats = out[flow]
+            if state[2] == BULK_MIN_PACKETS:
+                stats[0] += 1
+                stats[1] += state[2]
+                stats[2] += state[3]
+                stats[3] += t - state[0]
+            elif state[2] > BULK_MIN_PACKETS:
+                stats[1] += 1
+                stats[2] += length
+                stats[3] += t - state[1]
+            state[1] = t
+        return out
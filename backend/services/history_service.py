@@ -0,0 +1,206 @@
+import io
+import csv
+import json
+import base64
+import math
+import importlib.util
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Tuple, AsyncIterator, Callable, Sequence
+
+from sqlalchemy import text
+
+from config import DatabaseConfig
+from database import Database
+from db_schema import TABLE_NAME, ROLLUP_TABLE, TEXT_COLUMNS, COLUMN_MAPPING
+
+# Columnas exportadas de trafico_predic, en orden
+EXPORT_COLUMNS = ['id', 'timestamp', 'connection_type', 'duration', *COLUMN_MAPPING.values(), 'prediction']
+# Formatos de exportación y su tipo MIME
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'arrow': 'application/vnd.apache.arrow.stream'
+}
+# Marca de fin de un stream IPC de Arrow
+ARROW_EOS = b'\xff\xff\xff\xff\x00\x00\x00\x00'
+# Clave del orden de /history: la clave primaria de trafico_predic_resumen
+HISTORY_KEY = ('timestamp', 'connection_type', 'duration', 'prediction')
+
+
+def encode_cursor(values: Tuple) -> str:
+    """Cursor opaco (base64 de JSON) con la clave de la última fila devuelta"""
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """
+    Decodifica un cursor de encode_cursor; el primer valor es siempre un timestamp.
+    Raises:
+        ValueError si el cursor no es válido
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != size:
+            raise ValueError
+        values[0] = datetime.fromisoformat(values[0])
+        return values
+    except Exception:
+        raise ValueError("Cursor de paginación no válido")
+
+
+def _date_filters(start: Optional[datetime], end: Optional[datetime], filters: list, params: dict):
+    if start:
+        filters.append("timestamp >= :start")
+        params['start'] = start
+    if end:
+        filters.append("timestamp <= :end")
+        params['end'] = end
+
+
+class HistoryService:
+    """
+    Consultas de lectura sobre el historial.
+
+    page() pagina trafico_predic_resumen por keyset (timestamp y el resto de la
+    clave primaria, en orden descendente): cada página es un rango del índice,
+    sin OFFSET, y devuelve el cursor de la siguiente.
+    export() recorre trafico_predic con un cursor del servidor en orden
+    (timestamp, id) y produce el resultado en bloques de batch_size filas ya
+    codificados en NDJSON, CSV o Arrow, de modo que la memoria no depende del
+    número de filas exportadas.
+    """
+
+    def __init__(self, database: Database, batch_size: int = None):
+        self.database = database
+        self.batch_size = batch_size or DatabaseConfig.EXPORT_BATCH_SIZE
+
+    async def page(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                   limit: int = 100, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Returns:
+            {'history': [...], 'next_cursor': cursor de la página siguiente o None}
+        """
+        filters, params = [], {'limit': limit + 1}
+        _date_filters(start, end, filters, params)
+        if cursor:
+            after = decode_cursor(cursor, len(HISTORY_KEY))
+            filters.append(f"({', '.join(HISTORY_KEY)}) < (:c_ts, :c_type, :c_duration, :c_prediction)")
+            params.update(zip(('c_ts', 'c_type', 'c_duration', 'c_prediction'), after))
+
+        query = f"SELECT {', '.join(HISTORY_KEY)}, count FROM {ROLLUP_TABLE}"
+        if filters:
+            query += " WHERE " + " AND ".join(filters)
+        query += " ORDER BY " + ", ".join(f"{col} DESC" for col in HISTORY_KEY) + " LIMIT :limit"
+
+        async with self.database.async_engine.connect() as conn:
+            rows = (await conn.execute(text(query), params)).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(tuple(getattr(last, col) for col in HISTORY_KEY))
+        history = [{
+            "timestamp": row.timestamp.isoformat() if row.timestamp else None,
+            "connection_type": row.connection_type,
+            "duration": row.duration,
+            "prediction": row.prediction,
+            "count": row.count
+        } for row in rows]
+        return {"history": history, "next_cursor": next_cursor}
+
+    @staticmethod
+    def check_format(fmt: str):
+        """Raises: ValueError si el formato no existe o falta pyarrow para Arrow"""
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Formato no soportado: {fmt} (usar {', '.join(EXPORT_FORMATS)})")
+        if fmt == 'arrow' and importlib.util.find_spec('pyarrow') is None:
+            raise ValueError("La exportación Arrow necesita pyarrow instalado")
+
+    async def export(self, fmt: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                     connection_type: Optional[str] = None, prediction: Optional[str] = None,
+                     after: Optional[str] = None, limit: Optional[int] = None) -> AsyncIterator[bytes]:
+        """
+        Genera los flujos de trafico_predic codificados en fmt.
+        after es un cursor (timestamp, id) para reanudar una exportación cortada
+        a partir de la última fila recibida.
+        """
+        self.check_format(fmt)
+        filters, params = [], {}
+        _date_filters(start, end, filters, params)
+        if connection_type:
+            filters.append("connection_type = :connection_type")
+            params['connection_type'] = connection_type
+        if prediction:
+            filters.append("prediction = :prediction")
+            params['prediction'] = prediction
+        if after:
+            params['c_ts'], params['c_id'] = decode_cursor(after, 2)
+            filters.append("(timestamp, id) > (:c_ts, :c_id)")
+
+        query = f"SELECT {', '.join(EXPORT_COLUMNS)} FROM {TABLE_NAME}"
+        if filters:
+            query += " WHERE " + " AND ".join(filters)
+        query += " ORDER BY timestamp, id"
+        if limit:
+            query += " LIMIT :limit"
+            params['limit'] = limit
+
+        header, encode, footer = self.encoder(fmt)
+        if header:
+            yield header
+        async with self.database.async_engine.connect() as conn:
+            result = await conn.stream(text(query), params)
+            async for rows in result.partitions(self.batch_size):
+                yield encode(rows)
+        if footer:
+            yield footer
+
+    @staticmethod
+    def encoder(fmt: str) -> Tuple[bytes, Callable[[Sequence], bytes], bytes]:
+        """
+        Returns:
+            (cabecera, función que codifica un lote de filas, pie) del formato fmt
+        """
+        if fmt == 'ndjson':
+            return b'', _encode_ndjson, b''
+        if fmt == 'csv':
+            return _encode_csv([EXPORT_COLUMNS]), _encode_csv, b''
+
+        import pyarrow as pa
+        types = {'id': pa.int64(), 'timestamp': pa.timestamp('us'), 'connection_type': pa.string(),
+                 'duration': pa.int32(), 'prediction': pa.string()}
+        schema = pa.schema([
+            (col, types.get(col, pa.string() if col in TEXT_COLUMNS else pa.float32())) for col in EXPORT_COLUMNS
+        ])
+
+        def encode_arrow(rows: Sequence) -> bytes:
+            # Cada lote es un mensaje IPC independiente; juntos forman un stream Arrow
+            columns = zip(*rows)
+            batch = pa.record_batch(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+            )
+            return batch.serialize().to_pybytes()
+
+        return schema.serialize().to_pybytes(), encode_arrow, ARROW_EOS
+
+
+def _encode_ndjson(rows: Sequence) -> bytes:
+    lines = []
+    for row in rows:
+        record = {}
+        for col, value in zip(EXPORT_COLUMNS, row):
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            elif isinstance(value, float) and not math.isfinite(value):
+                value = None
+            record[col] = value
+        lines.append(json.dumps(record))
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def _encode_csv(rows: Sequence) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode()
@@ -0,0 +1,113 @@
+import os
+import sys
+import json
+import logging
+import warnings
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional
+
+# Nombre del archivo de medianas de entrenamiento dentro de ml_models
+MEDIANS_FILE = "training_medians.json"
+
+
+class ImputationService:
+    """
+    Imputación vectorizada de valores faltantes, infinitos y nulos.
+
+    Trabaja sobre todo el bloque numérico a la vez: una máscara con np.isfinite
+    localiza los valores a imputar y se rellenan con la mediana de su columna.
+    Si se proporcionan medianas de entrenamiento se usan esas (estables aunque
+    la captura sea pequeña) y solo se calcula la mediana del lote para las
+    columnas que no tengan mediana guardada.
+    """
+
+    def __init__(self, medians: Optional[Dict[str, float]] = None):
+        self.medians = medians or {}
+
+    def impute(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Devuelve una copia de df con NaN/±inf imputados por columna"""
+        df_clean = df.copy()
+        columns = df_clean.select_dtypes(include=['floating']).columns
+        if len(columns) == 0:
+            return df_clean
+
+        block = df_clean[columns].to_numpy(dtype=np.float64, copy=True)
+        missing = ~np.isfinite(block)
+        col_missing = missing.any(axis=0)
+        if not col_missing.any():
+            logging.debug("📊 Imputación: no hay valores faltantes ni infinitos")
+            return df_clean
+
+        fill = np.zeros(len(columns), dtype=np.float64)
+        needs_batch_median = col_missing.copy()
+
+        # Medianas de entrenamiento para las columnas que las tengan
+        if self.medians:
+            trained = np.array([self.medians.get(col, np.nan) for col in columns], dtype=np.float64)
+            has_trained = ~np.isnan(trained)
+            fill[has_trained] = trained[has_trained]
+            needs_batch_median &= ~has_trained
+
+        # Mediana del lote solo para las columnas afectadas sin mediana guardada
+        if needs_batch_median.any():
+            sub = block[:, needs_batch_median]
+            sub[missing[:, needs_batch_median]] = np.nan
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                batch_medians = np.nanmedian(sub, axis=0)
+            # Si no hay valores válidos para calcular mediana, usar 0
+            batch_medians[np.isnan(batch_medians)] = 0.0
+            fill[needs_batch_median] = batch_medians
+
+        rows, cols = np.nonzero(missing)
+        block[rows, cols] = fill[cols]
+
+        changed = columns[col_missing]
+        df_clean[changed] = pd.DataFrame(
+            block[:, col_missing], index=df_clean.index, columns=changed
+        ).astype(df_clean.dtypes[changed].to_dict())
+
+        logging.debug(f"📊 Imputación: {len(rows)} valores imputados en {len(changed)} columnas "
+                      f"({int((col_missing & ~needs_batch_median).sum())} con medianas de entrenamiento)")
+        return df_clean
+
+    @staticmethod
+    def compute_medians(df: pd.DataFrame) -> Dict[str, float]:
+        """Calcula la mediana de los valores finitos de cada columna numérica"""
+        columns = df.select_dtypes(include=['number']).columns
+        block = df[columns].to_numpy(dtype=np.float64, copy=True)
+        block[~np.isfinite(block)] = np.nan
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            medians = np.nanmedian(block, axis=0)
+        medians[np.isnan(medians)] = 0.0
+        return {col: float(m) for col, m in zip(columns, medians)}
+
+    @staticmethod
+    def load_medians(path: str) -> Optional[Dict[str, float]]:
+        """Lee las medianas de entrenamiento; None si el archivo no existe"""
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return {col: float(value) for col, value in json.load(f).items()}
+
+    @staticmethod
+    def save_medians(medians: Dict[str, float], path: str):
+        """Guarda las medianas de entrenamiento en formato JSON"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(medians, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    # Uso: python services/imputation_service.py <csv_entrenamiento> [salida.json]
+    if len(sys.argv) < 2:
+        print('Uso: python services/imputation_service.py <csv_entrenamiento> [salida.json]')
+        sys.exit(1)
+    training_csv = sys.argv[1]
+    output_path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ml_models', MEDIANS_FILE
+    )
+    medians = ImputationService.compute_medians(pd.read_csv(training_csv))
+    ImputationService.save_medians(medians, output_path)
+    print(f'✓ {len(medians)} medianas guardadas en {output_path}')
@@ -0,0 +1,240 @@
+import logging
+import numpy as np
+import pandas as pd
+from typing import List, Dict, Optional, Any, Tuple
+
+from services.feature_projector import FeatureProjector
+from services.prediction_cache import PredictionCache
+from services.sharded_inference import ShardedInference
+from services.metrics import span
+
+
+class InferenceEngine:
+    """
+    Pipeline de inferencia precompilado a partir de (preprocesador, PCA, clasificador).
+
+    El escalado de las columnas numéricas y la proyección PCA son lineales, así que
+    se pliegan en una sola matriz W y un sesgo b:
+
+        ((x - center) / scale - pca.mean_) @ components_.T  ==  x @ W + b
+
+    Las columnas binarias pasan sin transformar y se concatenan al final, igual que
+    hace el ColumnTransformer. Si el preprocesador no se puede plegar se usa la
+    ruta de scikit-learn (transform del preprocesador + PCA). Con la exportación
+    compacta (services/compact_model.py) W y b llegan ya calculados en linear.
+    """
+
+    def __init__(self, scaler, pca, model, numeric_columns: List[str], binary_columns: List[str],
+                 etiquetas: Dict[int, str], cache: Optional[PredictionCache] = None,
+                 sharded: Optional[ShardedInference] = None,
+                 linear: Optional[Tuple[np.ndarray, np.ndarray]] = None):
+        self.scaler = scaler
+        self.pca = pca
+        self.model = model
+        self.numeric_columns = list(numeric_columns)
+        self.binary_columns = list(binary_columns)
+        self.feature_columns = self.numeric_columns + self.binary_columns
+        self.n_numeric = len(self.numeric_columns)
+        # Proyector compilado una vez con el esquema de entrada del modelo
+        self.projector = FeatureProjector(self.feature_columns, dtype=np.float64)
+
+        # Clases del clasificador y su etiqueta legible (precalculadas una vez)
+        self.classes = np.asarray(model.classes_)
+        self.class_labels = np.array(
+            [etiquetas.get(c, f'Unknown_Class_{c}') for c in self.classes.tolist()], dtype=object
+        )
+        # Columnas de predict_proba que corresponden a clases conocidas
+        self.known_class_idx = [i for i, c in enumerate(self.classes.tolist()) if c in etiquetas]
+        self.known_class_names = [etiquetas[self.classes[i]] for i in self.known_class_idx]
+        # Caché de probabilidades por huella de la entrada (va con el engine: se vacía al recargar modelos)
+        self.cache = cache
+        # Pool de procesos para los lotes muy grandes (None = siempre en este proceso)
+        self.sharded = sharded
+
+        if linear is not None:
+            # Etapa lineal ya plegada (exportación compacta): no hay escalador ni PCA
+            self.weights, self.bias = linear
+            if self.weights.shape[0] != self.n_numeric:
+                raise ValueError(f"La etapa lineal espera {self.weights.shape[0]} columnas numéricas, "
+                                 f"no {self.n_numeric}")
+            self.fused = True
+            return
+        try:
+            self.weights, self.bias = self._fuse_linear_stage()
+            self.fused = True
+        except ValueError as e:
+            logging.warning(f"No se pudo fusionar escalado+PCA, se usará scikit-learn: {e}")
+            self.weights, self.bias = None, None
+            self.fused = False
+
+    def _fuse_linear_stage(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Calcula W (n_numeric x n_components) y b a partir del escalador y el PCA"""
+        center, scale, scaler_columns = self._numeric_scaling()
+
+        # Posición de cada columna escalada dentro del bloque numérico de entrada
+        try:
+            positions = [self.numeric_columns.index(c) for c in scaler_columns]
+        except ValueError:
+            raise ValueError("Las columnas del escalador no coinciden con las columnas numéricas")
+        if len(positions) != self.n_numeric:
+            raise ValueError("El escalador no cubre todas las columnas numéricas")
+
+        components = np.asarray(self.pca.components_, dtype=np.float64)
+        pca_mean = getattr(self.pca, 'mean_', None)
+        pca_mean = np.zeros(components.shape[1]) if pca_mean is None else np.asarray(pca_mean, dtype=np.float64)
+        if getattr(self.pca, 'whiten', False):
+            components = components / np.sqrt(np.asarray(self.pca.explained_variance_, dtype=np.float64))[:, None]
+
+        weights = np.zeros((self.n_numeric, components.shape[0]), dtype=np.float64)
+        weights[positions, :] = (components / scale).T
+        bias = -((center / scale + pca_mean) @ components.T)
+        return np.ascontiguousarray(weights), bias
+
+    def _numeric_scaling(self) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+        """Extrae centro y escala por columna del preprocesador (ColumnTransformer o escalador)"""
+        scaler = self.scaler
+        columns = self.numeric_columns
+
+        if hasattr(scaler, 'transformers_'):
+            numeric = None
+            for name, transformer, cols in scaler.transformers_:
+                cols = list(cols)
+                if name == 'remainder' and cols and transformer != 'drop':
+                    raise ValueError("El preprocesador deja columnas sin transformar (remainder)")
+                if name == 'remainder' or transformer == 'drop':
+                    continue
+                if set(cols) <= set(self.binary_columns):
+                    # Las columnas binarias deben pasar sin transformar
+                    if transformer != 'passthrough' and type(transformer).__name__ != 'FunctionTransformer':
+                        raise ValueError(f"Transformador no lineal para columnas binarias: {name}")
+                    if getattr(transformer, 'func', None) is not None:
+                        raise ValueError(f"FunctionTransformer con función para columnas binarias: {name}")
+                    continue
+                if numeric is not None:
+                    raise ValueError("Más de un transformador para columnas numéricas")
+                numeric = (transformer, cols)
+                # La salida del ColumnTransformer debe empezar por el bloque numérico
+                output_slice = getattr(scaler, 'output_indices_', {}).get(name)
+                if output_slice is not None and output_slice.start != 0:
+                    raise ValueError("El bloque numérico no es el primero en la salida del preprocesador")
+            if numeric is None:
+                raise ValueError("No se encontró el transformador de columnas numéricas")
+            scaler, columns = numeric
+
+        n = len(columns)
+        if hasattr(scaler, 'center_') or type(scaler).__name__ == 'RobustScaler':
+            center = getattr(scaler, 'center_', None)
+        elif hasattr(scaler, 'mean_') or type(scaler).__name__ == 'StandardScaler':
+            center = getattr(scaler, 'mean_', None)
+        else:
+            raise ValueError(f"Escalador no soportado: {type(scaler).__name__}")
+        scale = getattr(scaler, 'scale_', None)
+
+        center = np.zeros(n) if center is None else np.asarray(center, dtype=np.float64)
+        scale = np.ones(n) if scale is None else np.asarray(scale, dtype=np.float64)
+        return center, scale, columns
+
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        """Convierte la matriz de características (orden numéricas + binarias) en la entrada del clasificador"""
+        X = np.asarray(X, dtype=np.float64)
+        if not self.fused:
+            with span('scaling'):
+                X_df = pd.DataFrame(X, columns=self.feature_columns)
+                X_scaled = self.scaler.transform(X_df)
+            with span('pca'):
+                X_pca = self.pca.transform(X_scaled[:, :-len(self.binary_columns)])
+                return np.hstack((X_pca, X_scaled[:, -len(self.binary_columns):]))
+
+        # Escalado y PCA son una sola multiplicación: se miden juntos
+        with span('scaling_pca'):
+            n_components = self.weights.shape[1]
+            X_final = np.empty((X.shape[0], n_components + len(self.binary_columns)), dtype=np.float64)
+            np.matmul(X[:, :self.n_numeric], self.weights, out=X_final[:, :n_components])
+            X_final[:, :n_components] += self.bias
+            X_final[:, n_components:] = X[:, self.n_numeric:]
+            return X_final
+
+    def run(self, X: np.ndarray) -> Dict[str, Any]:
+        """
+        Ejecuta el pipeline completo sobre un lote.
+        Returns:
+            Diccionario columnar con arrays de NumPy:
+            {
+                'labels': etiqueta por fila,
+                'class_ids': clase predicha por fila,
+                'confidences': probabilidad de la clase predicha,
+                'probabilities': matriz (filas x clases) de predict_proba
+            }
+        """
+        probabilities = self._cached_probabilities(X) if self.cache is not None else self.predict_proba(X)
+        best = probabilities.argmax(axis=1)
+        return {
+            'labels': self.class_labels[best],
+            'class_ids': self.classes[best],
+            'confidences': probabilities[np.arange(len(best)), best],
+            'probabilities': probabilities
+        }
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Escalado + PCA + predict_proba del clasificador sobre todas las filas"""
+        if self.sharded is not None and self.sharded.should_shard(len(X)):
+            with span('classification', rows=len(X), sharded=True):
+                return self.sharded.predict_proba(X, len(self.classes), self._predict_proba_local)
+        return self._predict_proba_local(X)
+
+    def _predict_proba_local(self, X: np.ndarray) -> np.ndarray:
+        X_final = self.transform(X)
+        with span('classification', rows=len(X_final)):
+            return self.model.predict_proba(X_final)
+
+    def _cached_probabilities(self, X: np.ndarray) -> np.ndarray:
+        """
+        predict_proba con la caché por delante: solo las filas que no están en
+        caché (y una sola vez cada huella repetida dentro del lote) van al modelo.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        probabilities = np.empty((len(X), len(self.classes)), dtype=np.float64)
+        with span('prediction_cache', rows=len(X)):
+            keys = self.cache.keys(X)
+            hit_rows, hit_probabilities = self.cache.get_many(keys)
+        if len(hit_rows):
+            probabilities[hit_rows] = hit_probabilities
+        if len(hit_rows) == len(X):
+            return probabilities
+
+        missed = np.ones(len(X), dtype=bool)
+        missed[hit_rows] = False
+        miss_rows = np.flatnonzero(missed)
+        # Una sola fila por huella que falta; las repetidas reutilizan su resultado
+        unique_keys, first, inverse = np.unique(keys[miss_rows], return_index=True, return_inverse=True)
+        computed = self.predict_proba(X[miss_rows[first]])
+        self.cache.put_many(unique_keys, computed)
+        probabilities[miss_rows] = computed[inverse]
+        return probabilities
+
+    def to_columns(self, output: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Predicciones en formato columnar (sin objetos por fila):
+        probabilities tiene una fila por clase conocida y una columna por flujo
+        """
+        return {
+            'labels': output['labels'],
+            'confidences': output['confidences'],
+            'class_names': list(self.known_class_names),
+            'probabilities': np.ascontiguousarray(output['probabilities'][:, self.known_class_idx].T)
+        }
+
+    def to_records(self, output: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Construye la lista de diccionarios por fila (solo si el llamador la necesita)"""
+        known = output['probabilities'][:, self.known_class_idx].tolist()
+        names = self.known_class_names
+        return [
+            {
+                'label': label,
+                'confidence': confidence,
+                'probabilities': dict(zip(names, probs))
+            }
+            for label, confidence, probs in zip(
+                output['labels'].tolist(), output['confidences'].tolist(), known
+            )
+        ]
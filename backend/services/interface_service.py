@@ -0,0 +1,188 @@
+import os
+import re
+import time
+import shutil
+import logging
+import threading
+import subprocess
+from typing import Dict, Any, List, Optional
+
+from config import CaptureConfig
+
+SYS_CLASS_NET = '/sys/class/net'
+# ARPHRD_LOOPBACK en /sys/class/net/<if>/type
+ARPHRD_LOOPBACK = 772
+IFF_UP = 0x1
+
+# "1. eth0", "2. lo (Loopback)", "3. \Device\NPF_{...} (Wi-Fi)"
+TSHARK_LINE = re.compile(r'^\s*(\d+)\.\s+(\S+)(?:\s+\((.*)\))?\s*$')
+
+WIFI_HINTS = ('wlan', 'wlp', 'wifi', 'wi-fi', 'wireless', 'wlx', '802.11')
+ETHERNET_HINTS = ('eth', 'enp', 'eno', 'ens', 'enx', 'ethernet')
+LOOPBACK_HINTS = ('loopback',)
+
+# Pseudo-interfaces y capturas extcap que lista `tshark -D` pero que no son
+# interfaces de red (nunca se eligen por tipo, solo por nombre)
+PSEUDO_INTERFACES = frozenset((
+    'any', 'nflog', 'nfqueue', 'bluetooth-monitor', 'dbus-system', 'dbus-session',
+    'ciscodump', 'randpkt', 'sshdump', 'udpdump', 'wifidump', 'dpauxmon', 'sdjournal',
+    'androiddump', 'etwdump', 'falcodump'
+))
+# Variantes numeradas: usbmon0, usbmon1, bluetooth0...
+PSEUDO_INTERFACE_FAMILIES = re.compile(r'^(usbmon|bluetooth)\d+$')
+
+# connection_type que seleccionan interfaces por tipo en lugar de por nombre
+KIND_ALIASES = {
+    'wifi': ('wifi',),
+    'wi-fi': ('wifi',),
+    'wlan': ('wifi',),
+    'ethernet': ('ethernet',),
+    'eth': ('ethernet',),
+    'auto': ('wifi', 'ethernet'),
+    'all': ('wifi', 'ethernet', 'other')
+}
+
+
+def parse_tshark_interfaces(output: str) -> List[Dict[str, Any]]:
+    """Interpreta la salida de `tshark -D` (una interfaz por línea)"""
+    interfaces = []
+    for line in output.splitlines():
+        match = TSHARK_LINE.match(line)
+        if match:
+            index, name, description = match.groups()
+            interfaces.append({'index': int(index), 'name': name, 'description': description or ''})
+    return interfaces
+
+
+def classify(name: str, description: str = '', wireless: bool = False, loopback: bool = False) -> str:
+    """Tipo de interfaz: wifi, ethernet, loopback, pseudo u other"""
+    if name in PSEUDO_INTERFACES or PSEUDO_INTERFACE_FAMILIES.match(name):
+        return 'pseudo'
+    text = f"{name} {description}".lower()
+    if loopback or name == 'lo' or any(hint in text for hint in LOOPBACK_HINTS):
+        return 'loopback'
+    if wireless or any(hint in text for hint in WIFI_HINTS):
+        return 'wifi'
+    if any(hint in text for hint in ETHERNET_HINTS):
+        return 'ethernet'
+    return 'other'
+
+
+def _read_sys(name: str, attribute: str) -> Optional[str]:
+    try:
+        with open(os.path.join(SYS_CLASS_NET, name, attribute)) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def sysfs_interface(name: str) -> Optional[Dict[str, Any]]:
+    """Estado y tipo de una interfaz según /sys/class/net (None si no existe, p. ej. en Windows)"""
+    if not os.path.isdir(os.path.join(SYS_CLASS_NET, name)):
+        return None
+    operstate = _read_sys(name, 'operstate') or 'unknown'
+    if operstate == 'unknown':
+        # loopback y túneles informan 'unknown'; se usa el flag IFF_UP
+        flags = _read_sys(name, 'flags')
+        if flags:
+            operstate = 'up' if int(flags, 16) & IFF_UP else 'down'
+    link_type = _read_sys(name, 'type')
+    return {
+        'status': 'up' if operstate == 'up' else 'down',
+        'wireless': os.path.exists(os.path.join(SYS_CLASS_NET, name, 'wireless')),
+        'loopback': link_type == str(ARPHRD_LOOPBACK)
+    }
+
+
+class InterfaceInventory:
+    """
+    Inventario de interfaces de captura con caché.
+    Combina `tshark -D` (nombres que acepta tshark) con /sys/class/net (estado y
+    tipo) y solo vuelve a consultarlos cuando pasa ttl segundos o se pide refresh.
+    """
+
+    def __init__(self, ttl: float = None):
+        self.ttl = CaptureConfig.INTERFACE_CACHE_TTL if ttl is None else ttl
+        self._lock = threading.Lock()
+        self._interfaces: Optional[List[Dict[str, Any]]] = None
+        self._loaded_at = 0.0
+
+    def discover(self) -> List[Dict[str, Any]]:
+        """Consulta tshark -D y /sys/class/net sin caché"""
+        interfaces = []
+        if shutil.which('tshark'):
+            try:
+                process = subprocess.run(['tshark', '-D'], capture_output=True, text=True,
+                                         timeout=CaptureConfig.INTERFACE_DISCOVERY_TIMEOUT)
+                interfaces = parse_tshark_interfaces(process.stdout)
+            except (OSError, subprocess.TimeoutExpired) as e:
+                logging.warning(f"No se pudieron listar las interfaces con tshark: {e}")
+        source = 'tshark'
+        if not interfaces and os.path.isdir(SYS_CLASS_NET):
+            source = 'sysfs'
+            interfaces = [{'index': None, 'name': name, 'description': ''}
+                          for name in sorted(os.listdir(SYS_CLASS_NET))]
+
+        for iface in interfaces:
+            state = sysfs_interface(iface['name'])
+            iface['status'] = state['status'] if state else 'unknown'
+            iface['kind'] = classify(iface['name'], iface['description'],
+                                     wireless=bool(state and state['wireless']),
+                                     loopback=bool(state and state['loopback']))
+            iface['source'] = source
+        return interfaces
+
+    def list(self, refresh: bool = False) -> List[Dict[str, Any]]:
+        """Interfaces conocidas (de la caché si sigue vigente)"""
+        with self._lock:
+            if refresh or self._interfaces is None or time.monotonic() - self._loaded_at > self.ttl:
+                self._interfaces = self.discover()
+                self._loaded_at = time.monotonic()
+            return [dict(iface) for iface in self._interfaces]
+
+    def resolve(self, connection_type: Optional[str]) -> List[str]:
+        """
+        Interfaces en las que capturar para un connection_type:
+        'wifi' / 'ethernet' (activas de ese tipo), 'auto' (DEFAULT_INTERFACE o las
+        activas wifi y ethernet), 'all', o nombres concretos separados por comas.
+        Si no hay ninguna activa del tipo pedido, 'auto', 'wifi' y 'ethernet' usan
+        la primera activa que no sea loopback. Las pseudo-interfaces de tshark
+        (any, nflog, extcap...) solo se usan si se piden por nombre.
+        Como mucho MAX_INTERFACES. ValueError si no hay ninguna.
+        """
+        requested = (connection_type or 'auto').strip()
+        if requested.lower() == 'auto' and CaptureConfig.DEFAULT_INTERFACE.lower() != 'auto':
+            requested = CaptureConfig.DEFAULT_INTERFACE
+        interfaces = self.list()
+        kinds = KIND_ALIASES.get(requested.lower())
+
+        if kinds is None:
+            names = [name.strip() for name in requested.split(',') if name.strip()]
+            known = {iface['name'] for iface in interfaces}
+            by_description = {iface['description']: iface['name'] for iface in interfaces if iface['description']}
+            selected = []
+            for name in names:
+                if name in known or not interfaces:
+                    selected.append(name)
+                elif name in by_description:
+                    selected.append(by_description[name])
+                else:
+                    raise ValueError(f"Interfaz de red desconocida: {name}")
+        else:
+            # 'unknown' solo es utilizable sin /sys/class/net (p. ej. Windows); en Linux es
+            # una interfaz que tshark lista pero el kernel no
+            accepted = ('up', 'unknown') if not os.path.isdir(SYS_CLASS_NET) else ('up',)
+            usable = [iface for iface in interfaces
+                      if iface['status'] in accepted and iface['kind'] != 'pseudo']
+            selected = [iface['name'] for iface in usable if iface['kind'] in kinds]
+            if not selected and requested.lower() != 'all':
+                selected = [iface['name'] for iface in usable if iface['kind'] != 'loopback'][:1]
+                if selected and requested.lower() != 'auto':
+                    logging.warning(f"No hay interfaces activas de tipo '{requested}'; se captura en {selected[0]}")
+
+        if not selected:
+            raise ValueError(f"No hay interfaces de red activas para connection_type='{requested}'")
+        return list(dict.fromkeys(selected))[:CaptureConfig.MAX_INTERFACES]
+
+
+interface_inventory = InterfaceInventory()
@@ -0,0 +1,92 @@
+import os
+import logging
+import importlib.util
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional
+
+# Extensión de archivo por formato soportado
+FORMATS = {'parquet': '.parquet', 'feather': '.feather'}
+
+
+class IntermediateStore:
+    """
+    Persistencia opcional de DataFrames intermedios fuera del camino de la petición.
+
+    submit() solo calcula el nombre del archivo y encola la escritura en un hilo
+    propio; el archivo se escribe en formato columnar comprimido (Parquet o
+    Feather) y después se aplica la retención: se borran los archivos más
+    antiguos hasta quedar por debajo de max_files y max_bytes. Ambos formatos
+    necesitan pyarrow; si no está instalado la persistencia queda desactivada.
+    """
+
+    def __init__(self, directory: str, enabled: bool = False, fmt: str = 'parquet',
+                 compression: str = 'zstd', max_files: int = 50, max_bytes: int = 500 * 1024 * 1024):
+        if fmt not in FORMATS:
+            raise ValueError(f"Formato no soportado: {fmt} (usar {', '.join(FORMATS)})")
+        self.directory = directory
+        self.format = fmt
+        self.compression = compression
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        if enabled and importlib.util.find_spec('pyarrow') is None:
+            logging.warning(f"pyarrow no está instalado: se desactiva la persistencia {fmt} de intermedios")
+            self.enabled = False
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def submit(self, df: pd.DataFrame, prefix: str) -> Optional[str]:
+        """
+        Encola la escritura de df sin bloquear; el DataFrame no debe modificarse después.
+        Returns:
+            Ruta del archivo que se escribirá, o None si la persistencia está desactivada
+        """
+        if not self.enabled:
+            return None
+        if self._executor is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="intermediates")
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        path = os.path.join(self.directory, f"{prefix}_{timestamp}{FORMATS[self.format]}")
+        self._executor.submit(self._write, df, path)
+        return path
+
+    def _write(self, df: pd.DataFrame, path: str):
+        tmp_path = path + '.tmp'
+        try:
+            if self.format == 'parquet':
+                df.to_parquet(tmp_path, compression=self.compression, index=False)
+            else:
+                df.reset_index(drop=True).to_feather(tmp_path, compression=self.compression)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logging.error(f"Error guardando intermedio {path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._enforce_retention()
+
+    def _enforce_retention(self):
+        """Borra los archivos más antiguos que excedan el número o el tamaño máximo"""
+        extension = FORMATS[self.format]
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(extension):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        while files and (len(files) > self.max_files or total > self.max_bytes):
+            _, size, path = files.pop(0)
+            try:
+                os.remove(path)
+                total -= size
+            except OSError as e:
+                logging.warning(f"No se pudo borrar {path}: {e}")
+
+    def close(self, wait: bool = True):
+        """Espera a las escrituras pendientes (llamar al apagar la aplicación)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
@@ -0,0 +1,159 @@
+import time
+import uuid
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Any, Optional, Callable, Awaitable, List
+
+
+class JobQueueFull(Exception):
+    """La cola de análisis alcanzó su capacidad máxima"""
+    pass
+
+
+class AnalysisJob:
+    """Estado de un análisis encolado: etapa actual, progreso, tiempos y resultado"""
+
+    def __init__(self, params: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.params = params
+        self.status = 'queued'
+        self.stage = 'queued'
+        self.progress = 0
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.stage_timings: Dict[str, float] = {}
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self._stage_start: Optional[float] = None
+
+    def set_stage(self, stage: str, progress: int):
+        """Marca el inicio de una etapa y cierra el tiempo de la anterior"""
+        self._close_stage()
+        self.stage = stage
+        self.progress = progress
+        self._stage_start = time.perf_counter()
+
+    def _close_stage(self):
+        if self._stage_start is not None and self.stage not in ('queued', 'completed', 'failed'):
+            self.stage_timings[self.stage] = round(time.perf_counter() - self._stage_start, 4)
+        self._stage_start = None
+
+    def to_dict(self, include_result: bool = True) -> Dict[str, Any]:
+        data = {
+            'job_id': self.id,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': self.progress,
+            'params': self.params,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'stage_timings': self.stage_timings,
+            'error': self.error
+        }
+        if include_result:
+            data['result'] = self.result
+        return data
+
+
+class JobManager:
+    """
+    Cola de análisis en segundo plano.
+
+    POST /analyze encola un AnalysisJob y responde de inmediato con su id; un
+    número fijo de workers (concurrency) ejecuta el pipeline y la cola admite
+    como máximo max_queue trabajos pendientes. Los trabajos terminados se
+    conservan result_ttl segundos para que los clientes consulten el resultado,
+    y como mucho max_results: al superarlo se descartan los más antiguos. La
+    limpieza se hace al encolar, al consultar y al terminar cada trabajo.
+    """
+
+    def __init__(self, runner: Callable[[AnalysisJob], Awaitable[Dict[str, Any]]],
+                 concurrency: int = 2, max_queue: int = 20, result_ttl: int = 3600,
+                 max_results: int = 100):
+        self.runner = runner
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.result_ttl = result_ttl
+        self.max_results = max_results
+        self.jobs: Dict[str, AnalysisJob] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    async def start(self):
+        """Arranca los workers (llamar desde el evento startup)"""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, params: Dict[str, Any]) -> AnalysisJob:
+        """Encola un análisis; lanza JobQueueFull si no hay sitio"""
+        if self._queue is None:
+            raise RuntimeError("JobManager no iniciado")
+        self._purge_expired()
+        job = AnalysisJob(params)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFull(f"Cola de análisis llena ({self.max_queue} pendientes)")
+        self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        self._purge_expired()
+        return self.jobs.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        self._purge_expired()
+        counts: Dict[str, int] = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            'concurrency': self.concurrency,
+            'max_queue': self.max_queue,
+            'queued': self._queue.qsize() if self._queue else 0,
+            'jobs': counts
+        }
+
+    async def _worker(self, worker_id: int):
+        while True:
+            job = await self._queue.get()
+            job.status = 'running'
+            job.started_at = datetime.now()
+            try:
+                job.result = await self.runner(job)
+                job.status = 'completed'
+            except asyncio.CancelledError:
+                job.status = 'failed'
+                job.error = 'Cancelado'
+                raise
+            except Exception as e:
+                job.status = 'failed'
+                job.error = getattr(e, 'detail', None) or str(e)
+                logging.error(f"Análisis {job.id} falló en la etapa {job.stage}: {job.error}")
+            finally:
+                job._close_stage()
+                job.stage = job.status
+                if job.status == 'completed':
+                    job.progress = 100
+                job.finished_at = datetime.now()
+                self._queue.task_done()
+                self._purge_expired()
+
+    def _purge_expired(self):
+        """Elimina los trabajos terminados cuyo resultado caducó y los que exceden max_results"""
+        now = datetime.now()
+        finished = sorted((job for job in self.jobs.values() if job.finished_at), key=lambda job: job.finished_at)
+        excess = len(finished) - self.max_results
+        for position, job in enumerate(finished):
+            if position < excess or (now - job.finished_at).total_seconds() > self.result_ttl:
+                del self.jobs[job.id]
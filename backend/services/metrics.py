@@ -0,0 +1,206 @@
+import math
+import time
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Dict, Tuple, Sequence, Optional
+
+# Límites (segundos) de los histogramas de duración
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _format_labels(names: Sequence[str], values: Tuple, extra: str = '') -> str:
+    parts = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name}: etiquetas {sorted(labels)}, se esperaban {list(self.label_names)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self) -> str:
+        header = f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.kind}\n"
+        return header + ''.join(f"{line}\n" for line in self._samples())
+
+    def _samples(self):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Contador monótono (total de flujos, filas escritas...)"""
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    """Valor que sube y baja (tiempo de carga del modelo, conexiones en uso...)"""
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(_Metric):
+    """Histograma acumulativo con _bucket, _sum y _count como en Prometheus"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # Por combinación de etiquetas: (conteo por bucket no acumulado, suma, total)
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def totals(self) -> Dict[Tuple, Tuple[float, int]]:
+        """(suma, número de observaciones) por combinación de etiquetas"""
+        with self._lock:
+            return {key: (total, n) for key, (_, total, n) in self._values.items()}
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((key, ([*counts], total, n)) for key, (counts, total, n) in self._values.items())
+        for key, (counts, total, n) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.label_names, key)} {n}"
+
+
+class MetricsRegistry:
+    """Métricas del proceso, exportadas en el formato de texto de Prometheus"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return ''.join(metric.render() for metric in metrics)
+
+
+registry = MetricsRegistry()
+
+# Métricas del pipeline de análisis
+STAGE_SECONDS = registry.histogram(
+    'pipeline_stage_seconds', 'Duración de cada etapa del pipeline en segundos', ['stage']
+)
+STAGE_ERRORS = registry.counter(
+    'pipeline_stage_errors_total', 'Etapas del pipeline que terminaron con excepción', ['stage']
+)
+FLOWS_TOTAL = registry.counter('pipeline_flows_total', 'Flujos analizados')
+FLOWS_PER_SECOND = registry.gauge(
+    'pipeline_flows_per_second', 'Flujos por segundo del último análisis (extracción a respuesta)'
+)
+ROWS_WRITTEN = registry.counter('db_rows_written_total', 'Filas escritas en trafico_predic')
+MODEL_LOAD_SECONDS = registry.gauge('model_load_seconds', 'Duración de la última carga de modelos en segundos')
+MODEL_LOADS = registry.counter('model_loads_total', 'Cargas de modelos desde disco')
+PREDICTION_CACHE_LOOKUPS = registry.counter(
+    'prediction_cache_lookups_total', 'Consultas a la caché de predicciones por resultado', ['result']
+)
+PREDICTION_CACHE_EVICTIONS = registry.counter(
+    'prediction_cache_evictions_total', 'Entradas descartadas de la caché de predicciones por motivo', ['reason']
+)
+PREDICTION_CACHE_ENTRIES = registry.gauge('prediction_cache_entries', 'Entradas en la caché de predicciones')
+STREAM_SEGMENTS_DROPPED = registry.counter(
+    'stream_segments_dropped_total', 'Segmentos del ring buffer borrados por tshark antes de analizarlos'
+)
+DB_POOL_CONNECTIONS = registry.gauge(
+    'db_pool_connections', 'Conexiones de los pools de base de datos por estado', ['engine', 'state']
+)
+
+
+@contextmanager
+def span(stage: str, **fields):
+    """
+    Mide la duración de una etapa y la registra en pipeline_stage_seconds.
+    Además deja una línea de log DEBUG con la etapa, la duración y los campos extra.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            extra = ' '.join(f"{key}={value}" for key, value in fields.items())
+            logging.debug(f"span stage={stage} seconds={elapsed:.6f} {extra}".rstrip())
+
+
+def record_flows(flows: int, seconds: Optional[float] = None):
+    """Suma flujos analizados y actualiza el throughput si se conoce la duración"""
+    FLOWS_TOTAL.inc(flows)
+    if seconds:
+        FLOWS_PER_SECOND.set(flows / seconds)
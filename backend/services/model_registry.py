@@ -0,0 +1,183 @@
+import os
+import time
+import threading
+import logging
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
+
+from config import ModelConfig
+from services.imputation_service import ImputationService, MEDIANS_FILE
+from services.metrics import MODEL_LOAD_SECONDS, MODEL_LOADS
+from services import compact_model
+
+# Archivos de modelos que se cargan desde ml_models
+MODEL_FILES = {
+    "preprocessor": "preprocessor_model.joblib",
+    "pca": "pca_model.joblib",
+    "classifier": "traffic_classifier.joblib"
+}
+
+
+class ModelBundle:
+    """Modelos ML cargados, compartidos en solo lectura entre peticiones"""
+
+    def __init__(self, scaler, pca, model, models_dir: str, mmap_mode: Optional[str], load_seconds: float,
+                 medians: Optional[Dict[str, float]] = None, linear: Optional[Tuple[Any, Any]] = None,
+                 model_format: str = 'joblib'):
+        self.scaler = scaler
+        self.pca = pca
+        self.model = model
+        # Exportación compacta: (W, b) ya plegados en lugar de escalador y PCA
+        self.linear = linear
+        self.format = model_format
+        # Medianas de entrenamiento para la imputación (opcional)
+        self.medians = medians
+        self.models_dir = models_dir
+        self.mmap_mode = mmap_mode
+        self.load_seconds = load_seconds
+        self.loaded_at = datetime.now()
+        # InferenceEngine precompilado; lo crea PredictionService en el primer uso
+        self.engine = None
+
+    def close(self):
+        """Libera los recursos del engine (pool de inferencia) al reemplazar el bundle"""
+        sharded = getattr(self.engine, 'sharded', None)
+        if sharded is not None:
+            sharded.close()
+
+    def info(self) -> Dict[str, Any]:
+        """Información resumida del conjunto de modelos cargado"""
+        return {
+            'models_dir': self.models_dir,
+            'format': self.format,
+            'mmap_mode': self.mmap_mode,
+            'loaded_at': self.loaded_at.isoformat(),
+            'load_seconds': round(self.load_seconds, 4),
+            'files': list(MODEL_FILES.values()) if self.format == 'joblib' else sorted(os.listdir(os.path.join(self.models_dir, compact_model.COMPACT_DIR))),
+            'training_medians': self.medians is not None
+        }
+
+
+class ModelRegistry:
+    """
+    Registro de modelos a nivel de proceso.
+    Los artefactos se cargan una sola vez (al arrancar o en el primer uso) y
+    todas las instancias de PredictionService comparten el mismo ModelBundle.
+    """
+    _bundle: Optional[ModelBundle] = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls) -> ModelBundle:
+        """Obtiene los modelos cargados, cargándolos en el primer uso"""
+        bundle = cls._bundle
+        if bundle is None:
+            with cls._lock:
+                if cls._bundle is None:
+                    cls._bundle = cls._load_bundle(ModelConfig.MODELS_DIR, ModelConfig.MMAP_MODE)
+                bundle = cls._bundle
+        return bundle
+
+    @classmethod
+    def load(cls, models_dir: Optional[str] = None, mmap_mode: Optional[str] = None) -> ModelBundle:
+        """
+        Carga (o recarga) los modelos y reemplaza el conjunto activo.
+        Las peticiones en curso siguen usando el conjunto anterior hasta terminar.
+        """
+        models_dir = models_dir or ModelConfig.MODELS_DIR
+        mmap_mode = mmap_mode if mmap_mode is not None else ModelConfig.MMAP_MODE
+        bundle = cls._load_bundle(models_dir, mmap_mode)
+        with cls._lock:
+            previous, cls._bundle = cls._bundle, bundle
+        if previous is not None:
+            previous.close()
+        return bundle
+
+    @classmethod
+    def reload(cls) -> ModelBundle:
+        """Recarga los modelos desde disco con la configuración actual"""
+        return cls.load()
+
+    @classmethod
+    def shutdown(cls):
+        """Cierra los recursos del conjunto activo al apagar la aplicación"""
+        bundle = cls._bundle
+        if bundle is not None:
+            bundle.close()
+
+    @classmethod
+    def is_loaded(cls) -> bool:
+        return cls._bundle is not None
+
+    @classmethod
+    def _load_bundle(cls, models_dir: str, mmap_mode: Optional[str]) -> ModelBundle:
+        """
+        Carga la exportación compacta (models_dir/compact) o los joblib según
+        MODEL_FORMAT. Con 'auto' se usa la compacta si existe y no está desfasada
+        respecto a los joblib; si no, los joblib.
+        """
+        model_format = ModelConfig.MODEL_FORMAT
+        compact_dir = os.path.join(models_dir, compact_model.COMPACT_DIR)
+        if model_format == 'compact':
+            return cls.read_compact(models_dir, mmap_mode)
+        if model_format == 'auto':
+            meta = compact_model.read_meta(compact_dir)
+            if meta is not None:
+                if not compact_model.is_stale(meta, models_dir):
+                    return cls.read_compact(models_dir, mmap_mode)
+                logging.warning(f"La exportación compacta de {compact_dir} es anterior a los joblib; "
+                                f"se cargan los joblib (volver a exportar con python -m services.compact_model)")
+        return cls.read_joblib(models_dir, mmap_mode)
+
+    @staticmethod
+    def read_compact(models_dir: str, mmap_mode: Optional[str]) -> ModelBundle:
+        """Lee la exportación compacta (arrays .npy) sin importar scikit-learn ni joblib"""
+        try:
+            start = time.perf_counter()
+            linear, forest, _ = compact_model.load(os.path.join(models_dir, compact_model.COMPACT_DIR), mmap_mode)
+            medians = ImputationService.load_medians(os.path.join(models_dir, MEDIANS_FILE))
+            load_seconds = time.perf_counter() - start
+            MODEL_LOAD_SECONDS.set(load_seconds)
+            MODEL_LOADS.inc()
+
+            logging.info(f"Modelos compactos cargados en {load_seconds:.3f}s (mmap_mode={mmap_mode})")
+            return ModelBundle(None, None, forest, models_dir, mmap_mode, load_seconds, medians,
+                               linear=linear, model_format='compact')
+
+        except Exception as e:
+            error_msg = f"Error cargando modelos compactos: {str(e)}"
+            logging.exception(error_msg)
+            raise RuntimeError(error_msg)
+
+    @staticmethod
+    def read_joblib(models_dir: str, mmap_mode: Optional[str]) -> ModelBundle:
+        """Lee los tres artefactos joblib desde models_dir (sin reemplazar el conjunto activo)"""
+        try:
+            import joblib
+
+            if not os.path.exists(models_dir):
+                raise FileNotFoundError(f"Directorio de modelos no encontrado: {models_dir}")
+
+            paths = {}
+            for model_name, filename in MODEL_FILES.items():
+                file_path = os.path.join(models_dir, filename)
+                if not os.path.exists(file_path):
+                    raise FileNotFoundError(f"Archivo de modelo no encontrado: {file_path}")
+                paths[model_name] = file_path
+
+            start = time.perf_counter()
+            scaler = joblib.load(paths["preprocessor"], mmap_mode=mmap_mode)
+            pca = joblib.load(paths["pca"], mmap_mode=mmap_mode)
+            model = joblib.load(paths["classifier"], mmap_mode=mmap_mode)
+            medians = ImputationService.load_medians(os.path.join(models_dir, MEDIANS_FILE))
+            load_seconds = time.perf_counter() - start
+            MODEL_LOAD_SECONDS.set(load_seconds)
+            MODEL_LOADS.inc()
+
+            logging.info(f"Modelos cargados exitosamente en {load_seconds:.3f}s (mmap_mode={mmap_mode})")
+            return ModelBundle(scaler, pca, model, models_dir, mmap_mode, load_seconds, medians)
+
+        except Exception as e:
+            error_msg = f"Error cargando modelos ML: {str(e)}"
+            logging.exception(error_msg)
+            raise RuntimeError(error_msg)
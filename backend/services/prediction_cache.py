@@ -0,0 +1,163 @@
+import time
+import threading
+import numpy as np
+from typing import Dict, Any, List, Optional, Tuple
+
+from services.metrics import PREDICTION_CACHE_LOOKUPS, PREDICTION_CACHE_EVICTIONS, PREDICTION_CACHE_ENTRIES
+
+
+class PredictionCache:
+    """
+    Caché con TTL y reemplazo LRU aproximado (CLOCK) de las probabilidades del
+    clasificador por flujo.
+
+    La clave es una huella de 64 bits del vector de entrada del modelo tras
+    cuantizarlo: de cada característica (float64) se conservan el signo, el
+    exponente y los mantissa_bits bits altos de la mantisa, así que flujos que
+    solo difieren en ruido de medida por debajo de esa precisión relativa
+    comparten entrada. La huella es un hash multiplicativo con multiplicadores
+    aleatorios del proceso y se calcula para todo el lote con una sola matmul.
+
+    Memoria acotada y fija: probabilidades, caducidad y bit de uso viven en
+    arrays de max_entries filas reservados al primer uso, y el índice solo
+    guarda huella -> fila. Un acierto no reordena nada (solo marca el bit de
+    uso), así que la consulta de un lote es casi toda vectorizada.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, mantissa_bits: int = 12, seed: Optional[int] = None):
+        if not 0 <= mantissa_bits <= 52:
+            raise ValueError("mantissa_bits debe estar entre 0 y 52")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.mantissa_bits = mantissa_bits
+        self._shift = np.uint64(52 - mantissa_bits)
+        self._rng = np.random.default_rng(seed)
+        self._multipliers: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self._index: Dict[int, int] = {}
+        self._probabilities: Optional[np.ndarray] = None
+        self._slot_keys = np.zeros(max_entries, dtype=np.uint64)
+        self._expires = np.zeros(max_entries, dtype=np.float64)
+        self._referenced = np.zeros(max_entries, dtype=bool)
+        self._free: List[int] = list(range(max_entries - 1, -1, -1))
+        self._hand = 0
+        self.hits = 0
+        self.misses = 0
+
+    def keys(self, X: np.ndarray) -> np.ndarray:
+        """Huella (uint64) de cada fila de X (filas x características)"""
+        # +0.0 copia la matriz y además iguala -0.0 y 0.0
+        bits = np.add(np.asarray(X, dtype=np.float64), 0.0).view(np.uint64)
+        np.right_shift(bits, self._shift, out=bits)
+        if self._multipliers is None or len(self._multipliers) != bits.shape[1]:
+            # Multiplicadores impares: la multiplicación módulo 2^64 es biyectiva
+            self._multipliers = self._rng.integers(0, 2 ** 63, size=bits.shape[1], dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+            self.clear()
+        return bits @ self._multipliers
+
+    def get_many(self, keys: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        Busca las claves en la caché.
+        Returns:
+            (posiciones de keys encontradas, sus filas de probabilidades)
+        """
+        now = time.monotonic()
+        with self._lock:
+            index = self._index
+            slots = np.fromiter((index.get(key, -1) for key in keys.tolist()), dtype=np.intp, count=len(keys))
+            found = slots >= 0
+            expired = found & (self._expires[np.maximum(slots, 0)] < now)
+            # Una huella puede repetirse en el lote: cada fila caducada se libera una vez
+            expired_slots = np.unique(slots[expired]).tolist()
+            for slot in expired_slots:
+                self._release(slot)
+            found &= ~expired
+            rows = np.flatnonzero(found)
+            hit_slots = slots[rows]
+            self._referenced[hit_slots] = True
+            probabilities = self._probabilities[hit_slots] if len(rows) else None
+            size = len(index)
+            hits = len(rows)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        PREDICTION_CACHE_LOOKUPS.inc(hits, result='hit')
+        PREDICTION_CACHE_LOOKUPS.inc(len(keys) - hits, result='miss')
+        if expired_slots:
+            PREDICTION_CACHE_EVICTIONS.inc(len(expired_slots), reason='ttl')
+        PREDICTION_CACHE_ENTRIES.set(size)
+        return rows, probabilities
+
+    def put_many(self, keys: np.ndarray, probabilities: np.ndarray):
+        """
+        Guarda una fila de probabilidades por clave (claves sin repetir); si está
+        llena reemplaza las no usadas recientemente
+        """
+        if self.max_entries <= 0 or not len(keys):
+            return
+        keys, probabilities = keys[-self.max_entries:], probabilities[-self.max_entries:]
+        expires = time.monotonic() + self.ttl
+        evicted = 0
+        slots = []
+        with self._lock:
+            if self._probabilities is None or self._probabilities.shape[1] != probabilities.shape[1]:
+                self._probabilities = np.empty((self.max_entries, probabilities.shape[1]), dtype=np.float64)
+                self._reset()
+            index = self._index
+            free = self._free
+            for key in keys.tolist():
+                slot = index.get(key)
+                if slot is None:
+                    if not free:
+                        self._release(self._clock_victim())
+                        evicted += 1
+                    slot = index[key] = free.pop()
+                slots.append(slot)
+            self._slot_keys[slots] = keys
+            self._probabilities[slots] = probabilities
+            self._expires[slots] = expires
+            # Las entradas nuevas no se marcan: solo sobreviven a la aguja si se vuelven a consultar
+            self._referenced[slots] = False
+            size = len(index)
+        if evicted:
+            PREDICTION_CACHE_EVICTIONS.inc(evicted, reason='size')
+        PREDICTION_CACHE_ENTRIES.set(size)
+
+    def _clock_victim(self) -> int:
+        """Avanza la aguja quitando el bit de uso hasta dar con una fila no usada desde la última vuelta"""
+        referenced = self._referenced
+        while referenced[self._hand]:
+            referenced[self._hand] = False
+            self._hand = (self._hand + 1) % self.max_entries
+        victim = self._hand
+        self._hand = (self._hand + 1) % self.max_entries
+        return victim
+
+    def _release(self, slot: int):
+        del self._index[int(self._slot_keys[slot])]
+        self._referenced[slot] = False
+        self._free.append(slot)
+
+    def _reset(self):
+        self._index.clear()
+        self._referenced[:] = False
+        self._free = list(range(self.max_entries - 1, -1, -1))
+        self._hand = 0
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+        PREDICTION_CACHE_ENTRIES.set(0)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, hits, misses = len(self._index), self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'mantissa_bits': self.mantissa_bits,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / lookups, 4) if lookups else None
+        }
@@ -1,15 +1,21 @@
 import warnings
 warnings.filterwarnings('ignore')
 import pandas as pd
-import joblib
 import os
 import sys
-import sklearn
 import numpy as np
 import logging
+import threading
 from typing import List, Dict, Optional, Any
 from datetime import datetime
 
+from services.model_registry import ModelRegistry, ModelBundle
+from services.inference_engine import InferenceEngine
+from services.prediction_cache import PredictionCache
+from services.sharded_inference import ShardedInference
+from config import ModelConfig
+from logging_config import PredictionSummary
+
 # Versiones de bibliotecas ocultadas para output limpio
 
 # Columnas a eliminar
@@ -44,176 +50,148 @@ COLUMNAS = [
 # Variables categóricas que se añadirán después del PCA
 COLUMNAS_CATEGORICAS = ['FIN Flag Count', 'PSH Flag Count']
 
+# Etiquetas para las predicciones - SOLO las especificadas por el usuario
+ETIQUETAS = {
+    0: 'BENIGN',
+    2: 'Brute Force',
+    3: 'DDoS',
+    4: 'DoS',
+    7: 'Port Scan',
+    9: 'Unknown'
+}
+
+# Resumen agregado de las predicciones de todas las instancias (en lugar de una línea por lote)
+prediction_summary = PredictionSummary()
+_ENGINE_LOCK = threading.Lock()
+
 
 class PredictionService:
-    def __init__(self):
-        """Inicializa el servicio de predicción"""
+    def __init__(self, bundle: Optional[ModelBundle] = None):
+        """
+        Inicializa el servicio de predicción
+        Args:
+            bundle: Modelos ya cargados; por defecto se usan los del ModelRegistry del proceso
+        """
         # Configurar rutas
         self.base_dir = os.path.dirname(os.path.dirname(__file__))
         self.models_dir = os.path.join(self.base_dir, "ml_models")
-        self.log_dir = os.path.join(self.base_dir, "logs")
-        
-        # Configurar logging
-        self._setup_logging()
         
-        try:
-            # Verificar directorio de modelos
-            if not os.path.exists(self.models_dir):
-                raise FileNotFoundError(f"Directorio de modelos no encontrado: {self.models_dir}")
-            
-            # Definir archivos de modelos
-            model_files = {
-                "preprocessor": "preprocessor_model.joblib",
-                "pca": "pca_model.joblib",
-                "classifier": "traffic_classifier.joblib"
-            }
-            
-            # Verificar existencia de archivos
-            for model_name, filename in model_files.items():
-                file_path = os.path.join(self.models_dir, filename)
-                if not os.path.exists(file_path):
-                    raise FileNotFoundError(f"Archivo de modelo no encontrado: {file_path}")
-                logging.info(f"Modelo encontrado: {filename}")
-            
-            # Cargar modelos
-            self.scaler = joblib.load(os.path.join(self.models_dir, model_files["preprocessor"]))
-            self.pca = joblib.load(os.path.join(self.models_dir, model_files["pca"]))
-            self.model = joblib.load(os.path.join(self.models_dir, model_files["classifier"]))
-            logging.info("Modelos cargados exitosamente")
-            
-        except Exception as e:
-            error_msg = f"Error cargando modelos ML: {str(e)}"
-            logging.exception(error_msg)
-            raise RuntimeError(error_msg)
+        # Modelos compartidos (se cargan una sola vez por proceso)
+        self.bundle = bundle or ModelRegistry.get()
+        self.scaler = self.bundle.scaler
+        self.pca = self.bundle.pca
+        self.model = self.bundle.model
         
         # Columnas binarias que se manejan por separado
         self.binary_features = ['FIN Flag Count', 'PSH Flag Count']
         
         # Etiquetas para las predicciones - SOLO las especificadas por el usuario
-        self.ETIQUETAS = {
-            0: 'BENIGN',
-            2: 'Brute Force',
-            3: 'DDoS',
-            4: 'DoS',
-            7: 'Port Scan',
-            9: 'Unknown'
-        }
+        self.ETIQUETAS = ETIQUETAS
+        
+        # Pipeline de inferencia precompilado (uno por conjunto de modelos)
+        self.engine = self._get_engine(self.bundle)
 
-    def _setup_logging(self):
-        """Configurar el sistema de logging"""
-        log_file = os.path.join(self.log_dir, 'prediction.log')
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s [%(levelname)s] %(message)s',
-            handlers=[
-                logging.FileHandler(log_file),
-                logging.StreamHandler()
-            ]
-        )
+    @staticmethod
+    def _get_engine(bundle: ModelBundle) -> InferenceEngine:
+        """Obtiene el InferenceEngine del bundle, compilándolo la primera vez"""
+        with _ENGINE_LOCK:
+            if bundle.engine is None:
+                cache = PredictionCache(
+                    ModelConfig.PREDICTION_CACHE_SIZE, ModelConfig.PREDICTION_CACHE_TTL,
+                    ModelConfig.PREDICTION_CACHE_MANTISSA_BITS
+                ) if ModelConfig.PREDICTION_CACHE_SIZE > 0 else None
+                # Los workers cargan los mismos artefactos que este bundle
+                sharded = ShardedInference(
+                    bundle.models_dir, bundle.mmap_mode, ModelConfig.INFERENCE_WORKERS,
+                    ModelConfig.INFERENCE_SHARD_MIN_ROWS, ModelConfig.INFERENCE_SHARD_ROWS,
+                    ModelConfig.INFERENCE_MP_CONTEXT
+                ) if ModelConfig.INFERENCE_WORKERS > 1 else None
+                bundle.engine = InferenceEngine(
+                    bundle.scaler, bundle.pca, bundle.model,
+                    COLUMNAS, COLUMNAS_CATEGORICAS, ETIQUETAS, cache=cache, sharded=sharded,
+                    linear=bundle.linear
+                )
+            return bundle.engine
 
     def prepare_features(self, df: pd.DataFrame) -> Dict[str, Any]:
         """
-        Prepara el DataFrame para la predicción
+        Prepara la matriz de características para la predicción
         Args:
             df: DataFrame con las características
         Returns:
             Diccionario con el resultado:
             {
                 'success': bool,
-                'dataframe': DataFrame procesado o None,
+                'matrix': ndarray (filas x columnas del modelo) o None,
+                'columns': List con el orden de columnas de la matriz,
                 'error': str o None,
                 'details': Dict con información adicional
             }
         """
+        projector = self.engine.projector
         result = {
             'success': False,
-            'dataframe': None,
+            'matrix': None,
+            'columns': projector.columns,
             'error': None,
             'details': {'steps': []}
         }
         
         try:
-            logging.info("Preparando características...")
-            result['details']['steps'].append({
-                'step': 'initial',
-                'columns': df.columns.tolist()
-            })
+            logging.debug("Preparando características...")
             
             # Verificar columnas binarias
-            missing_binary = []
-            binary_data = {}
-            for col in self.binary_features:
-                if col in df.columns:
-                    binary_data[col] = df[col].copy()
-                    logging.info(f"Columna binaria {col} encontrada con valores:\n{df[col].value_counts()}")
-                else:
-                    missing_binary.append(col)
-            
+            missing_binary = [col for col in self.binary_features if col not in df.columns]
             if missing_binary:
                 error_msg = f"Columnas binarias faltantes: {missing_binary}"
                 logging.error(error_msg)
                 result['error'] = error_msg
                 return result
             
-            # Crear DataFrame final
-            final_df = pd.DataFrame(index=df.index)
-            
-            # Procesar columnas no binarias
-            non_binary_columns = [c for c in df.columns if c not in self.binary_features]
-            for col in non_binary_columns:
-                if col in df.columns:
-                    final_df[col] = df[col].values
-                else:
-                    logging.warning(f"Columna faltante agregada con ceros: {col}")
-                    final_df[col] = 0
-            
-            # Agregar columnas binarias
-            for col in self.binary_features:
-                final_df[col] = binary_data[col]
-
-            # Asegurar que todas las columnas numéricas y categóricas estén presentes
-            expected_cols = COLUMNAS + COLUMNAS_CATEGORICAS
-            missing_cols = [col for col in expected_cols if col not in final_df.columns]
-            if missing_cols:
-                logging.warning(f"Agregando columnas faltantes con ceros: {missing_cols}")
-                for col in missing_cols:
-                    final_df[col] = 0
-
-            # Ordenar columnas según el modelo espera
-            final_df = final_df[expected_cols]
-
+            # Proyección directa al orden del modelo (faltantes a cero)
+            _, _, missing_cols = projector.compile([str(c) for c in df.columns])
+            result['matrix'] = projector.project(df)
             result['success'] = True
-            result['dataframe'] = final_df
             result['details']['steps'].append({
-                'step': 'final',
-                'columns': final_df.columns.tolist()
+                'step': 'project',
+                'rows': int(result['matrix'].shape[0]),
+                'missing_columns': missing_cols
             })
-
-            logging.info("Características preparadas exitosamente")
+            
+            logging.debug("Características preparadas exitosamente")
             return result
-
+            
         except Exception as e:
             error_msg = f"Error preparando características: {str(e)}"
             logging.exception(error_msg)
             result['error'] = error_msg
             return result
 
-    def predict(self, features_df: pd.DataFrame) -> Dict[str, Any]:
+    def predict(self, features_df: pd.DataFrame, include_records: bool = False) -> Dict[str, Any]:
         """
         Realiza predicciones sobre las características procesadas
         Args:
             features_df: DataFrame con las características
+            include_records: Si es True también se construye la lista de diccionarios por fila
         Returns:
             Diccionario con el resultado:
             {
                 'success': bool,
-                'predictions': List de predicciones o None,
+                'labels': ndarray con la etiqueta de cada fila o None,
+                'confidences': ndarray con la confianza de cada fila o None,
+                'probabilities': ndarray (filas x clases) o None,
+                'class_names': List de nombres de las columnas de probabilidades,
+                'predictions': List de predicciones por fila (solo con include_records) o None,
                 'error': str o None,
                 'details': Dict con información adicional
             }
         """
         result = {
             'success': False,
+            'labels': None,
+            'confidences': None,
+            'probabilities': None,
+            'class_names': list(self.engine.class_labels),
             'predictions': None,
             'error': None,
             'details': {'steps': []}
@@ -225,60 +203,27 @@ class PredictionService:
             if not prep_result['success']:
                 return {**result, 'error': prep_result['error']}
             
-            df = prep_result['dataframe']
-            
-            # Preparar datos para PCA
-            X = df.drop(columns=['Label'] if 'Label' in df.columns else []).copy()
-            logging.info("Aplicando escalado...")
-            X_scaled = self.scaler.transform(X)
-            
-            # Extraer solo las columnas numéricas del resultado escalado para PCA
-            logging.info("Extrayendo columnas numéricas para PCA...")
-            X_numeric_scaled = X_scaled[:, :-2]  # Todas excepto las últimas 2 (categóricas)
-            
-            # Aplicar PCA solo a las columnas numéricas
-            logging.info("Aplicando PCA...")
-            X_pca = self.pca.transform(X_numeric_scaled)
+            X = prep_result['matrix']
             
-            # Extraer las columnas categóricas del resultado escalado
-            logging.info("Extrayendo columnas categóricas escaladas...")
-            X_categorical_scaled = X_scaled[:, -2:]  # Las últimas 2 columnas (categóricas)
-            
-            # Concatenar PCA con características binarias escaladas
-            logging.info("Concatenando características...")
-            X_final = np.hstack((X_pca, X_categorical_scaled))
-            
-            # Realizar predicciones
-            logging.info("Realizando predicciones...")
-            predictions = self.model.predict(X_final)
-            probabilities = self.model.predict_proba(X_final)
-            
-            # Preparar resultados
-            results = []
-            for pred, probs in zip(predictions, probabilities):
-                # Manejo robusto de etiquetas desconocidas
-                label = self.ETIQUETAS.get(pred, f'Unknown_Class_{pred}')
-                confidence = float(np.max(probs))
-                
-                # Crear diccionario de probabilidades solo para clases conocidas
-                prob_dict = {}
-                for i, prob in enumerate(probs):
-                    if i in self.ETIQUETAS:
-                        prob_dict[self.ETIQUETAS[i]] = float(prob)
-                
-                results.append({
-                    'label': label,
-                    'confidence': confidence,
-                    'probabilities': prob_dict
-                })
-                logging.info(f"Predicción: {label} (confianza: {confidence:.2%})")
+            # Escalado + PCA fusionados y una sola llamada a predict_proba
+            logging.debug(f"Realizando predicciones sobre {len(X)} flujos...")
+            output = self.engine.run(X)
             
             result['success'] = True
-            result['predictions'] = results
+            result['labels'] = output['labels']
+            result['confidences'] = output['confidences']
+            result['probabilities'] = output['probabilities']
+            if include_records:
+                result['predictions'] = self.engine.to_records(output)
+            
+            unique_labels, counts = np.unique(output['labels'].astype(str), return_counts=True)
+            label_counts = dict(zip(unique_labels.tolist(), counts.tolist()))
+            prediction_summary.add(label_counts)
             result['details']['steps'].append({
                 'step': 'prediction',
-                'total_predictions': len(results),
-                'unique_labels': list(set(r['label'] for r in results))
+                'total_predictions': len(X),
+                'unique_labels': list(label_counts),
+                'fused_linear_stage': self.engine.fused
             })
             
             return result
@@ -287,4 +232,4 @@ class PredictionService:
             error_msg = f"Error realizando predicciones: {str(e)}"
             logging.exception(error_msg)
             result['error'] = error_msg
-            return result
\ No newline at end of file
+            return result
@@ -1,27 +1,35 @@
 import os
 import sys
-import time
 import logging
 import pandas as pd
 import numpy as np
-from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Iterator
 from glob import glob
 
+from config import PipelineConfig
+from services.intermediate_store import IntermediateStore
+from services.flow_csv_reader import FlowCsvReader, wait_for_file
+from services.metrics import span
+
 # Carpeta donde buscar el .csv si no se pasa argumento
 CREADOS = os.path.join(os.path.dirname(os.path.dirname(__file__)),  "..",'creados')
 
 class ProcessingService:
+    # Persistencia opcional de los DataFrames procesados, compartida por todas las instancias
+    store = IntermediateStore(
+        PipelineConfig.PERSIST_DIR,
+        enabled=PipelineConfig.PERSIST_INTERMEDIATES,
+        fmt=PipelineConfig.PERSIST_FORMAT,
+        compression=PipelineConfig.PERSIST_COMPRESSION,
+        max_files=PipelineConfig.PERSIST_MAX_FILES,
+        max_bytes=PipelineConfig.PERSIST_MAX_MB * 1024 * 1024
+    )
+
     def __init__(self):
         """Inicializa el servicio de procesamiento"""
         # Configurar rutas
         self.base_dir = os.path.dirname(os.path.dirname(__file__))
-        self.processed_dir = os.path.join(self.base_dir, "..","processed")
-        
-        # Crear directorio para archivos procesados
-        if not os.path.exists(self.processed_dir):
-            os.makedirs(self.processed_dir)
-            print(f"Directorio creado: {self.processed_dir}")
+        self.processed_dir = self.store.directory
         
         # Mapeo para renombrar columnas (solo las 79 necesarias)
         self.rename_map = {
@@ -104,15 +112,7 @@ class ProcessingService:
             'Idle Min': 'Idle Min',
             'Label': 'Label'
         }
-
-    def _setup_logging(self):
-        """Configurar el sistema de logging"""
-        log_file = os.path.join(self.base_dir, 'processing.log')
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s [%(levelname)s] %(message)s',
-            handlers=[logging.FileHandler(log_file), logging.StreamHandler()]
-        )
+        self.reader = FlowCsvReader(self.rename_map, engine=PipelineConfig.CSV_ENGINE)
 
     def find_latest_csv(self):
         files = glob(os.path.join(CREADOS, '*_Flow.csv'))
@@ -145,31 +145,19 @@ class ProcessingService:
         }
 
         try:
-            # Verificar existencia del archivo
-            if not os.path.exists(csv_path):
-                error_msg = f"Archivo CSV no encontrado: {csv_path}"
-                print(error_msg)
+            # Esperar a que el flowmeter termine de escribir el CSV (tamaño estable y legible)
+            if not wait_for_file(csv_path, timeout=PipelineConfig.CSV_WAIT_TIMEOUT):
+                error_msg = f"Archivo CSV no encontrado o incompleto: {csv_path}"
+                logging.error(error_msg)
                 result['error'] = error_msg
                 return result
 
-            # Leer el CSV con reintentos para manejar problemas de permisos
-            df = None
-            max_retries = 5
-            for attempt in range(max_retries):
-                try:
-                    df = pd.read_csv(csv_path)
-                    break
-                except PermissionError:
-                    if attempt < max_retries - 1:
-                        print(f"Reintentando lectura del CSV (intento {attempt + 1}/{max_retries})...")
-                        time.sleep(2)  # Esperar 2 segundos antes del siguiente intento
-                    else:
-                        raise Exception(f"No se pudo leer el archivo CSV después de {max_retries} intentos")
-                except Exception as e:
-                    raise Exception(f"Error leyendo CSV: {str(e)}")
-                    
-            if df is None:
-                raise Exception("No se pudo cargar el DataFrame")
+            # Lectura tipada: solo las columnas del modelo, float32 y sin inferencia de tipos
+            try:
+                with span('csv_read'):
+                    df = self.reader.read(csv_path)
+            except Exception as e:
+                raise Exception(f"Error leyendo CSV: {str(e)}")
                 
             # Silencioso: columnas originales del CSV
             result['details']['steps'].append({
@@ -178,50 +166,85 @@ class ProcessingService:
                 'rows': len(df)
             })
 
-            # Limpiar nombres de columnas
-            clean_cols = []
-            for col in df.columns:
-                clean_col = ''.join(c for c in col if c.isprintable()).strip()
-                clean_cols.append(clean_col)
-            df.columns = clean_cols
-            result['details']['steps'].append({
-                'step': 'clean_columns',
-                'columns': clean_cols
-            })
+        except Exception as e:
+            error_msg = f"Error procesando CSV: {str(e)}"
+            logging.error(error_msg)
+            result['error'] = error_msg
+            return result
 
-            # Renombrar columnas según el mapeo
-            df = df.rename(columns=self.rename_map)
-            result['details']['steps'].append({
-                'step': 'rename_columns',
-                'columns': df.columns.tolist()
-            })
+        return self.process_dataframe(df, result)
 
-            # Seleccionar solo las 79 columnas necesarias
-            required_columns = list(self.rename_map.values())  # Usar los nombres renombrados
-            df = df[required_columns]  # Filtrar el DataFrame para solo tener esas columnas
+    def iter_csv(self, csv_path: str, chunksize: int = None) -> Iterator[Dict[str, Any]]:
+        """
+        Procesa un CSV grande por bloques con memoria acotada
+        Returns:
+            Iterador de resultados con el formato de process_csv, uno por bloque
+        """
+        if not wait_for_file(csv_path, timeout=PipelineConfig.CSV_WAIT_TIMEOUT):
+            raise FileNotFoundError(f"Archivo CSV no encontrado o incompleto: {csv_path}")
+        for chunk in self.reader.iter_chunks(csv_path, chunksize or PipelineConfig.CSV_CHUNK_ROWS):
+            yield self.process_dataframe(chunk)
 
-            # Agregar la columna faltante 'Fwd Header Length.1' y asignar cero
-            if 'Fwd Header Length.1' not in df.columns:
-                df['Fwd Header Length.1'] = 0
+    def process_dataframe(self, df: pd.DataFrame, result: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Prepara para predicción un DataFrame de flujos con los nombres de columna de
+        CICFlowMeter (el CSV leído por process_csv o la salida de FlowExtractor)
+        Returns:
+            Diccionario con el mismo formato que process_csv
+        """
+        if result is None:
+            result = {
+                'success': False,
+                'dataframe': None,
+                'error': None,
+                'processed_path': None,
+                'details': {'steps': []}
+            }
+
+        try:
+            with span('column_cleaning'):
+                # Limpiar nombres de columnas
+                clean_cols = []
+                for col in df.columns:
+                    clean_col = ''.join(c for c in col if c.isprintable()).strip()
+                    clean_cols.append(clean_col)
+                df.columns = clean_cols
                 result['details']['steps'].append({
-                    'step': 'add_Fwd_Header_Length_1',
-                    'added_column': 'Fwd Header Length.1'
+                    'step': 'clean_columns',
+                    'columns': clean_cols
                 })
 
-            # Verificar que las columnas faltantes estén presentes
-            missing_columns = ['FIN Flag Count', 'PSH Flag Count']
-            for col in missing_columns:
-                if col not in df.columns:
-                    df[col] = 0  # Asignar cero si falta la columna
+                # Renombrar columnas según el mapeo
+                df = df.rename(columns=self.rename_map)
+                result['details']['steps'].append({
+                    'step': 'rename_columns',
+                    'columns': df.columns.tolist()
+                })
+
+                # Seleccionar solo las 79 columnas necesarias
+                required_columns = list(self.rename_map.values())  # Usar los nombres renombrados
+                df = df[required_columns]  # Filtrar el DataFrame para solo tener esas columnas
+
+                # Agregar la columna faltante 'Fwd Header Length.1' y asignar cero
+                if 'Fwd Header Length.1' not in df.columns:
+                    df['Fwd Header Length.1'] = 0
                     result['details']['steps'].append({
-                        'step': f'add_{col}',
-                        'added_column': col
+                        'step': 'add_Fwd_Header_Length_1',
+                        'added_column': 'Fwd Header Length.1'
                     })
 
-            # Guardar DataFrame procesado
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            processed_path = os.path.join(self.processed_dir, f"processed_{timestamp}.csv")
-            df.to_csv(processed_path, index=False)
+                # Verificar que las columnas faltantes estén presentes
+                missing_columns = ['FIN Flag Count', 'PSH Flag Count']
+                for col in missing_columns:
+                    if col not in df.columns:
+                        df[col] = 0  # Asignar cero si falta la columna
+                        result['details']['steps'].append({
+                            'step': f'add_{col}',
+                            'added_column': col
+                        })
+
+            # Guardar DataFrame procesado solo si está activada la persistencia (en segundo plano)
+            processed_path = self.store.submit(df, prefix='processed')
 
             # Silencioso: número de columnas del DataFrame final
 
@@ -237,14 +260,13 @@ class ProcessingService:
                 'memory_usage': df.memory_usage(deep=True).sum()
             }
             
-            print(f"✓ Datos procesados - {len(df.columns)} columnas, {len(df)} filas")
-            print(f"Columnas procesadas: {', '.join(df.columns)}")
+            logging.debug(f"Columnas procesadas: {', '.join(df.columns)}")
             
             return result
 
         except Exception as e:
-            error_msg = f"Error procesando CSV: {str(e)}"
-            print(error_msg)
+            error_msg = f"Error procesando flujos: {str(e)}"
+            logging.error(error_msg)
             result['error'] = error_msg
             return result
 
@@ -257,4 +279,8 @@ if __name__ == '__main__':
             sys.exit(1)
     else:
         csv_file = service.find_latest_csv()
-    service.process_csv(csv_file)
\ No newline at end of file
+    logging.basicConfig(level=logging.INFO)
+    result = service.process_csv(csv_file)
+    if result['success']:
+        print(f"✓ Datos procesados - {result['details']['final_stats']['total_columns']} columnas, "
+              f"{result['details']['final_stats']['total_rows']} filas")
\ No newline at end of file
@@ -0,0 +1,141 @@
+import json
+import math
+import importlib.util
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Tipos de contenido que se pueden pedir con Accept en /jobs/{job_id}
+JSON_TYPE = 'application/json'
+MSGPACK_TYPE = 'application/msgpack'
+ARROW_TYPE = 'application/vnd.apache.arrow.stream'
+MEDIA_TYPES = {
+    JSON_TYPE: JSON_TYPE,
+    MSGPACK_TYPE: MSGPACK_TYPE,
+    'application/x-msgpack': MSGPACK_TYPE,
+    ARROW_TYPE: ARROW_TYPE
+}
+
+
+def columnar_frame(df: pd.DataFrame, labels: np.ndarray, confidences: np.ndarray) -> Dict[str, Any]:
+    """
+    Características y predicción de cada flujo en formato columnar:
+    {'columns': [nombres], 'data': [un array por columna]}. Los arrays NumPy se
+    serializan directamente, sin construir un diccionario por fila.
+    """
+    n = min(len(df), len(labels))
+    columns = [str(col) for col in df.columns]
+    data = [df[col].to_numpy()[:n] for col in df.columns]
+    return {
+        'columns': columns + ['Prediction', 'Confidence'],
+        'data': data + [np.asarray(labels)[:n], np.asarray(confidences, dtype=np.float64)[:n]]
+    }
+
+
+def available_types() -> List[str]:
+    types = [JSON_TYPE]
+    if importlib.util.find_spec('msgpack') is not None:
+        types.append(MSGPACK_TYPE)
+    if importlib.util.find_spec('pyarrow') is not None:
+        types.append(ARROW_TYPE)
+    return types
+
+
+def negotiate(accept: str) -> str:
+    """Elige el tipo de respuesta según Accept (por calidad y orden); JSON por defecto"""
+    available = available_types()
+    candidates = []
+    for position, item in enumerate((accept or '').split(',')):
+        parts = [part.strip() for part in item.split(';')]
+        quality = 1.0
+        for param in parts[1:]:
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        media_type = MEDIA_TYPES.get(parts[0].lower())
+        if media_type in available and quality > 0:
+            candidates.append((-quality, position, media_type))
+    return min(candidates)[2] if candidates else JSON_TYPE
+
+
+def to_plain(obj):
+    """Convierte arrays y escalares NumPy en tipos de Python (NaN/inf a None)"""
+    if isinstance(obj, dict):
+        return {key: to_plain(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_plain(value) for value in obj]
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.kind != 'f':
+            return obj.tolist()
+        if obj.ndim > 1:
+            return [to_plain(row) for row in obj]
+        return [value if math.isfinite(value) else None for value in obj.tolist()]
+    if isinstance(obj, np.generic):
+        obj = obj.item()
+    if isinstance(obj, float) and not math.isfinite(obj):
+        return None
+    return obj
+
+
+def _orjson_default(obj):
+    # orjson serializa por sí mismo los arrays numéricos contiguos; el resto llega aquí
+    if isinstance(obj, np.ndarray):
+        return to_plain(obj)
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Tipo no serializable: {type(obj).__name__}")
+
+
+def render_json(payload: Dict[str, Any]) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, default=_orjson_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(to_plain(payload), default=str).encode()
+
+
+def render_msgpack(payload: Dict[str, Any]) -> bytes:
+    import msgpack
+    return msgpack.packb(to_plain(payload), use_bin_type=True, default=str)
+
+
+def render_arrow(payload: Dict[str, Any]) -> bytes:
+    """
+    Stream IPC de Arrow con una fila por flujo (características, predicción,
+    confianza y una columna por probabilidad de clase). El resto del trabajo
+    (estado, resumen) va en los metadatos del esquema como JSON bajo 'job'.
+    """
+    import pyarrow as pa
+    result = payload.get('result') or {}
+    full_data = result.get('full_data') or {'columns': [], 'data': []}
+    predictions = result.get('predictions') or {}
+    columns = list(full_data['columns'])
+    arrays = [pa.array(values, from_pandas=True) for values in full_data['data']]
+    for name, values in zip(predictions.get('class_names', []), predictions.get('probabilities', [])):
+        columns.append(f'P({name})')
+        arrays.append(pa.array(values))
+
+    meta = {key: value for key, value in payload.items() if key != 'result'}
+    meta['result'] = {key: value for key, value in result.items() if key not in ('full_data', 'predictions')}
+    schema = pa.schema([pa.field(name, array.type) for name, array in zip(columns, arrays)],
+                       metadata={'job': render_json(meta)})
+    table = pa.Table.from_arrays(arrays, schema=schema)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def render(payload: Dict[str, Any], media_type: str) -> Tuple[bytes, str]:
+    """Serializa payload en media_type; Returns: (cuerpo, media_type)"""
+    if media_type == ARROW_TYPE:
+        return render_arrow(payload), ARROW_TYPE
+    if media_type == MSGPACK_TYPE:
+        return render_msgpack(payload), MSGPACK_TYPE
+    return render_json(payload), JSON_TYPE
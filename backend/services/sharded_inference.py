@@ -0,0 +1,152 @@
+import os
+import logging
+import threading
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, Any, List, Optional, Tuple
+
+# Engine del proceso worker (lo crea _init_worker una vez por proceso)
+_worker_engine = None
+
+
+def _init_worker(models_dir: str, mmap_mode: Optional[str]):
+    """
+    Inicializador de cada proceso del pool: carga los modelos y compila el
+    InferenceEngine una sola vez. BLAS/OpenMP se limitan a un hilo por worker
+    para que los procesos no compitan por los mismos núcleos.
+    """
+    global _worker_engine
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(1)
+    except ImportError:
+        pass
+    from services.model_registry import ModelRegistry
+    from services.inference_engine import InferenceEngine
+    from services.prediction_service import COLUMNAS, COLUMNAS_CATEGORICAS, ETIQUETAS
+    bundle = ModelRegistry.load(models_dir, mmap_mode)
+    # Sin caché ni sharding dentro del worker
+    _worker_engine = InferenceEngine(bundle.scaler, bundle.pca, bundle.model,
+                                     COLUMNAS, COLUMNAS_CATEGORICAS, ETIQUETAS, linear=bundle.linear)
+
+
+def _predict_shard(input_name: str, shape: Tuple[int, int], output_name: str, n_classes: int,
+                   start: int, stop: int) -> Tuple[int, int]:
+    """Calcula predict_proba de las filas [start, stop) leyendo y escribiendo en memoria compartida"""
+    shm_in = shared_memory.SharedMemory(name=input_name)
+    shm_out = shared_memory.SharedMemory(name=output_name)
+    try:
+        X = np.ndarray(shape, dtype=np.float64, buffer=shm_in.buf)
+        out = np.ndarray((shape[0], n_classes), dtype=np.float64, buffer=shm_out.buf)
+        out[start:stop] = _worker_engine.predict_proba(X[start:stop])
+        del X, out
+    finally:
+        shm_in.close()
+        shm_out.close()
+    return start, stop
+
+
+class ShardedInference:
+    """
+    Inferencia repartida en un pool de procesos para lotes muy grandes.
+
+    La matriz de características se copia una vez a un bloque de memoria
+    compartida; cada tarea solo recibe el nombre del bloque y su rango de filas
+    [start, stop), y escribe las probabilidades en su tramo de un segundo bloque
+    compartido, así que ni la entrada ni la salida se serializan con pickle y
+    el resultado queda en el orden original. Los workers cargan los modelos en
+    el inicializador (procesos 'spawn': no se hace fork de un proceso con hilos).
+
+    Cada conjunto de modelos tiene su propio pool; al recargar modelos el pool
+    anterior se cierra y las peticiones que aún lo usen calculan en local.
+    """
+
+    def __init__(self, models_dir: str, mmap_mode: Optional[str], workers: int,
+                 min_rows: int, shard_rows: int, mp_context: str = 'spawn'):
+        self.models_dir = models_dir
+        self.mmap_mode = mmap_mode
+        self.workers = workers
+        self.min_rows = min_rows
+        self.shard_rows = shard_rows
+        self.mp_context = mp_context
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def should_shard(self, rows: int) -> bool:
+        return not self._closed and self.workers > 1 and rows >= self.min_rows
+
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        with self._lock:
+            if self._closed:
+                return None
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(self.mp_context),
+                    initializer=_init_worker,
+                    initargs=(self.models_dir, self.mmap_mode)
+                )
+            return self._pool
+
+    def warm_up(self):
+        """Arranca los workers (y su carga de modelos) antes del primer lote grande"""
+        pool = self._get_pool()
+        if pool is not None:
+            for future in [pool.submit(os.getpid) for _ in range(self.workers)]:
+                future.result()
+
+    def shards(self, rows: int) -> List[Tuple[int, int]]:
+        """Rangos [start, stop) de como mucho shard_rows filas, al menos uno por worker"""
+        size = max(1, min(self.shard_rows, -(-rows // self.workers)))
+        return [(start, min(start + size, rows)) for start in range(0, rows, size)]
+
+    def predict_proba(self, X: np.ndarray, n_classes: int, local) -> np.ndarray:
+        """
+        predict_proba de X repartido entre los workers.
+        local: función que calcula en este proceso si el pool ya no está disponible
+        """
+        pool = self._get_pool()
+        if pool is None:
+            return local(X)
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        shm_in = shared_memory.SharedMemory(create=True, size=max(X.nbytes, 1))
+        shm_out = shared_memory.SharedMemory(create=True, size=max(len(X) * n_classes * 8, 1))
+        try:
+            np.ndarray(X.shape, dtype=np.float64, buffer=shm_in.buf)[:] = X
+            try:
+                futures = [
+                    pool.submit(_predict_shard, shm_in.name, X.shape, shm_out.name, n_classes, start, stop)
+                    for start, stop in self.shards(len(X))
+                ]
+            except RuntimeError:
+                # Pool cerrado por una recarga de modelos entre _get_pool y submit
+                return local(X)
+            for future in futures:
+                future.result()
+            return np.ndarray((len(X), n_classes), dtype=np.float64, buffer=shm_out.buf).copy()
+        finally:
+            shm_in.close()
+            shm_in.unlink()
+            shm_out.close()
+            shm_out.unlink()
+
+    def close(self, wait: bool = False):
+        """Cierra el pool; las tareas ya enviadas terminan"""
+        with self._lock:
+            self._closed = True
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+            logging.info("Pool de inferencia distribuida cerrado")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'workers': self.workers,
+            'min_rows': self.min_rows,
+            'shard_rows': self.shard_rows,
+            'started': self._pool is not None,
+            'closed': self._closed
+        }
@@ -0,0 +1,211 @@
+import io
+import time
+import struct
+import asyncio
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, Sequence, Iterator, List, Tuple
+
+from config import DatabaseConfig
+from db_schema import TABLE_NAME, ROLLUP_TABLE, TEXT_COLUMNS, COLUMN_MAPPING, partitions
+
+# Cabecera y fin de datos del formato binario de COPY
+PGCOPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)
+PGCOPY_TRAILER = struct.pack('>h', -1)
+
+
+def rollup_upsert_sql(placeholders: Sequence[str]) -> str:
+    """
+    Suma los flujos de un análisis al resumen por (timestamp, tipo, duración, predicción).
+    CURRENT_TIMESTAMP es el inicio de la transacción, el mismo valor que reciben los flujos.
+    """
+    conn_type, duration, prediction, count = placeholders
+    return (f"INSERT INTO {ROLLUP_TABLE} (timestamp, connection_type, duration, prediction, count) "
+            f"VALUES (CURRENT_TIMESTAMP, {conn_type}, {duration}, {prediction}, {count}) "
+            f"ON CONFLICT (timestamp, connection_type, duration, prediction) "
+            f"DO UPDATE SET count = {ROLLUP_TABLE}.count + EXCLUDED.count")
+
+
+class FlowWriter:
+    """
+    Escritura masiva de flujos y predicciones en PostgreSQL.
+
+    El DataFrame se convierte de una sola vez (sin iterrows) y se envía a
+    trafico_predic con COPY FROM STDIN desde un buffer en memoria, por lotes de
+    batch_size filas. Por defecto se usa el formato binario de COPY, que se
+    construye con NumPy sin pasar por texto; copy_format='csv' usa to_csv.
+    Todos los lotes van en la misma transacción, de modo que los registros de
+    un análisis comparten el mismo timestamp; en esa transacción se actualiza
+    también trafico_predic_resumen con el número de flujos por predicción.
+    """
+
+    def __init__(self, engine, batch_size: int = None, copy_format: str = None):
+        self.engine = engine
+        self.batch_size = batch_size or DatabaseConfig.COPY_BATCH_SIZE
+        self.copy_format = (copy_format or DatabaseConfig.COPY_FORMAT).lower()
+        if self.copy_format not in ('binary', 'csv'):
+            raise ValueError(f"Formato de COPY no soportado: {self.copy_format}")
+
+    def build_frame(self, df: pd.DataFrame, labels: Sequence[str], connection_type: str, duration: int) -> pd.DataFrame:
+        """
+        Convierte las características al esquema de trafico_predic en un solo paso vectorizado.
+        Las columnas REAL van primero, luego duration y al final las columnas de texto.
+        """
+        n = min(len(df), len(labels))
+        present = [(orig, db) for orig, db in COLUMN_MAPPING.items() if orig in df.columns]
+        numeric = [(orig, db) for orig, db in present if db not in TEXT_COLUMNS]
+        text_cols = [(orig, db) for orig, db in present if db in TEXT_COLUMNS]
+
+        block = df[[orig for orig, _ in numeric]].iloc[:n]
+        object_cols = block.columns[block.dtypes == object]
+        if len(object_cols):
+            block = block.copy()
+            block[object_cols] = block[object_cols].apply(pd.to_numeric, errors='coerce')
+        # Los valores ya están imputados; lo que no sea numérico se guarda como 0
+        values = block.to_numpy(dtype=np.float32, na_value=np.nan)
+        values[np.isnan(values)] = 0.0
+
+        out = pd.DataFrame(values, columns=[db for _, db in numeric])
+        out['duration'] = np.int32(duration)
+        out['connection_type'] = connection_type
+        for orig, db in text_cols:
+            out[db] = df[orig].iloc[:n].astype(str).to_numpy()
+        out['prediction'] = np.asarray(labels[:n], dtype=object)
+        return out
+
+    def _encode_csv(self, frame: pd.DataFrame) -> io.IOBase:
+        return io.BytesIO(frame.to_csv(header=False, index=False).encode('utf-8'))
+
+    def _encode_binary(self, frame: pd.DataFrame) -> io.IOBase:
+        """Codifica el lote en el formato binario de COPY sin iterar por filas"""
+        n = len(frame)
+        real_cols = [c for c in frame.columns if frame[c].dtype == np.float32]
+        int_cols = [c for c in frame.columns if frame[c].dtype == np.int32]
+        text_cols = [c for c in frame.columns if c not in real_cols and c not in int_cols]
+
+        # Parte fija de cada fila: nº de campos + (longitud, valor) por columna numérica
+        fields = [('nfields', '>i2')]
+        for i, col in enumerate(real_cols + int_cols):
+            fields += [(f'l{i}', '>i4'), (f'v{i}', '>f4' if col in real_cols else '>i4')]
+        fixed = np.empty(n, dtype=np.dtype(fields))
+        fixed['nfields'] = len(frame.columns)
+        for i, col in enumerate(real_cols + int_cols):
+            fixed[f'l{i}'] = 4
+            fixed[f'v{i}'] = frame[col].to_numpy()
+        fixed_len = fixed.dtype.itemsize
+
+        # Parte variable: las combinaciones de textos son pocas, se codifican una vez
+        codes, combos = pd.MultiIndex.from_frame(frame[text_cols].astype(str)).factorize()
+        suffixes = []
+        for combo in combos:
+            encoded = b''.join(struct.pack('>i', len(v)) + v for v in (str(x).encode('utf-8') for x in combo))
+            suffixes.append(np.frombuffer(encoded, dtype=np.uint8))
+        suffix_len = np.array([len(x) for x in suffixes], dtype=np.int64)
+
+        width = fixed_len + int(suffix_len.max())
+        rows = np.zeros((n, width), dtype=np.uint8)
+        rows[:, :fixed_len] = fixed.view(np.uint8).reshape(n, fixed_len)
+        for k, suffix in enumerate(suffixes):
+            rows[codes == k, fixed_len:fixed_len + len(suffix)] = suffix
+        lengths = fixed_len + suffix_len[codes]
+        payload = rows[np.arange(width) < lengths[:, None]]
+
+        return io.BytesIO(PGCOPY_HEADER + payload.tobytes() + PGCOPY_TRAILER)
+
+    def encode_batches(self, frame: pd.DataFrame) -> Iterator[io.IOBase]:
+        """Genera un buffer COPY (binario o CSV) por cada lote de batch_size filas"""
+        encode = self._encode_binary if self.copy_format == 'binary' else self._encode_csv
+        for offset in range(0, len(frame), self.batch_size):
+            yield encode(frame.iloc[offset:offset + self.batch_size])
+
+    @staticmethod
+    def rollup_rows(frame: pd.DataFrame) -> List[Tuple[str, int, str, int]]:
+        """Filas del resumen: (tipo de conexión, duración, predicción, nº de flujos)"""
+        counts = frame['prediction'].astype(str).value_counts(sort=False)
+        connection_type = str(frame['connection_type'].iloc[0])
+        duration = int(frame['duration'].iloc[0])
+        return [(connection_type, duration, prediction, int(count)) for prediction, count in counts.items()]
+
+    @staticmethod
+    def _finish_stats(stats: Dict[str, Any], rows: int, start: float) -> Dict[str, Any]:
+        stats['rows'] = rows
+        stats['seconds'] = time.perf_counter() - start
+        stats['rows_per_sec'] = stats['rows'] / stats['seconds'] if stats['seconds'] > 0 else 0.0
+        return stats
+
+    def write(self, df: pd.DataFrame, labels: Sequence[str], connection_type: str, duration: int,
+              statements: Sequence[Tuple[str, Sequence[Any]]] = ()) -> Dict[str, Any]:
+        """
+        Inserta los flujos con COPY
+        Args:
+            statements: (sql, parámetros) que se ejecutan en la misma transacción que
+                el COPY, p. ej. el punto de control de bulk_import.py
+        Returns:
+            Diccionario con estadísticas: {'rows', 'batches', 'seconds', 'rows_per_sec'}
+        """
+        start = time.perf_counter()
+        frame = self.build_frame(df, labels, connection_type, duration)
+        stats = {'rows': 0, 'batches': 0, 'seconds': 0.0, 'rows_per_sec': 0.0}
+        if frame.empty:
+            return stats
+
+        copy_sql = (f"COPY {TABLE_NAME} ({', '.join(frame.columns)}) FROM STDIN "
+                    f"WITH (FORMAT {self.copy_format})")
+        raw_conn = self.engine.raw_connection()
+        try:
+            cursor = raw_conn.cursor()
+            # Partición del mes (solo la primera escritura del mes), en su propia transacción
+            for month, ddl in partitions.pending_ddl():
+                cursor.execute(ddl)
+                raw_conn.commit()
+                partitions.mark_created(month)
+            for buffer in self.encode_batches(frame):
+                cursor.copy_expert(copy_sql, buffer)
+                stats['batches'] += 1
+            cursor.executemany(rollup_upsert_sql(['%s'] * 4), self.rollup_rows(frame))
+            for sql, params in statements:
+                cursor.execute(sql, params)
+            raw_conn.commit()
+            cursor.close()
+        except Exception:
+            raw_conn.rollback()
+            raise
+        finally:
+            raw_conn.close()
+
+        return self._finish_stats(stats, len(frame), start)
+
+
+class AsyncFlowWriter(FlowWriter):
+    """
+    Variante asíncrona de FlowWriter sobre el engine postgresql+asyncpg.
+    La codificación de los lotes (CPU) se hace en un hilo y el COPY usa
+    copy_to_table de asyncpg, así el event loop no se bloquea.
+    """
+
+    async def write(self, df: pd.DataFrame, labels: Sequence[str], connection_type: str, duration: int) -> Dict[str, Any]:
+        start = time.perf_counter()
+        stats = {'rows': 0, 'batches': 0, 'seconds': 0.0, 'rows_per_sec': 0.0}
+        frame = await asyncio.to_thread(self.build_frame, df, labels, connection_type, duration)
+        if frame.empty:
+            return stats
+
+        buffers = await asyncio.to_thread(lambda: list(self.encode_batches(frame)))
+        async with self.engine.connect() as conn:
+            raw_conn = await conn.get_raw_connection()
+            driver_conn = raw_conn.driver_connection
+            for month, ddl in partitions.pending_ddl():
+                await driver_conn.execute(ddl)
+                partitions.mark_created(month)
+            # Una sola transacción de asyncpg para que todos los lotes y el resumen compartan timestamp
+            async with driver_conn.transaction():
+                for buffer in buffers:
+                    await driver_conn.copy_to_table(
+                        TABLE_NAME, source=buffer, columns=list(frame.columns), format=self.copy_format
+                    )
+                    stats['batches'] += 1
+                await driver_conn.executemany(
+                    rollup_upsert_sql(['$1', '$2', '$3', '$4']), self.rollup_rows(frame)
+                )
+
+        return self._finish_stats(stats, len(frame), start)
@@ -0,0 +1,211 @@
+import os
+import time
+import shutil
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, Optional, Callable, Awaitable, List
+
+from services.capture_service import CaptureService
+from services.interface_service import interface_inventory
+from services.metrics import STREAM_SEGMENTS_DROPPED
+
+
+class StreamingAnalyzer:
+    """
+    Modo de análisis continuo con ventanas deslizantes.
+
+    tshark captura en un ring buffer de segmentos cortos; cada segmento cerrado
+    se pasa por extracción de flujos, procesamiento, predicción y guardado
+    (process_segment) mientras tshark ya está escribiendo el siguiente. La
+    latencia de detección queda en torno a la duración de un segmento.
+    Solo se guarda el resumen de las últimas `history` ventanas.
+
+    tshark borra los segmentos más antiguos del ring (-b files:K): si el
+    análisis se queda más de K segmentos atrás, los que ya no existen se
+    descartan y se cuentan en segments_dropped (stream_segments_dropped_total).
+
+    start espera startup_timeout segundos a que tshark siga vivo: si termina
+    antes (interfaz inválida, filtro BPF erróneo) lanza RuntimeError y el modo
+    continuo no queda en marcha. Si tshark termina más tarde sin stop, se
+    analizan los segmentos pendientes y el modo continuo se detiene solo.
+    """
+
+    def __init__(self, process_segment: Callable[..., Awaitable[Dict[str, Any]]],
+                 poll_interval: float = 0.5, history: int = 20, startup_timeout: float = 1.0):
+        self.process_segment = process_segment
+        self.poll_interval = poll_interval
+        self.startup_timeout = startup_timeout
+        self.windows: deque = deque(maxlen=history)
+        self.capture_service: Optional[CaptureService] = None
+        self.connection_type: Optional[str] = None
+        self.interfaces: List[str] = []
+        self.capture: Optional[Dict[str, Any]] = None
+        self.segment_seconds: Optional[int] = None
+        self.started_at: Optional[datetime] = None
+        self.segments_processed = 0
+        self.segments_failed = 0
+        self.segments_dropped = 0
+        self.last_error: Optional[str] = None
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._segments_dir: Optional[str] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self, connection_type: str, segment_seconds: int, max_files: int,
+                    capture: Optional[Dict[str, Any]] = None):
+        """
+        Inicia la captura en ring buffer y las tareas de vigilancia y procesamiento.
+        capture: opciones de captura (bpf_filter, snaplen, buffer_mb, sample_rate);
+        también se pasan a process_segment. ValueError si connection_type no
+        corresponde a ninguna interfaz activa; RuntimeError si tshark termina
+        durante el arranque.
+        """
+        if self.running:
+            raise RuntimeError("El análisis continuo ya está en marcha")
+        interfaces = await asyncio.to_thread(interface_inventory.resolve, connection_type)
+        self.capture_service = CaptureService()
+        self.connection_type = connection_type
+        self.interfaces = interfaces
+        self.capture = capture
+        self.segment_seconds = segment_seconds
+        self.started_at = datetime.now()
+        self.segments_processed = 0
+        self.segments_failed = 0
+        self.segments_dropped = 0
+        self.last_error = None
+        self.windows.clear()
+        self._stopping = False
+        self._process, self._segments_dir = await self.capture_service.start_ring_capture(
+            segment_seconds, max_files, interfaces=interfaces,
+            options=CaptureService.tshark_options(
+                capture['bpf_filter'], capture['snaplen'], capture['buffer_mb']
+            ) if capture else ()
+        )
+        try:
+            await asyncio.wait_for(self._process.wait(), timeout=self.startup_timeout)
+        except asyncio.TimeoutError:
+            pass
+        else:
+            stderr = await self._process.stderr.read()
+            shutil.rmtree(self._segments_dir, ignore_errors=True)
+            self.last_error = (f"tshark terminó con código {self._process.returncode}: "
+                               f"{stderr.decode(errors='replace').strip()}")
+            logging.error(self.last_error)
+            raise RuntimeError(self.last_error)
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._watch_segments()),
+            asyncio.create_task(self._consume_segments())
+        ]
+
+    async def stop(self):
+        """Detiene tshark, procesa el último segmento pendiente y limpia el directorio"""
+        if not self.running:
+            return
+        self._stopping = True
+        if self._process and self._process.returncode is None:
+            self._process.terminate()
+            await self._process.wait()
+        # El vigilante encola los segmentos restantes y termina al ver el proceso cerrado
+        await self._tasks[0]
+        # Si tshark ya había terminado solo, el vigilante pudo cerrar el modo continuo
+        if self.running:
+            await self._queue.join()
+            await self._close()
+        logging.info("✓ Análisis continuo detenido")
+
+    async def _close(self):
+        """Cancela el consumidor y borra el directorio de segmentos"""
+        consumer = self._tasks[1]
+        consumer.cancel()
+        await asyncio.gather(consumer, return_exceptions=True)
+        self._tasks = []
+        shutil.rmtree(self._segments_dir, ignore_errors=True)
+
+    async def _watch_segments(self):
+        """Encola cada segmento en cuanto tshark lo cierra"""
+        seen = set()
+        while True:
+            capture_running = self._process.returncode is None
+            for segment in CaptureService.list_finished_segments(self._segments_dir, capture_running):
+                if segment not in seen:
+                    seen.add(segment)
+                    await self._queue.put(segment)
+            if not capture_running:
+                if self._process.returncode not in (0, None) and not seen:
+                    stderr = await self._process.stderr.read()
+                    self.last_error = f"tshark terminó con código {self._process.returncode}: {stderr.decode(errors='replace')}"
+                    logging.error(self.last_error)
+                if not self._stopping:
+                    # tshark terminó sin stop: se analiza lo pendiente y se libera el modo continuo
+                    if seen:
+                        self.last_error = f"La captura terminó inesperadamente (código {self._process.returncode})"
+                        logging.error(self.last_error)
+                    await self._queue.join()
+                    await self._close()
+                    logging.warning("Análisis continuo detenido: la captura terminó")
+                return
+            await asyncio.sleep(self.poll_interval)
+
+    async def _consume_segments(self):
+        """Procesa los segmentos en orden mientras se captura el siguiente"""
+        while True:
+            segment = await self._queue.get()
+            if not os.path.exists(segment):
+                self._drop_segment(segment)
+                self._queue.task_done()
+                continue
+            start = time.perf_counter()
+            try:
+                result = await self.process_segment(segment, self.connection_type, self.segment_seconds,
+                                                   capture=self.capture)
+                summary = result.get('summary', {})
+                self.windows.append({
+                    'segment': os.path.basename(segment),
+                    'processed_at': datetime.now().isoformat(),
+                    'flows': summary.get('total_flows', 0),
+                    'label_counts': summary.get('label_counts', {}),
+                    'processing_seconds': round(time.perf_counter() - start, 3)
+                })
+                self.segments_processed += 1
+            except Exception as e:
+                if not os.path.exists(segment):
+                    # Rotado por tshark mientras se leía
+                    self._drop_segment(segment)
+                    continue
+                self.segments_failed += 1
+                self.last_error = getattr(e, 'detail', None) or str(e)
+                logging.error(f"Error procesando segmento {segment}: {self.last_error}")
+            finally:
+                if os.path.exists(segment):
+                    os.remove(segment)
+                self._queue.task_done()
+
+    def _drop_segment(self, segment: str):
+        self.segments_dropped += 1
+        STREAM_SEGMENTS_DROPPED.inc()
+        logging.warning(f"Segmento {os.path.basename(segment)} descartado: tshark lo borró del ring buffer "
+                        f"antes de analizarlo ({self._queue.qsize()} pendientes)")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'running': self.running,
+            'connection_type': self.connection_type,
+            'interfaces': self.interfaces,
+            'capture': self.capture,
+            'segment_seconds': self.segment_seconds,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'segments_processed': self.segments_processed,
+            'segments_failed': self.segments_failed,
+            'segments_dropped': self.segments_dropped,
+            'pending_segments': self._queue.qsize() if self._queue else 0,
+            'last_error': self.last_error,
+            'windows': list(self.windows)
+        }
@@ -1,5 +1,5 @@
 import { useState } from 'react';
-import { fetchNetworkInterfaces, fetchDatabaseStatus, analyzeTraffic } from '../services/api';
+import { fetchNetworkInterfaces, fetchDatabaseStatus, analyzeTraffic, ANALYSIS_STAGE_MESSAGES } from '../services/api';
 
 const useAnalysis = () => {
   const [isAnalyzing, setIsAnalyzing] = useState(false);
@@ -14,13 +14,14 @@ const useAnalysis = () => {
       const interfaces = await fetchNetworkInterfaces();
       let detected = 'auto';
       const activeInterfaces = interfaces.filter(iface => 
-        iface.status === 'up' && !iface.name.includes('loopback')
+        iface.status !== 'down' && iface.kind !== 'loopback' && iface.kind !== 'pseudo'
       );
 
-      if (activeInterfaces.some(iface => iface.name.includes('eth') || iface.name.includes('Ethernet'))) {
-        detected = 'eth0';
-      } else if (activeInterfaces.some(iface => iface.name.includes('wlan') || iface.name.includes('Wi-Fi'))) {
-        detected = 'wlan0';
+      // El backend clasifica cada interfaz (kind) y acepta 'wifi'/'ethernet' como connection_type
+      if (activeInterfaces.some(iface => iface.kind === 'ethernet')) {
+        detected = 'ethernet';
+      } else if (activeInterfaces.some(iface => iface.kind === 'wifi')) {
+        detected = 'wifi';
       } else if (activeInterfaces.length > 0) {
         detected = activeInterfaces[0].name;
       }
@@ -53,8 +54,9 @@ const useAnalysis = () => {
     setProgress({ message: 'Preparando captura...', percentage: 20 });
 
     try {
-      setProgress({ message: 'Capturando tráfico...', percentage: 40 });
-      const response = await analyzeTraffic(duration, connectionType);
+      const response = await analyzeTraffic(duration, connectionType, (job) => {
+        setProgress({ message: ANALYSIS_STAGE_MESSAGES[job.stage] || 'Analizando...', percentage: job.progress });
+      });
 
       if (response.success) {
         setProgress({ message: 'Procesando con Machine Learning...', percentage: 80 });
@@ -48,6 +48,7 @@ import {
 } from '@mui/icons-material';
 import { styled } from '@mui/material/styles';
 import Header from '../components/Layout/Header';
+import { analyzeTraffic, ANALYSIS_STAGE_MESSAGES } from '../services/api';
 
 // Styled components
 const GradientCard = styled(Card)(({ theme }) => ({
@@ -117,28 +118,21 @@ function Analysis() {
     updateProgress('1. Preparando captura de tráfico...', 20);
 
     try {
-      updateProgress('2. Capturando tráfico de red...', 40);
-
-      const response = await axios.post('/analyze', {
-        duration: parseInt(duration),
-        connection_type: connectionType
+      const result = await analyzeTraffic(duration, connectionType, (job) => {
+        updateProgress(ANALYSIS_STAGE_MESSAGES[job.stage] || 'Analizando...', Math.max(20, job.progress));
       });
 
-      if (response.data.success) {
-        updateProgress('3. Procesando con Machine Learning...', 80);
-
-        setTimeout(() => {
-          updateProgress('✓ Análisis completado con éxito', 100);
-          setResults(response.data);
-          setIsAnalyzing(false);
-          showAlert(
-            `Análisis completado: ${response.data.summary.total_flows} flujos procesados con ${response.data.summary.columns_count} características`,
-            'success'
-          );
-          checkDatabaseStatus();
-        }, 1000);
+      if (result && result.success) {
+        updateProgress('✓ Análisis completado con éxito', 100);
+        setResults(result);
+        setIsAnalyzing(false);
+        showAlert(
+          `Análisis completado: ${result.summary.total_flows} flujos procesados con ${result.summary.columns_count} características`,
+          'success'
+        );
+        checkDatabaseStatus();
       } else {
-        throw new Error(response.data.error || 'Error desconocido en el análisis');
+        throw new Error(result?.error || 'Error desconocido en el análisis');
       }
     } catch (error) {
       console.error('Error:', error);
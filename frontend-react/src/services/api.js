@@ -21,7 +21,21 @@ export const fetchDatabaseStatus = async () => {
   }
 };
 
-export const analyzeTraffic = async (duration, connectionType) => {
+// Mensajes de progreso para cada etapa del análisis en segundo plano
+export const ANALYSIS_STAGE_MESSAGES = {
+  queued: 'Análisis en cola...',
+  capture: 'Capturando tráfico de red...',
+  flow_extraction: 'Extrayendo características de los flujos...',
+  processing: 'Procesando datos...',
+  imputation: 'Imputando valores faltantes...',
+  prediction: 'Procesando con Machine Learning...',
+  database: 'Guardando en base de datos...',
+  response: 'Preparando resultados...',
+};
+
+const JOB_POLL_INTERVAL_MS = 1000;
+
+export const submitAnalysis = async (duration, connectionType) => {
   try {
     const response = await axios.post('/analyze', {
       duration: parseInt(duration),
@@ -29,6 +43,58 @@ export const analyzeTraffic = async (duration, connectionType) => {
     });
     return response.data;
   } catch (error) {
-    throw new Error('Error analyzing traffic');
+    throw new Error(error.response?.data?.detail || 'Error analyzing traffic');
+  }
+};
+
+export const fetchJob = async (jobId) => {
+  try {
+    const response = await axios.get(`/jobs/${jobId}`);
+    return response.data;
+  } catch (error) {
+    throw new Error('Error fetching analysis status');
+  }
+};
+
+// {columns, data} (un array por columna) -> lista de objetos por fila
+export const columnarToRows = (block) => {
+  if (!block || Array.isArray(block)) return block;
+  const { columns, data } = block;
+  const length = data.length ? data[0].length : 0;
+  const rows = new Array(length);
+  for (let i = 0; i < length; i++) {
+    const row = {};
+    for (let c = 0; c < columns.length; c++) row[columns[c]] = data[c][i];
+    rows[i] = row;
+  }
+  return rows;
+};
+
+// El backend responde en formato columnar; los componentes siguen recibiendo
+// full_data y predictions como listas de objetos por fila
+export const decodeAnalysisResult = (result) => {
+  if (!result || result.format !== 'columnar') return result;
+  const { predictions } = result;
+  let rows = predictions;
+  if (predictions && !Array.isArray(predictions)) {
+    const { labels, confidences, class_names: classNames, probabilities } = predictions;
+    rows = labels.map((label, i) => {
+      const probs = {};
+      classNames.forEach((name, c) => { probs[name] = probabilities[c][i]; });
+      return { label, confidence: confidences[i], probabilities: probs };
+    });
+  }
+  return { ...result, full_data: columnarToRows(result.full_data), predictions: rows };
+};
+
+// Encola el análisis y consulta /jobs/{id} hasta que termina; devuelve el resultado final
+export const analyzeTraffic = async (duration, connectionType, onProgress) => {
+  const { job_id: jobId } = await submitAnalysis(duration, connectionType);
+  for (;;) {
+    const job = await fetchJob(jobId);
+    if (onProgress) onProgress(job);
+    if (job.status === 'completed') return decodeAnalysisResult(job.result);
+    if (job.status === 'failed') throw new Error(job.error || 'Error analyzing traffic');
+    await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
   }
 };